@@ -1,15 +1,13 @@
 import re
 from datetime import datetime
+from app.utils.intent_lexer import IntentFeatures, PHONE_REGEX, DOB_REGEX, extract_intents
 from app.services.account_service import (
-    get_account,
     update_phone,
-    update_dob
+    update_dob,
+    update_phone_async,
+    update_dob_async
 )
 
-PHONE_REGEX = r"\+?\d{8,15}"
-DOB_REGEX = r"\b\d{4}-\d{2}-\d{2}\b"  # YYYY-MM-DD
-
-
 def extract_phone_number(message: str):
     match = re.search(PHONE_REGEX, message)
     return match.group(0) if match else None
@@ -28,49 +26,69 @@ def is_valid_dob(dob: str) -> bool:
         return False
 
 
-def generate_account_response(customer_id: str, message: str) -> str:
-    message_lower = message.lower()
+def plan_account_response(message: str, features: IntentFeatures = None):
+    """
+    Decide the reply without touching the database.
+    Returns (update, reply): update is ("dob" | "phone", value) when the
+    reply must only be sent after that field has been written, else None.
+    """
+    features = features or extract_intents(message)
 
     # 🚫 Block forbidden updates
-    forbidden_keywords = ["email", "name", "status", "username"]
-    if any(word in message_lower for word in forbidden_keywords):
-        return (
+    if features.has("forbidden_account_field"):
+        return None, (
             "For security reasons, only phone number and date of birth updates "
             "are allowed via chat.\n\n"
             "Please contact support for other account changes."
         )
 
     # 🎂 DOB update — FIRST (important)
-    new_dob = extract_dob(message)
+    new_dob = features.dob
     if new_dob:
         if not is_valid_dob(new_dob):
-            return "Please provide a valid past date of birth in YYYY-MM-DD format."
+            return None, "Please provide a valid past date of birth in YYYY-MM-DD format."
 
-        update_dob(customer_id, new_dob)
-        return f"✅ Your date of birth has been updated to {new_dob}."
+        return ("dob", new_dob), f"✅ Your date of birth has been updated to {new_dob}."
 
-    if "dob" in message_lower or "date of birth" in message_lower:
-        return (
+    if features.has("dob_mention"):
+        return None, (
             "Please provide your date of birth in YYYY-MM-DD format.\n"
             "Example: 1995-08-21"
         )
 
     # 📞 Phone update — SECOND
-    new_phone = extract_phone_number(message)
+    new_phone = features.phone
     if new_phone:
-        update_phone(customer_id, new_phone)
-        return f"✅ Your phone number has been updated to {new_phone}."
+        return ("phone", new_phone), f"✅ Your phone number has been updated to {new_phone}."
 
-    if "phone" in message_lower:
-        return (
+    if features.has("phone_mention"):
+        return None, (
             "Please provide the new phone number.\n"
             "Example: +1234567890"
         )
 
     # 🔁 Fallback
-    return (
+    return None, (
         "I can help you update the following account details:\n"
         "- Phone number\n"
         "- Date of birth (DOB)\n\n"
         "Please tell me what you’d like to update."
     )
+
+
+def generate_account_response(customer_id: str, message: str, features: IntentFeatures = None) -> str:
+    update, reply = plan_account_response(message, features)
+
+    if update:
+        field, value = update
+        (update_dob if field == "dob" else update_phone)(customer_id, value)
+    return reply
+
+
+async def generate_account_response_async(customer_id: str, message: str, features: IntentFeatures = None) -> str:
+    update, reply = plan_account_response(message, features)
+
+    if update:
+        field, value = update
+        await (update_dob_async if field == "dob" else update_phone_async)(customer_id, value)
+    return reply
@@ -1,30 +1,20 @@
-from app.services.billing_service import get_customer_orders
+import asyncio
+from app.services.billing_service import get_customer_orders, get_customer_orders_async
+from app.services.email_queue import get_email_queue
 from app.services.email_service import send_email
 from app.utils.billing_formatter import format_billing_email
-from app.services.user_service import get_user_email  # assumes you have this
+from app.services.user_service import get_user_email, get_user_email_async  # assumes you have this
+from app.utils.intent_lexer import IntentFeatures
 
+NO_BILLING_RECORDS = "🧾 No billing records found for your account."
 
-def generate_billing_response(customer_id: str, message: str) -> str:
-    orders = get_customer_orders(customer_id)
-
-    if not orders:
-        return "🧾 No billing records found for your account."
-
-    # 📧 Send Email
-    user_email = get_user_email(customer_id)
-    email_body = format_billing_email(orders)
-
-    send_email(
-        to_email=user_email,
-        subject="Your Billing Details",
-        body=email_body
-    )
 
-    # 💬 Chat Response
-    response_lines = ["🧾 **Your Billing Details (also sent to your email):**\n"]
+def iter_billing_lines(orders: list):
+    """Yield the chat billing listing one line at a time"""
+    yield "🧾 **Your Billing Details (also sent to your email):**\n"
 
     for order in orders:
-        response_lines.append(
+        yield (
             f"• Order ID: {order['order_id']}\n"
             f"  Product: {order['product_name']}\n"
             f"  Amount: ${order['amount']:.2f}\n"
@@ -33,10 +23,70 @@ def generate_billing_response(customer_id: str, message: str) -> str:
         
         # Add subscription-specific info if applicable
         if order.get('type') == 'subscription' and order.get('next_billing_date'):
-            response_lines.append(f"  Next Billing: {order['next_billing_date']}\n")
+            yield f"  Next Billing: {order['next_billing_date']}\n"
         if order.get('payment_method'):
-            response_lines.append(f"  Payment Method: {order['payment_method']}\n")
+            yield f"  Payment Method: {order['payment_method']}\n"
         
-        response_lines.append("")  # Empty line between items
+        yield ""  # Empty line between items
+
+
+def email_billing_details(customer_id: str, orders: list, user_email: str = None):
+    # 📧 Send Email
+    user_email = user_email or get_user_email(customer_id)
+    email_body = format_billing_email(orders)
+
+    send_email(
+        to_email=user_email,
+        subject="Your Billing Details",
+        body=email_body
+    )
+
+
+def generate_billing_response(customer_id: str, message: str, features: IntentFeatures = None) -> str:
+    orders = get_customer_orders(customer_id)
+
+    if not orders:
+        return NO_BILLING_RECORDS
+
+    email_billing_details(customer_id, orders)
+
+    # 💬 Chat Response
+    return "\n".join(iter_billing_lines(orders))
+
+
+async def generate_billing_response_async(customer_id: str, message: str, features: IntentFeatures = None, on_line=None) -> str:
+    """
+    Async variant of generate_billing_response. Each chat line is passed to
+    on_line as soon as it is formatted (used for streaming), before the
+    billing email is sent. The orders and the customer's email address are
+    fetched concurrently.
+    """
+    orders, user_email = await asyncio.gather(
+        get_customer_orders_async(customer_id),
+        get_user_email_async(customer_id),
+        return_exceptions=True
+    )
+    if isinstance(orders, BaseException):
+        raise orders
+
+    if not orders:
+        return NO_BILLING_RECORDS
+
+    # Only needed once there is something to send
+    if isinstance(user_email, BaseException):
+        raise user_email
+
+    # 💬 Chat Response
+    lines = []
+    for line in iter_billing_lines(orders):
+        lines.append(line)
+        if on_line:
+            on_line(line)
+
+    if get_email_queue() is not None:
+        # Only queues the email
+        email_billing_details(customer_id, orders, user_email)
+    else:
+        await asyncio.to_thread(email_billing_details, customer_id, orders, user_email)
 
-    return "\n".join(response_lines)
+    return "\n".join(lines)
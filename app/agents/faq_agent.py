@@ -1,75 +1,41 @@
-import re
-from app.services.faq_service import fetch_best_faq_match
-
-def tokenize(text: str) -> list[str]:
-    """
-    Enhanced tokenizer for keyword matching.
-    Preserves important phrases and extracts both words and phrases.
-    """
-    text = text.lower()
-    # Remove punctuation but keep spaces
-    text = re.sub(r"[^a-z0-9\s]", "", text)
-    
-    # Split into words
-    words = text.split()
-    
-    # Create tokens: individual words + important 2-word phrases
-    tokens = set(words)  # Start with individual words
-    
-    # Add 2-word phrases (bigrams) for better matching
-    # This helps match phrases like "end subscription", "change plan", etc.
-    for i in range(len(words) - 1):
-        phrase = f"{words[i]} {words[i+1]}"
-        tokens.add(phrase)
-    
-    return list(tokens)
+from app.services.faq_service import fetch_best_faq_match, fetch_best_faq_match_async
+from app.utils.intent_lexer import IntentFeatures, extract_intents
+from app.utils.tokenizer import tokenize
 
-
-def is_greeting(message: str) -> bool:
+def is_greeting(message: str, features: IntentFeatures = None) -> bool:
     """Check if the message is a greeting or casual conversation."""
-    message_lower = message.lower().strip()
-    
-    greetings = [
-        "hi", "hello", "hey", "hii", "hiii", "hi there", "hello there",
-        "good morning", "good afternoon", "good evening", "greetings",
-        "what's up", "whats up", "sup", "yo"
-    ]
-    
-    # Check if message is just a greeting
-    if message_lower in greetings:
-        return True
+    features = features or extract_intents(message)
     
-    # Check if message starts with greeting
-    for greeting in greetings:
-        if message_lower.startswith(greeting + " ") or message_lower == greeting:
-            return True
-    
-    return False
+    # Message is just a greeting, or starts with one
+    return features.starts_with("greeting")
 
-def is_personal_statement(message: str) -> bool:
+def is_personal_statement(message: str, features: IntentFeatures = None) -> bool:
     """Check if the message is a personal statement without a clear request."""
-    message_lower = message.lower().strip()
-    
-    personal_patterns = [
-        "my name is",
-        "i am",
-        "i'm",
-        "call me",
-        "this is"
-    ]
+    features = features or extract_intents(message)
     
-    # Check if it's a personal introduction without a question or request
-    for pattern in personal_patterns:
-        if pattern in message_lower:
-            # If it's just a statement without a question mark or request, it's personal
-            if "?" not in message and not any(req in message_lower for req in ["want", "need", "help", "can you", "please"]):
-                return True
-    
-    return False
+    # Personal introduction without a question mark or request
+    return (
+        features.has("personal_statement")
+        and not features.has_any("question_mark", "request_word")
+    )
+
+NO_FAQ_MATCH = (
+    "I couldn't find an exact answer to your question in our help articles.\n\n"
+    "Could you please rephrase your question or be a bit more specific?\n\n"
+    "I can help you with:\n"
+    "• Account updates (phone, date of birth)\n"
+    "• Billing information and invoices\n"
+    "• Technical issues\n"
+    "• How-to questions and instructions"
+)
+
+
+def conversational_reply(message: str, features: IntentFeatures = None):
+    """Canned reply for greetings and personal statements, else None (look up the FAQ)"""
+    features = features or extract_intents(message)
 
-def generate_faq_response(customer_id: str, message: str) -> str:
     # Handle greetings
-    if is_greeting(message):
+    if is_greeting(message, features):
         return (
             "Hello! 👋 I'm here to help you with your customer support needs.\n\n"
             "I can assist you with:\n"
@@ -81,13 +47,20 @@ def generate_faq_response(customer_id: str, message: str) -> str:
         )
     
     # Handle personal statements
-    if is_personal_statement(message):
+    if is_personal_statement(message, features):
         return (
             "Nice to meet you! 😊\n\n"
             "I'm here to help you with your account, billing, technical issues, or any questions you might have.\n\n"
             "What would you like help with today?"
         )
-    
+    return None
+
+
+def generate_faq_response(customer_id: str, message: str, features: IntentFeatures = None) -> str:
+    reply = conversational_reply(message, features)
+    if reply:
+        return reply
+
     tokens = tokenize(message)
 
     faq = fetch_best_faq_match(tokens)
@@ -95,12 +68,17 @@ def generate_faq_response(customer_id: str, message: str) -> str:
     if faq:
         return faq["answer"]
 
-    return (
-        "I couldn't find an exact answer to your question in our help articles.\n\n"
-        "Could you please rephrase your question or be a bit more specific?\n\n"
-        "I can help you with:\n"
-        "• Account updates (phone, date of birth)\n"
-        "• Billing information and invoices\n"
-        "• Technical issues\n"
-        "• How-to questions and instructions"
-    )
+    return NO_FAQ_MATCH
+
+
+async def generate_faq_response_async(customer_id: str, message: str, features: IntentFeatures = None) -> str:
+    reply = conversational_reply(message, features)
+    if reply:
+        return reply
+
+    faq = await fetch_best_faq_match_async(tokenize(message))
+
+    if faq:
+        return faq["answer"]
+
+    return NO_FAQ_MATCH
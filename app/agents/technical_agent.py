@@ -1,92 +1,39 @@
-from app.services.technical_service import create_technical_issue
-
-ISSUE_TYPE_KEYWORDS = {
-    "login_error": ["login", "sign in", "password", "credentials"],
-    "upload_error": ["upload", "file", "attachment"],
-    "performance": ["slow", "lag", "performance", "freeze"],
-    "api_error": ["api", "timeout", "request", "endpoint"],
-    "sync_error": ["sync", "synchronization"],
-    "display_error": ["ui", "display", "screen", "layout"],
-    "notification_error": ["notification", "email", "alert"],
-    "integration_error": ["integration", "slack", "webhook"],
-    "storage_error": ["storage", "file access", "disk"],
-    "search_error": ["search", "find", "results"],
-    "billing_action": ["cancel", "cancellation", "refund", "dispute", "subscription"]
-}
-
-def classify_issue_type(message: str) -> str:
-    message_lower = message.lower()
-
-    for issue_type, keywords in ISSUE_TYPE_KEYWORDS.items():
-        if any(keyword in message_lower for keyword in keywords):
-            return issue_type
-
-    return "general_technical_issue"
-
-def has_failure_intent(message: str) -> bool:
-    message = message.lower()
-
-    failure_patterns = [
-        "cannot",
-        "can't",
-        "cant",
-        "unable",
-        "not able",
-        "cant able",
-        "failed",
-        "failing",
-        "error",
-        "issue",
-        "problem",
-        "broken",
-        "not working",
-        "does not work",
-        "is not working"
-    ]
-
-    return any(pattern in message for pattern in failure_patterns)
-
-def has_billing_action_intent(message: str) -> bool:
+from app.services.technical_service import create_technical_issue, create_technical_issue_async
+from app.utils.intent_lexer import IntentFeatures, extract_intents
+
+
+def classify_issue_type(message: str, features: IntentFeatures = None) -> str:
+    features = features or extract_intents(message)
+    return features.issue_type() or "general_technical_issue"
+
+def has_failure_intent(message: str, features: IntentFeatures = None) -> bool:
+    features = features or extract_intents(message)
+    return features.has("failure")
+
+def has_billing_action_intent(message: str, features: IntentFeatures = None) -> bool:
     """Check if the message is about a billing/subscription action that needs processing."""
-    message = message.lower()
-    
-    billing_action_patterns = [
-        "cancel",
-        "cancellation",
-        "cancel my",
-        "want to cancel",
-        "need to cancel",
-        "refund",
-        "i want a refund",
-        "need a refund",
-        "dispute",
-        "dispute this",
-        "stop subscription",
-        "end subscription",
-        "terminate subscription"
-    ]
-    
-    return any(pattern in message for pattern in billing_action_patterns)
-
-
-def generate_technical_response(customer_id: str, message: str) -> str:
+    features = features or extract_intents(message)
+    return features.has("billing_action")
+
+
+def plan_technical_response(message: str, features: IntentFeatures = None):
+    """
+    Decide the reply without touching the database.
+    Returns (issue_type, reply): issue_type is set when an issue must be
+    logged before the reply is sent, else None.
+    """
+    features = features or extract_intents(message)
 
     # Check if it's a billing action (subscription cancellation, refund, etc.)
-    if has_billing_action_intent(message):
-        issue_type = classify_issue_type(message)
+    if has_billing_action_intent(message, features):
+        issue_type = classify_issue_type(message, features)
         # Override to billing_action if subscription/billing keywords found
-        if "cancel" in message.lower() or "subscription" in message.lower():
+        if features.has_any("cancel", "subscription"):
             issue_type = "billing_action"
         
-        create_technical_issue(
-            customer_id=customer_id,
-            issue_type=issue_type,
-            description=message
-        )
-        
         # Special response for subscription cancellations
-        if "cancel" in message.lower() and "subscription" in message.lower():
-            return (
+        if features.has("cancel") and features.has("subscription"):
+            return issue_type, (
                 "✅ Your subscription cancellation request has been received and logged.\n\n"
                 "Issue Type: Subscription Cancellation\n"
                 "Status: Processing\n\n"
@@ -94,8 +41,8 @@ def generate_technical_response(customer_id: str, message: str) -> str:
                 "to confirm the cancellation and discuss any final steps."
             )
         # Special response for refunds
-        elif "refund" in message.lower():
-            return (
+        elif features.has("refund"):
+            return issue_type, (
                 "✅ Your refund request has been received and logged.\n\n"
                 "Issue Type: Refund Request\n"
                 "Status: Under Review\n\n"
@@ -104,7 +51,7 @@ def generate_technical_response(customer_id: str, message: str) -> str:
             )
         # Generic billing action response
         else:
-            return (
+            return issue_type, (
                 "✅ Your billing request has been received and logged.\n\n"
                 f"Issue Type: {issue_type}\n"
                 "Status: Processing\n\n"
@@ -112,24 +59,18 @@ def generate_technical_response(customer_id: str, message: str) -> str:
             )
 
     # 🛑 Guardrail: do NOT handle non-failure questions
-    if not has_failure_intent(message):
-        return (
+    if not has_failure_intent(message, features):
+        return None, (
             "This looks like a general question.\n\n"
             "Please ask how-to or informational questions normally, "
             "and I'll help you right away."
         )
 
-    issue_type = classify_issue_type(message)
-
-    create_technical_issue(
-        customer_id=customer_id,
-        issue_type=issue_type,
-        description=message
-    )
+    issue_type = classify_issue_type(message, features)
 
     # Provide specific responses based on issue type
     if issue_type == "login_error":
-        return (
+        return issue_type, (
             "🔐 I understand you're having trouble logging in. I've logged this issue for our technical team.\n\n"
             "**Issue Type:** Login/Authentication Error\n"
             "**Status:** Open - Under Investigation\n\n"
@@ -142,10 +83,34 @@ def generate_technical_response(customer_id: str, message: str) -> str:
             "If this is urgent, please reply and I'll escalate it immediately."
         )
     else:
-        return (
+        return issue_type, (
             "🛠️ Your technical issue has been logged successfully.\n\n"
             f"**Issue Type:** {issue_type.replace('_', ' ').title()}\n"
             "**Status:** Open - Under Investigation\n\n"
             "Our technical team will investigate and update you soon. "
             "If this is urgent, please reply and I'll escalate it immediately."
         )
+
+
+def generate_technical_response(customer_id: str, message: str, features: IntentFeatures = None) -> str:
+    issue_type, reply = plan_technical_response(message, features)
+
+    if issue_type:
+        create_technical_issue(
+            customer_id=customer_id,
+            issue_type=issue_type,
+            description=message
+        )
+    return reply
+
+
+async def generate_technical_response_async(customer_id: str, message: str, features: IntentFeatures = None) -> str:
+    issue_type, reply = plan_technical_response(message, features)
+
+    if issue_type:
+        await create_technical_issue_async(
+            customer_id=customer_id,
+            issue_type=issue_type,
+            description=message
+        )
+    return reply
@@ -1,21 +1,56 @@
-from app.services.orchestrator import analyze_priority, route_query
-from app.services.session_store import get_user_turn_count
+import asyncio
 
-from app.agents.faq_agent import generate_faq_response
-from app.agents.account_agent import generate_account_response
-from app.agents.billing_agent import generate_billing_response
-from app.agents.technical_agent import generate_technical_response
+from langgraph.config import get_stream_writer
+
+from app.services.orchestrator import (
+    analyze_priority,
+    route_query,
+    classify_query,
+    analyze_priority_async,
+    route_query_async,
+    classify_query_async
+)
+from app.services.session_store import get_user_turn_count, get_user_turn_count_async
+from app.utils.intent_lexer import extract_intents
+
+from app.agents.faq_agent import generate_faq_response, generate_faq_response_async
+from app.agents.account_agent import generate_account_response, generate_account_response_async
+from app.agents.billing_agent import generate_billing_response, generate_billing_response_async
+from app.agents.technical_agent import generate_technical_response, generate_technical_response_async
 from app.agents.escalation_agent import send_escalation_alert
 
 
+# ---------- Intent features ----------
+def _features(state):
+    """Intent features are extracted once per request and shared by every node"""
+    if not state.get("features"):
+        state["features"] = extract_intents(state["message"])
+    return state["features"]
+
+
 # ---------- Priority ----------
 def priority_node(state):
     print("🟢 NODE: PRIORITY")
 
     state["priority"] = analyze_priority(
         customer_id=state["customer_id"],
-        message=state["message"]
+        message=state["message"],
+        features=_features(state)
+    )
+    return state
+
+
+# ---------- Classify (fused priority + routing) ----------
+def classify_node(state):
+    print("🟢 NODE: CLASSIFY")
+
+    result = classify_query(
+        customer_id=state["customer_id"],
+        message=state["message"],
+        features=_features(state)
     )
+    state["priority"] = result["priority"]
+    state["agent"] = result["agent"]
     return state
 
 
@@ -34,16 +69,10 @@ def escalation_decision(state):
     Only escalate immediately for critical security issues.
     Let technical agent handle other HIGH priority issues first.
     """
-    message_lower = state.get("message", "").lower()
+    features = state.get("features") or extract_intents(state.get("message", ""))
     
     # Critical security issues that need immediate escalation
-    critical_security_keywords = [
-        "hacked", "breach", "unauthorized access", "security breach",
-        "data breach", "compromised", "stolen", "fraud"
-    ]
-    
-    # Check for critical security issues
-    if any(keyword in message_lower for keyword in critical_security_keywords):
+    if features.has("critical_security"):
         return "ESCALATE"
     
     # Escalate if conversation is too long (agent couldn't resolve)
@@ -55,13 +84,24 @@ def escalation_decision(state):
     return "CONTINUE"
 
 
+def escalation_or_agent(state):
+    """
+    Fused-mode variant of escalation_decision: the agent is already known
+    after classification, so CONTINUE goes straight to that agent.
+    """
+    if escalation_decision(state) == "ESCALATE":
+        return "ESCALATE"
+    return state["agent"]
+
+
 # ---------- Router ----------
 def router_node(state):
     print("🟢 NODE: ROUTER")
 
     state["agent"] = route_query(
         customer_id=state["customer_id"],
-        message=state["message"]
+        message=state["message"],
+        features=_features(state)
     )
     return state
 
@@ -71,7 +111,7 @@ def faq_node(state):
     print("🟢 NODE: FAQ")
 
     state["response"] = generate_faq_response(
-        state["customer_id"], state["message"]
+        state["customer_id"], state["message"], _features(state)
     )
     return state
 
@@ -80,7 +120,7 @@ def account_node(state):
     print("🟢 NODE: ACCOUNT")
 
     state["response"] = generate_account_response(
-        state["customer_id"], state["message"]
+        state["customer_id"], state["message"], _features(state)
     )
     return state
 
@@ -89,7 +129,7 @@ def billing_node(state):
     print("🟢 NODE: BILLING")
 
     state["response"] = generate_billing_response(
-        state["customer_id"], state["message"]
+        state["customer_id"], state["message"], _features(state)
     )
     return state
 
@@ -98,7 +138,7 @@ def technical_node(state):
     print("🟢 NODE: TECHNICAL")
 
     state["response"] = generate_technical_response(
-        state["customer_id"], state["message"]
+        state["customer_id"], state["message"], _features(state)
     )
     return state
 
@@ -118,3 +158,117 @@ def escalation_node(state):
         "They will contact you shortly."
     )
     return state
+
+
+# =====================================================================
+# Async variants (used by async_support_graph via ainvoke)
+# LLM calls and Supabase lookups (pooled PostgREST client) are native
+# async; blocking SMTP/webhook work is moved off the event loop with
+# asyncio.to_thread.
+# =====================================================================
+
+async def priority_node_async(state):
+    print("🟢 NODE: PRIORITY")
+
+    state["priority"] = await analyze_priority_async(
+        customer_id=state["customer_id"],
+        message=state["message"],
+        features=_features(state)
+    )
+    return state
+
+
+async def classify_node_async(state):
+    print("🟢 NODE: CLASSIFY")
+
+    result = await classify_query_async(
+        customer_id=state["customer_id"],
+        message=state["message"],
+        features=_features(state)
+    )
+    state["priority"] = result["priority"]
+    state["agent"] = result["agent"]
+    return state
+
+
+async def turn_count_node_async(state):
+    print("🟢 NODE: TURN COUNT")
+
+    state["user_turns"] = await get_user_turn_count_async(state["customer_id"])
+    return state
+
+
+async def router_node_async(state):
+    print("🟢 NODE: ROUTER")
+
+    state["agent"] = await route_query_async(
+        customer_id=state["customer_id"],
+        message=state["message"],
+        features=_features(state)
+    )
+    return state
+
+
+async def faq_node_async(state):
+    print("🟢 NODE: FAQ")
+
+    state["response"] = await generate_faq_response_async(
+        state["customer_id"], state["message"], _features(state)
+    )
+    return state
+
+
+async def account_node_async(state):
+    print("🟢 NODE: ACCOUNT")
+
+    state["response"] = await generate_account_response_async(
+        state["customer_id"], state["message"], _features(state)
+    )
+    return state
+
+
+async def billing_node_async(state):
+    print("🟢 NODE: BILLING")
+
+    # Billing listings can be long: stream each line as a custom event.
+    # The separator goes before every line but the first, so the chunks
+    # join to exactly the "\n"-joined response.
+    writer = get_stream_writer()
+    first = True
+
+    def on_line(line):
+        nonlocal first
+        writer({"chunk": line if first else "\n" + line})
+        first = False
+
+    state["response"] = await generate_billing_response_async(
+        state["customer_id"], state["message"], _features(state),
+        on_line=on_line
+    )
+    return state
+
+
+async def technical_node_async(state):
+    print("🟢 NODE: TECHNICAL")
+
+    state["response"] = await generate_technical_response_async(
+        state["customer_id"], state["message"], _features(state)
+    )
+    return state
+
+
+async def escalation_node_async(state):
+    print("🟢 NODE: ESCALATION")
+
+    await asyncio.to_thread(
+        send_escalation_alert,
+        customer_id=state["customer_id"],
+        message=state["message"]
+    )
+
+    state["response"] = (
+        "🚨 Your issue could not be resolved automatically.\n"
+        "It has been escalated to our Support Team.\n"
+        "They will contact you shortly."
+    )
+    return state
@@ -1,8 +1,10 @@
 from typing import TypedDict, Optional
+from app.utils.intent_lexer import IntentFeatures
 
 class SupportState(TypedDict):
     customer_id: str
     message: str
+    features: Optional[IntentFeatures]
     priority: Optional[str]
     agent: Optional[str]
     response: Optional[str]
@@ -1,64 +1,95 @@
+import os
 from langgraph.graph import StateGraph, END
 from app.graph.state import SupportState
-from app.graph.nodes import (
-    priority_node,
-    turn_count_node,
-    escalation_decision,
-    router_node,
-    faq_node,
-    account_node,
-    billing_node,
-    technical_node,
-    escalation_node
-)
-
-graph = StateGraph(SupportState)
-
-# Nodes
-graph.add_node("priority", priority_node)
-graph.add_node("turn_count", turn_count_node)
-graph.add_node("router", router_node)
-
-graph.add_node("faq", faq_node)
-graph.add_node("account", account_node)
-graph.add_node("billing", billing_node)
-graph.add_node("technical", technical_node)
-
-graph.add_node("escalation", escalation_node)
-
-# Entry
-graph.set_entry_point("priority")
-
-# Priority → Turn Count
-graph.add_edge("priority", "turn_count")
-
-# Escalation decision
-graph.add_conditional_edges(
-    "turn_count",
-    escalation_decision,
-    {
-        "ESCALATE": "escalation",
-        "CONTINUE": "router"
-    }
-)
-
-# Agent routing
-graph.add_conditional_edges(
-    "router",
-    lambda s: s["agent"],
-    {
-        "FAQ_AGENT": "faq",
-        "ACCOUNT_AGENT": "account",
-        "BILLING_AGENT": "billing",
-        "TECHNICAL_AGENT": "technical"
-    }
-)
-
-# Ends
-graph.add_edge("faq", END)
-graph.add_edge("account", END)
-graph.add_edge("billing", END)
-graph.add_edge("technical", END)
-graph.add_edge("escalation", END)
-
-support_graph = graph.compile()
+from app.graph import nodes
+
+# "fused" = one LLM call for priority + routing, "split" = two sequential calls
+CLASSIFICATION_MODE = os.getenv("CLASSIFICATION_MODE", "fused").lower()
+
+AGENT_NODES = {
+    "FAQ_AGENT": "faq",
+    "ACCOUNT_AGENT": "account",
+    "BILLING_AGENT": "billing",
+    "TECHNICAL_AGENT": "technical"
+}
+
+
+def build_support_graph(use_async: bool = False):
+    """
+    Build the support graph. With use_async=True every node is a coroutine,
+    so the compiled graph should be driven with ainvoke().
+    """
+    suffix = "_async" if use_async else ""
+
+    def node(name):
+        return getattr(nodes, f"{name}_node{suffix}")
+
+    graph = StateGraph(SupportState)
+
+    # Nodes
+    if CLASSIFICATION_MODE == "split":
+        graph.add_node("priority", node("priority"))
+        graph.add_node("router", node("router"))
+    else:
+        graph.add_node("classify", node("classify"))
+    graph.add_node("turn_count", node("turn_count"))
+
+    graph.add_node("faq", node("faq"))
+    graph.add_node("account", node("account"))
+    graph.add_node("billing", node("billing"))
+    graph.add_node("technical", node("technical"))
+
+    graph.add_node("escalation", node("escalation"))
+
+    if CLASSIFICATION_MODE == "split":
+        # Entry
+        graph.set_entry_point("priority")
+
+        # Priority → Turn Count
+        graph.add_edge("priority", "turn_count")
+
+        # Escalation decision
+        graph.add_conditional_edges(
+            "turn_count",
+            nodes.escalation_decision,
+            {
+                "ESCALATE": "escalation",
+                "CONTINUE": "router"
+            }
+        )
+
+        # Agent routing
+        graph.add_conditional_edges(
+            "router",
+            lambda s: s["agent"],
+            AGENT_NODES
+        )
+    else:
+        # Entry
+        graph.set_entry_point("classify")
+
+        # Classify → Turn Count
+        graph.add_edge("classify", "turn_count")
+
+        # Escalation decision, otherwise straight to the classified agent
+        graph.add_conditional_edges(
+            "turn_count",
+            nodes.escalation_or_agent,
+            {
+                "ESCALATE": "escalation",
+                **AGENT_NODES
+            }
+        )
+
+    # Ends
+    graph.add_edge("faq", END)
+    graph.add_edge("account", END)
+    graph.add_edge("billing", END)
+    graph.add_edge("technical", END)
+    graph.add_edge("escalation", END)
+
+    return graph.compile()
+
+
+support_graph = build_support_graph()
+async_support_graph = build_support_graph(use_async=True)
@@ -1,18 +1,35 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, Field, validator
 from typing import Optional
+import json
+import os
 import time
 
-from app.services.auth_service import verify_user
-from app.services.session_store import append_message, get_session_stats
-from app.graph.support_graph import support_graph
+from app.services.auth_service import verify_user_async
+from app.services.session_store import append_message_async, get_session_stats, close_session_store
+from app.services.account_cache import get_account_cache_stats
+from app.services.faq_index import start_faq_index_refresher, stop_faq_index_refresher, get_faq_index_stats
+from app.services.issue_queue import start_issue_writer, stop_issue_writer, get_issue_queue_stats
+from app.services.email_queue import start_email_sender, stop_email_sender, get_email_queue_stats
+from app.services.admission import AdmissionRejected, admit, get_admission_stats
+from app.services.orchestrator import DECISION_CACHE, get_routing_stats, get_llm_health, compact_session_async
+from app.graph.support_graph import async_support_graph
 from app.utils.logger import logger
-from app.utils.rate_limiter import check_rate_limit, get_rate_limit_status
+from app.utils.supabase_async import close_async_supabase, get_async_supabase_stats
+from app.utils.rate_limiter import (
+    check_rate_limit_async, rate_limit_headers_async, get_rate_limiter_stats,
+    start_rate_limit_sweeper, stop_rate_limit_sweeper
+)
 
 app = FastAPI(title="Customer Support API", version="2.0.0")
 
+# Reverse proxies in front of the app that append to X-Forwarded-For
+# (0: use the connecting address, the header is client-controlled)
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -22,6 +39,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.on_event("startup")
+def startup():
+    start_rate_limit_sweeper()
+    # Re-sends technical issues spooled before the last shutdown or crash
+    start_issue_writer()
+    # Delivers billing emails left undelivered by the last shutdown
+    start_email_sender()
+    # FAQ questions are answered from memory; load it before the first one
+    start_faq_index_refresher()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    stop_rate_limit_sweeper()
+    stop_faq_index_refresher()
+    # Drain the technical issue write-behind queue into the database
+    stop_issue_writer()
+    # Deliver queued emails (leftovers are kept for the next start)
+    stop_email_sender()
+    # Persistent session stores snapshot here so restarts replay nothing
+    close_session_store()
+    await close_async_supabase()
+
+
 # -------- Schemas --------
 class VerifyRequest(BaseModel):
     email: str = Field(..., min_length=1, max_length=255, description="User email address")
@@ -46,6 +88,13 @@ class ChatRequest(BaseModel):
         return v.strip()
 
 
+NO_RESPONSE_MESSAGE = "I apologize, but I couldn't process your request."
+GRAPH_ERROR_MESSAGE = (
+    "I'm experiencing technical difficulties. "
+    "Your message has been logged and our team will assist you shortly."
+)
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Global exception handler for unhandled errors"""
@@ -59,12 +108,50 @@ async def global_exception_handler(request: Request, exc: Exception):
     )
 
 
+async def _admit(message: str):
+    """Wait for an admission slot (priority from local keywords); 503 with Retry-After when shed"""
+    try:
+        return await admit(message)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Service is busy. Please retry shortly.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+
+async def _enforce_rate_limit(key: str, route: str) -> dict:
+    """Raise 429 (with X-RateLimit-* and Retry-After headers) if over the limit, else return the headers"""
+    is_allowed, rate_limit_msg = await check_rate_limit_async(key, route)
+    headers = await rate_limit_headers_async(key, route)
+    if not is_allowed:
+        logger.warning(f"Rate limit exceeded for {key} on {route}")
+        raise HTTPException(status_code=429, detail=rate_limit_msg, headers=headers)
+    return headers
+
+
+def _client_address(request: Request) -> str:
+    """Caller address: the X-Forwarded-For entry added by the outermost trusted proxy, else the peer"""
+    peer = request.client.host if request.client else "unknown"
+    if TRUSTED_PROXY_HOPS <= 0:
+        return peer
+    hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    if len(hops) < TRUSTED_PROXY_HOPS:
+        return peer
+    return hops[-TRUSTED_PROXY_HOPS]
+
+
 @app.post("/verify-user")
-def verify_user_endpoint(data: VerifyRequest):
+async def verify_user_endpoint(data: VerifyRequest, request: Request, response: Response):
     """Verify user credentials"""
+    # Callers are not identified yet: limited per address and submitted email,
+    # so users sharing a proxy or NAT do not share one budget
+    key = f"{_client_address(request)}|{data.email}"
+    response.headers.update(await _enforce_rate_limit(key, "verify"))
+
     try:
         logger.info(f"Verification attempt for email: {data.email}")
-        result = verify_user(data.email, data.phone)
+        result = await verify_user_async(data.email, data.phone)
 
         if not result["verified"]:
             logger.warning(f"Verification failed for email: {data.email}")
@@ -80,47 +167,51 @@ def verify_user_endpoint(data: VerifyRequest):
 
 
 @app.post("/chat")
-def chat_endpoint(data: ChatRequest):
-    """Process chat message and return response"""
+async def chat_endpoint(data: ChatRequest, background_tasks: BackgroundTasks, response: Response):
+    """Process chat message and return response (runs on the event loop, no threadpool worker held)"""
     start_time = time.time()
     
     try:
         # Check rate limit
-        is_allowed, rate_limit_msg = check_rate_limit(data.customer_id)
-        if not is_allowed:
-            logger.warning(f"Rate limit exceeded for customer {data.customer_id}")
-            raise HTTPException(status_code=429, detail=rate_limit_msg)
+        response.headers.update(await _enforce_rate_limit(data.customer_id, "chat"))
+
+        # Wait for capacity: security reports and failures go before routine traffic
+        slot, features = await _admit(data.message)
         
         logger.info(f"Chat request from customer {data.customer_id}: {data.message[:100]}")
         
-        # Store user message FIRST
-        append_message(
-            customer_id=data.customer_id,
-            role="user",
-            content=data.message
-        )
-
-        # Run LangGraph
         try:
-            final_state = support_graph.invoke({
-                "customer_id": data.customer_id,
-                "message": data.message
-            })
-            bot_response = final_state.get("response", "I apologize, but I couldn't process your request.")
-        except Exception as e:
-            logger.error(f"LangGraph execution error: {e}", exc_info=True)
-            bot_response = (
-                "I'm experiencing technical difficulties. "
-                "Your message has been logged and our team will assist you shortly."
+            # Store user message FIRST
+            await append_message_async(
+                customer_id=data.customer_id,
+                role="user",
+                content=data.message
             )
 
-        # Store assistant response
-        append_message(
-            customer_id=data.customer_id,
-            role="assistant",
-            content=bot_response
-        )
+            # Run LangGraph
+            try:
+                final_state = await async_support_graph.ainvoke({
+                    "customer_id": data.customer_id,
+                    "message": data.message,
+                    "features": features
+                })
+                bot_response = final_state.get("response", NO_RESPONSE_MESSAGE)
+            except Exception as e:
+                logger.error(f"LangGraph execution error: {e}", exc_info=True)
+                bot_response = GRAPH_ERROR_MESSAGE
+
+            # Store assistant response
+            await append_message_async(
+                customer_id=data.customer_id,
+                role="assistant",
+                content=bot_response
+            )
+        finally:
+            slot.release()
         
+        # Fold older turns into the rolling summary once the reply is out
+        background_tasks.add_task(compact_session_async, data.customer_id)
+
         processing_time = time.time() - start_time
         logger.info(f"Chat response generated in {processing_time:.2f}s for customer {data.customer_id}")
 
@@ -129,11 +220,115 @@ def chat_endpoint(data: ChatRequest):
             "processing_time_ms": round(processing_time * 1000, 2)
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Chat endpoint error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Chat processing error")
 
 
+def _sse(event: str, payload: dict) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+async def _chat_event_stream(data: ChatRequest, start_time: float, slot, features):
+    """
+    Drive the graph with astream and translate progress into SSE events:
+    priority, agent, chunk (response text, line by line) and finally done.
+    The admission slot is held until the stream ends.
+    """
+    bot_response = None
+    streamed = False
+
+    try:
+        async for mode, chunk in async_support_graph.astream(
+            {"customer_id": data.customer_id, "message": data.message, "features": features},
+            stream_mode=["updates", "custom"]
+        ):
+            # Agents that stream their own output (billing listings)
+            if mode == "custom":
+                streamed = True
+                yield _sse("chunk", {"text": chunk["chunk"]})
+                continue
+
+            for node_name, update in chunk.items():
+                if not update:
+                    continue
+                if node_name in ("classify", "priority") and update.get("priority"):
+                    yield _sse("priority", {"priority": update["priority"]})
+                if node_name in ("classify", "router") and update.get("agent"):
+                    yield _sse("agent", {"agent": update["agent"]})
+                if update.get("response"):
+                    bot_response = update["response"]
+
+        bot_response = bot_response or NO_RESPONSE_MESSAGE
+        if not streamed:
+            # Separator between lines only, so the chunks join to the response
+            lines = bot_response.split("\n")
+            for number, line in enumerate(lines):
+                yield _sse("chunk", {"text": line + ("\n" if number < len(lines) - 1 else "")})
+    except Exception as e:
+        logger.error(f"LangGraph streaming error: {e}", exc_info=True)
+        bot_response = GRAPH_ERROR_MESSAGE
+        yield _sse("chunk", {"text": bot_response})
+    finally:
+        slot.release()
+
+    # Store assistant response
+    await append_message_async(
+        customer_id=data.customer_id,
+        role="assistant",
+        content=bot_response
+    )
+
+    processing_time = time.time() - start_time
+    logger.info(f"Streamed chat response in {processing_time:.2f}s for customer {data.customer_id}")
+
+    yield _sse("done", {
+        "response": bot_response,
+        "processing_time_ms": round(processing_time * 1000, 2)
+    })
+
+
+async def _after_stream(customer_id: str, slot):
+    # Releasing is idempotent; covers streams that never started iterating
+    slot.release()
+    await compact_session_async(customer_id)
+
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(data: ChatRequest):
+    """Process chat message and stream progress and the response as Server-Sent Events"""
+    start_time = time.time()
+
+    # Check rate limit
+    rate_headers = await _enforce_rate_limit(data.customer_id, "chat")
+
+    # Wait for capacity before committing to a 200 stream
+    slot, features = await _admit(data.message)
+
+    logger.info(f"Streaming chat request from customer {data.customer_id}: {data.message[:100]}")
+
+    # Store user message FIRST
+    try:
+        await append_message_async(
+            customer_id=data.customer_id,
+            role="user",
+            content=data.message
+        )
+    except Exception:
+        slot.release()
+        raise
+
+    return StreamingResponse(
+        _chat_event_stream(data, start_time, slot, features),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **rate_headers},
+        background=BackgroundTask(_after_stream, data.customer_id, slot)
+    )
+
+
 @app.get("/")
 def health():
     """Health check endpoint"""
@@ -153,7 +348,17 @@ def detailed_health():
             "status": "ok",
             "service": "customer_support",
             "version": "2.0.0",
-            "sessions": stats
+            "sessions": stats,
+            "routing_cache": DECISION_CACHE.stats(),
+            "routing": get_routing_stats(),
+            "llm": get_llm_health(),
+            "rate_limiter": get_rate_limiter_stats(),
+            "admission": get_admission_stats(),
+            "supabase": get_async_supabase_stats(),
+            "account_cache": get_account_cache_stats(),
+            "issue_queue": get_issue_queue_stats(),
+            "email_queue": get_email_queue_stats(),
+            "faq_index": get_faq_index_stats()
         }
     except Exception as e:
         logger.error(f"Health check error: {e}")
@@ -0,0 +1,90 @@
+"""
+Per-process read-through cache of `accounts` rows.
+
+verify_user, get_account and get_user_email all read the same row, so
+each lookup fetches the full row (ACCOUNT_ROW_COLUMNS) once and answers
+the others from ACCOUNT_CACHE, keyed by customer_id. Verification keeps
+a second map (email, phone) -> customer_id; a hit there only counts if
+the cached row still carries that email and phone, so invalidating the
+row (update_phone / update_dob) also invalidates its verification key.
+
+A read that was in flight while any account was invalidated does not
+populate the cache (it may carry the pre-update row); reads capture
+read_epoch() before querying for that check.
+
+Invalidation is local to the process: other workers see a write after at
+most ACCOUNT_CACHE_TTL_SECONDS. ACCOUNT_CACHE_SIZE=0 disables the cache.
+"""
+import os
+import threading
+from typing import Optional
+
+from app.utils.ttl_cache import TTLCache
+
+ACCOUNT_ROW_COLUMNS = "customer_id, name, email, phone, dob"
+
+ACCOUNT_CACHE = TTLCache(
+    max_size=int(os.getenv("ACCOUNT_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("ACCOUNT_CACHE_TTL_SECONDS", "300"))
+)
+VERIFY_CACHE = TTLCache(max_size=ACCOUNT_CACHE.max_size, ttl_seconds=ACCOUNT_CACHE.ttl_seconds)
+
+# Bumped by every invalidation
+_epoch = 0
+_epoch_lock = threading.Lock()
+
+
+def project(row: dict, columns: str) -> dict:
+    """The subset of a cached row a narrower select would have returned"""
+    return {column.strip(): row.get(column.strip()) for column in columns.split(",")}
+
+
+def cached_account(customer_id: str) -> Optional[dict]:
+    return ACCOUNT_CACHE.get(customer_id)
+
+
+def read_epoch() -> int:
+    return _epoch
+
+
+def remember_account(row: dict, epoch: int):
+    """Cache a row fetched after read_epoch() returned `epoch`"""
+    if row and row.get("customer_id"):
+        with _epoch_lock:
+            if epoch == _epoch:
+                ACCOUNT_CACHE.set(row["customer_id"], row)
+
+
+def cached_verification(email: str, phone: str) -> Optional[dict]:
+    """The verified account row for (email, phone), or None if not cached / stale"""
+    customer_id = VERIFY_CACHE.get((email, phone))
+    if customer_id is None:
+        return None
+    row = ACCOUNT_CACHE.get(customer_id)
+    if row is None or row.get("email") != email or row.get("phone") != phone:
+        VERIFY_CACHE.delete((email, phone))
+        return None
+    return row
+
+
+def remember_verification(email: str, phone: str, row: dict, epoch: int):
+    """Only successful verifications are cached, so new accounts verify at once"""
+    if row and row.get("customer_id"):
+        with _epoch_lock:
+            if epoch == _epoch:
+                ACCOUNT_CACHE.set(row["customer_id"], row)
+                VERIFY_CACHE.set((email, phone), row["customer_id"])
+
+
+def invalidate_account(customer_id: str):
+    global _epoch
+    with _epoch_lock:
+        _epoch += 1
+        ACCOUNT_CACHE.delete(customer_id)
+
+
+def get_account_cache_stats() -> dict:
+    return {
+        "accounts": ACCOUNT_CACHE.stats(),
+        "verifications": VERIFY_CACHE.stats()
+    }
@@ -1,33 +1,84 @@
+from app.services.account_cache import (
+    ACCOUNT_ROW_COLUMNS, cached_account, remember_account, invalidate_account, project, read_epoch
+)
+from app.utils import supabase_async as db
 from app.utils.supabase_client import supabase
 
+ACCOUNT_COLUMNS = "customer_id, phone, dob"
+
+
+def fetch_account_row(customer_id: str) -> dict:
+    """Full account row, read through the account cache"""
+    row = cached_account(customer_id)
+    if row is None:
+        epoch = read_epoch()
+        row = (
+            supabase
+            .table("accounts")
+            .select(ACCOUNT_ROW_COLUMNS)
+            .eq("customer_id", customer_id)
+            .single()
+            .execute()
+        ).data
+        remember_account(row, epoch)
+    return row
+
+
 def get_account(customer_id: str):
-    response = (
-        supabase
-        .table("accounts")
-        .select("customer_id, phone, dob")
-        .eq("customer_id", customer_id)
-        .single()
-        .execute()
-    )
-    return response.data
+    row = fetch_account_row(customer_id)
+    return project(row, ACCOUNT_COLUMNS) if row else row
 
 
 def update_phone(customer_id: str, new_phone: str):
-    return (
-        supabase
-        .table("accounts")
-        .update({"phone": new_phone})
-        .eq("customer_id", customer_id)
-        .execute()
-    )
+    try:
+        return (
+            supabase
+            .table("accounts")
+            .update({"phone": new_phone})
+            .eq("customer_id", customer_id)
+            .execute()
+        )
+    finally:
+        invalidate_account(customer_id)
 
 
 def update_dob(customer_id: str, new_dob: str):
-    return (
-        supabase
-        .table("accounts")
-        .update({"dob": new_dob})
-        .eq("customer_id", customer_id)
-        .execute()
-    )
+    try:
+        return (
+            supabase
+            .table("accounts")
+            .update({"dob": new_dob})
+            .eq("customer_id", customer_id)
+            .execute()
+        )
+    finally:
+        invalidate_account(customer_id)
+
+
+# -------- Async (pooled PostgREST client) --------
+async def fetch_account_row_async(customer_id: str) -> dict:
+    row = cached_account(customer_id)
+    if row is None:
+        epoch = read_epoch()
+        row = await db.select("accounts", ACCOUNT_ROW_COLUMNS, {"customer_id": db.eq(customer_id)}, single=True)
+        remember_account(row, epoch)
+    return row
+
+
+async def get_account_async(customer_id: str):
+    row = await fetch_account_row_async(customer_id)
+    return project(row, ACCOUNT_COLUMNS) if row else row
+
+
+async def update_phone_async(customer_id: str, new_phone: str):
+    try:
+        return await db.update("accounts", {"phone": new_phone}, {"customer_id": db.eq(customer_id)})
+    finally:
+        invalidate_account(customer_id)
+
 
+async def update_dob_async(customer_id: str, new_dob: str):
+    try:
+        return await db.update("accounts", {"dob": new_dob}, {"customer_id": db.eq(customer_id)})
+    finally:
+        invalidate_account(customer_id)
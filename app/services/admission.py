@@ -0,0 +1,206 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from app.utils.intent_lexer import IntentFeatures, extract_intents
+from app.utils.logger import logger
+
+# Highest first: queued requests are admitted in this order
+PRIORITIES = ("CRITICAL", "HIGH", "LOW")
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed (queue over its bound) or misses its queue deadline"""
+
+    def __init__(self, priority: str, reason: str, retry_after: int = 1):
+        super().__init__(f"{priority} request {reason}")
+        self.priority = priority
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def pre_classify(features: IntentFeatures) -> str:
+    """Cheap local priority from the escalation and priority keywords (no LLM)"""
+    if features.has("critical_security"):
+        return "CRITICAL"
+    if features.has("high_priority"):
+        return "HIGH"
+    return "LOW"
+
+
+def _parse_levels(raw: str, defaults: Dict[str, float]) -> Dict[str, float]:
+    """"CRITICAL:1000,HIGH:200" -> {"CRITICAL": 1000.0, "HIGH": 200.0, "LOW": <default>}"""
+    levels = dict(defaults)
+    for item in (raw or "").split(","):
+        name, _, value = item.strip().partition(":")
+        if name.upper() in levels and value:
+            levels[name.upper()] = float(value)
+    return levels
+
+
+class AdmissionSlot:
+    """A granted unit of concurrency; release() is idempotent"""
+
+    __slots__ = ("controller", "priority", "released")
+
+    def __init__(self, controller: "AdmissionController", priority: str):
+        self.controller = controller
+        self.priority = priority
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release()
+
+
+class AdmissionController:
+    """
+    Global concurrency limit with per-priority FIFO queues in front of it.
+
+    A request runs immediately while fewer than `max_concurrent` are in
+    flight and nothing is queued. Otherwise it queues behind every request
+    of equal or higher priority. A priority is shed with an immediate
+    AdmissionRejected once the total queue depth reaches its `queue_limits`
+    bound (LOW has the smallest bound, so it is shed first), and a queued
+    request that waits longer than its `deadlines` entry is rejected too.
+    """
+
+    def __init__(self, max_concurrent: int, queue_limits: Dict[str, float], deadlines: Dict[str, float],
+                 wait_samples: int = 500):
+        self.max_concurrent = max_concurrent
+        self.queue_limits = queue_limits
+        self.deadlines = deadlines  # seconds
+
+        self.in_flight = 0
+        self._queues: Dict[str, deque] = {p: deque() for p in PRIORITIES}
+        self._waits: Dict[str, deque] = {p: deque(maxlen=wait_samples) for p in PRIORITIES}
+        self.counters: Dict[str, Dict[str, int]] = {
+            p: {"admitted": 0, "queued": 0, "shed": 0, "timed_out": 0} for p in PRIORITIES
+        }
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    async def acquire(self, priority: str) -> AdmissionSlot:
+        """Wait for a slot; raises AdmissionRejected if shed or past the queue deadline"""
+        counters = self.counters[priority]
+
+        if self.in_flight < self.max_concurrent and not self.queued:
+            self.in_flight += 1
+            counters["admitted"] += 1
+            self._waits[priority].append(0.0)
+            return AdmissionSlot(self, priority)
+
+        if self.queued >= self.queue_limits[priority]:
+            counters["shed"] += 1
+            raise AdmissionRejected(priority, "shed: queue full", retry_after=1)
+
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues[priority]
+        queue.append(future)
+        counters["queued"] += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.deadlines[priority])
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # Granted at the deadline: hand the slot on instead of leaking it
+                self._release()
+            else:
+                future.cancel()
+            counters["timed_out"] += 1
+            raise AdmissionRejected(priority, "timed out in queue", retry_after=2)
+        except asyncio.CancelledError:
+            # Client went away while queued
+            if future.done() and not future.cancelled():
+                self._release()
+            else:
+                future.cancel()
+            raise
+        finally:
+            if future in queue:
+                queue.remove(future)
+
+        counters["admitted"] += 1
+        self._waits[priority].append(time.monotonic() - started)
+        return AdmissionSlot(self, priority)
+
+    def _release(self):
+        """Hand the slot to the oldest waiter of the highest priority, or free it"""
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue:
+                future = queue.popleft()
+                if not future.done():
+                    # in_flight is unchanged: the slot moves to the waiter
+                    future.set_result(None)
+                    return
+        self.in_flight -= 1
+
+    @staticmethod
+    def _percentile(samples, pct: float) -> Optional[float]:
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+    def stats(self) -> dict:
+        """Queue depth, wait times and admission counters per priority"""
+        per_priority = {}
+        for priority in PRIORITIES:
+            waits = self._waits[priority]
+            p50 = self._percentile(waits, 50)
+            p95 = self._percentile(waits, 95)
+            per_priority[priority] = {
+                "queue_depth": len(self._queues[priority]),
+                "queue_limit": self.queue_limits[priority],
+                "deadline_ms": self.deadlines[priority] * 1000,
+                "wait_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "wait_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                **self.counters[priority]
+            }
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrent": self.max_concurrent,
+            "queued": self.queued,
+            "priorities": per_priority
+        }
+
+
+ADMISSION = AdmissionController(
+    max_concurrent=int(os.getenv("ADMISSION_MAX_CONCURRENT", "32")),
+    queue_limits=_parse_levels(
+        os.getenv("ADMISSION_QUEUE_LIMITS"),
+        {"CRITICAL": 1000, "HIGH": 200, "LOW": 50}
+    ),
+    deadlines={
+        priority: ms / 1000
+        for priority, ms in _parse_levels(
+            os.getenv("ADMISSION_DEADLINES_MS"),
+            {"CRITICAL": 30000, "HIGH": 10000, "LOW": 3000}
+        ).items()
+    }
+)
+
+
+async def admit(message: str):
+    """
+    Pre-classify the message and wait for an admission slot.
+    Returns (slot, features); the features are reused by the graph.
+    """
+    features = extract_intents(message)
+    priority = pre_classify(features)
+    try:
+        slot = await ADMISSION.acquire(priority)
+    except AdmissionRejected as e:
+        logger.warning(f"Admission rejected: {e}")
+        raise
+    return slot, features
+
+
+def get_admission_stats() -> dict:
+    return ADMISSION.stats()
@@ -1,21 +1,52 @@
+from app.services.account_cache import (
+    ACCOUNT_ROW_COLUMNS, cached_verification, remember_verification, project, read_epoch
+)
+from app.utils import supabase_async as db
 from app.utils.supabase_client import supabase
 
+AUTH_COLUMNS = "customer_id, name, email, phone"
+
+
+def _verification(rows: list) -> dict:
+    if rows:
+        return {
+            "verified": True,
+            "customer": project(rows[0], AUTH_COLUMNS)
+        }
+
+    return {
+        "verified": False
+    }
+
+
 def verify_user(email: str, phone: str):
+    row = cached_verification(email, phone)
+    if row:
+        return _verification([row])
+
+    epoch = read_epoch()
     response = (
         supabase
         .table("accounts")
-        .select("customer_id, name, email, phone")
+        .select(ACCOUNT_ROW_COLUMNS)
         .eq("email", email)
         .eq("phone", phone)
         .execute()
     )
 
     if response.data:
-        return {
-            "verified": True,
-            "customer": response.data[0]
-        }
+        remember_verification(email, phone, response.data[0], epoch)
+    return _verification(response.data)
 
-    return {
-        "verified": False
-    }
+
+async def verify_user_async(email: str, phone: str):
+    row = cached_verification(email, phone)
+    if row:
+        return _verification([row])
+
+    epoch = read_epoch()
+    rows = await db.select("accounts", ACCOUNT_ROW_COLUMNS, {"email": db.eq(email), "phone": db.eq(phone)})
+
+    if rows:
+        remember_verification(email, phone, rows[0], epoch)
+    return _verification(rows)
@@ -1,5 +1,9 @@
+from app.utils import supabase_async as db
 from app.utils.supabase_client import supabase
 
+BILLING_COLUMNS = "order_id, product_name, amount, plan, price, status, billing_type, next_billing_date, payment_method"
+
+
 def get_customer_orders(customer_id: str):
     """
     Get customer billing information - supports both orders and subscriptions.
@@ -9,18 +13,32 @@ def get_customer_orders(customer_id: str):
     response = (
         supabase
         .table("billing")
-        .select("order_id, product_name, amount, plan, price, status, billing_type, next_billing_date, payment_method")
+        .select(BILLING_COLUMNS)
         .eq("customer_id", customer_id)
         .order("created_at", desc=True)
         .execute()
     )
 
-    if not response.data:
+    return _normalize_billing(response.data)
+
+
+async def get_customer_orders_async(customer_id: str):
+    """Async variant of get_customer_orders (pooled PostgREST client)"""
+    rows = await db.select(
+        "billing", BILLING_COLUMNS,
+        {"customer_id": db.eq(customer_id)},
+        order="created_at.desc"
+    )
+    return _normalize_billing(rows)
+
+
+def _normalize_billing(rows: list) -> list:
+    if not rows:
         return []
 
     # Normalize the data format for the billing agent
     normalized_data = []
-    for item in response.data:
+    for item in rows:
         if item.get("billing_type") == "order" or item.get("order_id"):
             # Order-based billing
             normalized_data.append({
@@ -0,0 +1,514 @@
+"""
+Background queue for outbound email.
+
+send_email used to connect, STARTTLS, log in, send and quit inside the
+billing chat. It now only enqueues the message; a pool of
+EMAIL_WORKERS threads renders and delivers queued messages. Each worker
+keeps one authenticated SMTP connection open and sends every ready
+message (up to EMAIL_BATCH_SIZE) over it in turn, so a burst costs one
+handshake per worker instead of one per message.
+
+Connections: a connection idle for more than EMAIL_NOOP_AFTER_SECONDS
+is probed with NOOP before use, one idle for EMAIL_IDLE_TIMEOUT_SECONDS
+is closed, and one that has sent EMAIL_MAX_PER_CONNECTION messages is
+replaced (servers cap messages per session).
+
+Failures: 5xx replies (e.g. an unknown recipient) are permanent and the
+message goes straight to dead.jsonl. 4xx replies, timeouts and dropped
+connections are retried with exponential backoff; the connection is
+reopened and messages are dead-lettered after EMAIL_MAX_ATTEMPTS.
+
+Spool: every process journals to a slot directory of its own
+(EMAIL_SPOOL_DIR/worker-<n>, claimed with an exclusive flock as in
+app/utils/spool_slots.py). Each message is appended to journal.jsonl
+when it is enqueued, and its id when it is sent or dead-lettered, so
+messages a crash or shutdown leaves undelivered are re-queued when the
+slot is next claimed. The journal is emptied
+whenever nothing is outstanding and rewritten with the outstanding
+messages once it holds more than twice as many records. A process that finds every slot locked
+sends inside the call instead (as with EMAIL_QUEUE=0).
+
+Local testing without a mail provider (aiosmtpd prints each message):
+    python -m aiosmtpd -n -l localhost:8025
+    SMTP_HOST=localhost SMTP_PORT=8025 SMTP_STARTTLS=0 uvicorn app.main:app
+
+Configuration (environment):
+    EMAIL_QUEUE                    1 | 0 (0 sends inside the request)
+    EMAIL_SPOOL_DIR                directory of the slot directories (email_spool)
+    EMAIL_SPOOL_SLOTS              slots, i.e. max sending processes (16)
+    EMAIL_SPOOL_FSYNC              always | interval | never (interval)
+    EMAIL_SPOOL_FSYNC_INTERVAL_SECONDS  fsync period for "interval" (1)
+    EMAIL_WORKERS                  delivery threads = pooled connections (2)
+    EMAIL_BATCH_SIZE               messages taken per batch (20)
+    EMAIL_MAX_ATTEMPTS             attempts before dead-lettering (5)
+    EMAIL_RETRY_BASE_SECONDS       first backoff delay (2)
+    EMAIL_RETRY_MAX_SECONDS        backoff cap (300)
+    EMAIL_MAX_PER_CONNECTION       messages before reconnecting (100)
+    EMAIL_NOOP_AFTER_SECONDS       idle time before a NOOP probe (30)
+    EMAIL_IDLE_TIMEOUT_SECONDS     idle time before disconnecting (120)
+    EMAIL_SHUTDOWN_FLUSH_SECONDS   how long shutdown waits to drain (10)
+"""
+import heapq
+import itertools
+import json
+import os
+import smtplib
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from typing import Callable, List, Optional
+
+from app.utils.logger import logger
+from app.utils.spool_slots import claim_spool_slot
+
+EMAIL_QUEUE_ENABLED = os.getenv("EMAIL_QUEUE", "1") != "0"
+SHUTDOWN_FLUSH_SECONDS = float(os.getenv("EMAIL_SHUTDOWN_FLUSH_SECONDS", "10"))
+
+# Errors after which the connection cannot be reused
+CONNECTION_ERRORS = (
+    smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError,
+    smtplib.SMTPHeloError, smtplib.SMTPAuthenticationError
+)
+
+
+def classify_error(error: Exception) -> str:
+    """"connection" (reconnect and retry), "transient" (retry) or "permanent" (dead-letter)"""
+    if isinstance(error, CONNECTION_ERRORS):
+        return "connection"
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+        return "permanent" if codes and all(code >= 500 for code in codes) else "transient"
+    if isinstance(error, smtplib.SMTPResponseException):
+        if error.smtp_code == 421:
+            # Service closing the transmission channel
+            return "connection"
+        return "permanent" if error.smtp_code >= 500 else "transient"
+    if isinstance(error, OSError):
+        # Socket errors, timeouts, TLS failures and other SMTPExceptions
+        return "connection"
+    return "permanent"
+
+
+class _Connection:
+    """One worker's SMTP session"""
+
+    __slots__ = ("smtp", "sent", "last_used")
+
+    def __init__(self):
+        self.smtp: Optional[smtplib.SMTP] = None
+        self.sent = 0
+        self.last_used = 0.0
+
+
+class EmailQueue:
+    """
+    Journaled queue of messages delivered by `workers` threads, each over
+    its own connection from `connect()` (connected, and authenticated if
+    needed). `render(to, subject, body)` returns the message source.
+    `directory` must not be shared with another process.
+    """
+
+    FSYNC_POLICIES = ("always", "interval", "never")
+
+    def __init__(self, directory: str, connect: Callable[[], smtplib.SMTP],
+                 render: Callable[[str, str, str], str], from_email: str,
+                 workers: int = 2, batch_size: int = 20, max_attempts: int = 5,
+                 retry_base: float = 2.0, retry_max: float = 300.0, max_per_connection: int = 100,
+                 noop_after: float = 30.0, idle_timeout: float = 120.0,
+                 fsync: str = "interval", fsync_interval: float = 1.0):
+        if fsync not in self.FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.directory = directory
+        self.connect = connect
+        self.render = render
+        self.from_email = from_email
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.max_per_connection = max_per_connection
+        self.noop_after = noop_after
+        self.idle_timeout = idle_timeout
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+
+        self._cond = threading.Condition()
+        self._ready: deque = deque()
+        self._delayed: list = []  # heap of (due, seq, message)
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+        self._drain_deadline = 0.0
+        self.counters = Counter()
+        self.last_error: Optional[str] = None
+        self._delivery_ms: deque = deque(maxlen=1000)
+        self._unsettled: dict = {}  # id -> message not yet sent or dead-lettered
+        self._journal = None
+        self._journal_records = 0
+        self._last_fsync = time.monotonic()
+
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    # ---------- spool ----------
+    def _journal_path(self) -> str:
+        return os.path.join(self.directory, "journal.jsonl")
+
+    def _recover(self):
+        """Re-queue messages the previous process journaled but never settled"""
+        path = self._journal_path()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn write at the tail after a crash
+                        break
+                    if "done" in record:
+                        self._unsettled.pop(record["done"], None)
+                    else:
+                        self._unsettled[record["id"]] = record
+        self._rewrite_journal()
+
+        self._ready.extend(self._unsettled.values())
+        if self._unsettled:
+            self.counters["recovered"] = len(self._unsettled)
+            logger.info(f"Re-queued {len(self._unsettled)} undelivered emails")
+
+    def _rewrite_journal(self):
+        """Replace the journal with one record per unsettled message (caller holds the lock)"""
+        path = self._journal_path()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for message in self._unsettled.values():
+                f.write(json.dumps(message, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(path, "a", encoding="utf-8")
+        self._journal_records = len(self._unsettled)
+
+    def _journal_write(self, record: dict):
+        """Append to the journal (caller holds the lock)"""
+        self._journal.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._journal.flush()
+        self._journal_records += 1
+        if self.fsync == "always":
+            os.fsync(self._journal.fileno())
+        elif self.fsync == "interval":
+            now = time.monotonic()
+            if now - self._last_fsync >= self.fsync_interval:
+                os.fsync(self._journal.fileno())
+                self._last_fsync = now
+
+    def _settle(self, message: dict):
+        """Journal a message as sent or dead-lettered (caller holds the lock)"""
+        self._unsettled.pop(message["id"], None)
+        if not self._unsettled:
+            self._journal.truncate(0)
+            self._journal_records = 0
+        elif self._journal_records >= 2 * len(self._unsettled) + 1000:
+            self._rewrite_journal()
+        else:
+            self._journal_write({"done": message["id"]})
+
+    def _write_lines(self, filename: str, records: list):
+        with open(os.path.join(self.directory, filename), "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _dead_letter(self, message: dict, error: str):
+        logger.error(f"Email {message['id']} to {message['to']} moved to dead letters: {error}")
+        self._write_lines("dead.jsonl", [{"message": message, "error": error, "failed_at": time.time()}])
+        with self._cond:
+            self._settle(message)
+            self.counters["dead_lettered"] += 1
+
+    def _count(self, key: str):
+        # Workers share the counters
+        with self._cond:
+            self.counters[key] += 1
+
+    # ---------- producer ----------
+    def enqueue(self, to_email: str, subject: str, body: str) -> str:
+        """Queue a message and return its id without touching the network"""
+        message = {
+            "id": uuid.uuid4().hex,
+            "to": to_email,
+            "subject": subject,
+            "body": body,
+            "attempts": 0,
+            "enqueued_at": time.time()
+        }
+        with self._cond:
+            self._journal_write(message)
+            self._unsettled[message["id"]] = message
+            self._ready.append(message)
+            self.counters["enqueued"] += 1
+            self._cond.notify()
+        self.start()
+        return message["id"]
+
+    # ---------- workers ----------
+    def start(self):
+        """Start the delivery threads (idempotent; replaces dead ones)"""
+        with self._cond:
+            self._stopping = False
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(
+                    target=self._run, name=f"email-sender-{len(self._threads)}", daemon=True
+                )
+                self._threads.append(thread)
+                thread.start()
+
+    def _should_exit(self) -> bool:
+        """Caller holds the lock"""
+        return self._stopping and (
+            (not self._ready and not self._delayed) or time.monotonic() >= self._drain_deadline
+        )
+
+    def _promote_due(self):
+        """Move delayed messages whose backoff has elapsed to the ready queue (caller holds the lock)"""
+        now = time.monotonic()
+        while self._delayed and self._delayed[0][0] <= now:
+            self._ready.append(heapq.heappop(self._delayed)[2])
+
+    def _next_batch(self, idle_deadline: Optional[float]) -> Optional[list]:
+        """Ready messages; [] when the idle deadline passes first; None when stopping"""
+        with self._cond:
+            while True:
+                self._promote_due()
+                if self._ready:
+                    batch = [self._ready.popleft() for _ in range(min(self.batch_size, len(self._ready)))]
+                    self._in_flight += len(batch)
+                    return batch
+                if self._should_exit():
+                    return None
+
+                now = time.monotonic()
+                if idle_deadline is not None and now >= idle_deadline:
+                    return []
+                deadlines = [idle_deadline] if idle_deadline is not None else []
+                if self._delayed:
+                    deadlines.append(self._delayed[0][0])
+                if self._stopping:
+                    deadlines.append(self._drain_deadline)
+                self._cond.wait(max(0.0, min(deadlines) - now) if deadlines else None)
+
+    def _run(self):
+        conn = _Connection()
+        try:
+            while True:
+                idle_deadline = conn.last_used + self.idle_timeout if conn.smtp else None
+                batch = self._next_batch(idle_deadline)
+                if batch is None:
+                    return
+                if not batch:
+                    self._disconnect(conn)
+                    continue
+                try:
+                    self._send_batch(conn, batch)
+                finally:
+                    with self._cond:
+                        self._in_flight -= len(batch)
+                        self._cond.notify_all()
+        finally:
+            self._disconnect(conn)
+
+    def _ensure_connection(self, conn: _Connection):
+        if conn.smtp is not None:
+            if conn.sent >= self.max_per_connection:
+                self._disconnect(conn)
+            elif time.monotonic() - conn.last_used > self.noop_after:
+                try:
+                    alive = conn.smtp.noop()[0] == 250
+                except (smtplib.SMTPException, OSError):
+                    alive = False
+                if not alive:
+                    self._count("stale_connections")
+                    self._disconnect(conn)
+        if conn.smtp is None:
+            conn.smtp = self.connect()
+            conn.sent = 0
+            conn.last_used = time.monotonic()
+            self._count("connections_opened")
+
+    def _disconnect(self, conn: _Connection):
+        if conn.smtp is None:
+            return
+        try:
+            conn.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            conn.smtp.close()
+        conn.smtp = None
+
+    def _send_batch(self, conn: _Connection, batch: list):
+        self._count("batches")
+        for position, message in enumerate(batch):
+            try:
+                raw = self.render(message["to"], message["subject"], message["body"])
+                self._ensure_connection(conn)
+                conn.smtp.sendmail(self.from_email, [message["to"]], raw)
+            except Exception as e:
+                kind = classify_error(e)
+                self.last_error = f"{type(e).__name__}: {e}"
+                if kind == "connection":
+                    # Nothing else can go over this connection: back off the rest of the batch too
+                    self._disconnect(conn)
+                    for unsent in batch[position:]:
+                        self._retry(unsent, self.last_error)
+                    return
+                if kind == "permanent":
+                    self._dead_letter(message, self.last_error)
+                else:
+                    self._retry(message, self.last_error)
+                continue
+
+            conn.sent += 1
+            conn.last_used = time.monotonic()
+            with self._cond:
+                self._settle(message)
+                self.counters["sent"] += 1
+                self._delivery_ms.append((time.time() - message["enqueued_at"]) * 1000)
+
+    def _retry(self, message: dict, error: str):
+        message["attempts"] += 1
+        if message["attempts"] >= self.max_attempts:
+            self._dead_letter(message, error)
+            return
+        delay = min(self.retry_max, self.retry_base * 2 ** (message["attempts"] - 1))
+        logger.warning(f"Email {message['id']} failed (attempt {message['attempts']}), retrying in {delay:.1f}s: {error}")
+        with self._cond:
+            self.counters["retries"] += 1
+            heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._seq), message))
+            self._cond.notify()
+
+    # ---------- lifecycle ----------
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until every queued message is delivered or dead-lettered; False on timeout"""
+        self.start()
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not self._ready and not self._delayed and not self._in_flight, timeout=timeout
+            )
+
+    def close(self, timeout: float = SHUTDOWN_FLUSH_SECONDS):
+        """Deliver for up to `timeout` seconds, then stop; leftovers stay journaled for the next start"""
+        with self._cond:
+            self._stopping = True
+            self._drain_deadline = time.monotonic() + timeout
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(max(0.0, self._drain_deadline - time.monotonic()) + 1)
+        with self._cond:
+            leftovers = len(self._ready) + len(self._delayed)
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+        if leftovers:
+            logger.warning(f"{leftovers} emails left undelivered at shutdown, kept in {self._journal_path()}")
+
+    def stats(self) -> dict:
+        with self._cond:
+            delivery = sorted(self._delivery_ms)
+            return {
+                "ready": len(self._ready),
+                "delayed": len(self._delayed),
+                "in_flight": self._in_flight,
+                "workers": sum(1 for t in self._threads if t.is_alive()),
+                "directory": self.directory,
+                "last_error": self.last_error,
+                "delivery_ms_p50": round(delivery[len(delivery) // 2], 1) if delivery else None,
+                "delivery_ms_p95": round(delivery[int(len(delivery) * 0.95)], 1) if delivery else None,
+                **{key: self.counters[key] for key in
+                   ("enqueued", "recovered", "sent", "batches", "retries", "dead_lettered",
+                    "connections_opened", "stale_connections")}
+            }
+
+
+_queue: Optional[EmailQueue] = None
+_queue_lock = threading.Lock()
+_slot_lock_file = None  # held open for the life of the process
+_no_free_slot = False
+
+
+def _adopt_unslotted_pending(base: str, directory: str):
+    """Move messages a shutdown left in `base`/pending.jsonl (before slots existed) into this slot's journal"""
+    legacy = os.path.join(base, "pending.jsonl")
+    if not os.path.exists(legacy):
+        return
+    with open(legacy, encoding="utf-8") as src, open(os.path.join(directory, "journal.jsonl"), "a", encoding="utf-8") as dst:
+        dst.write(src.read())
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.remove(legacy)
+    logger.info(f"Moved undelivered emails from {legacy} into {directory}")
+
+
+def get_email_queue() -> Optional[EmailQueue]:
+    """
+    The process-wide queue, created (and its leftovers re-queued) on first
+    use; None when the queue is off or every spool slot is held by another process
+    """
+    global _queue, _slot_lock_file, _no_free_slot
+    if not EMAIL_QUEUE_ENABLED:
+        return None
+    from app.services.email_service import FROM_EMAIL, render_email, smtp_connect
+
+    with _queue_lock:
+        if _queue is None and not _no_free_slot:
+            base = os.getenv("EMAIL_SPOOL_DIR", "email_spool")
+            claimed = claim_spool_slot(base, int(os.getenv("EMAIL_SPOOL_SLOTS", "16")))
+            if claimed is None:
+                _no_free_slot = True
+                logger.warning(f"Every email spool slot in {base} is locked; sending email synchronously")
+                return None
+            slot, directory, _slot_lock_file = claimed
+            if slot == 0:
+                _adopt_unslotted_pending(base, directory)
+            _queue = EmailQueue(
+                directory=directory,
+                connect=smtp_connect,
+                render=render_email,
+                from_email=FROM_EMAIL,
+                workers=int(os.getenv("EMAIL_WORKERS", "2")),
+                batch_size=int(os.getenv("EMAIL_BATCH_SIZE", "20")),
+                max_attempts=int(os.getenv("EMAIL_MAX_ATTEMPTS", "5")),
+                retry_base=float(os.getenv("EMAIL_RETRY_BASE_SECONDS", "2")),
+                retry_max=float(os.getenv("EMAIL_RETRY_MAX_SECONDS", "300")),
+                max_per_connection=int(os.getenv("EMAIL_MAX_PER_CONNECTION", "100")),
+                noop_after=float(os.getenv("EMAIL_NOOP_AFTER_SECONDS", "30")),
+                idle_timeout=float(os.getenv("EMAIL_IDLE_TIMEOUT_SECONDS", "120")),
+                fsync=os.getenv("EMAIL_SPOOL_FSYNC", "interval").lower(),
+                fsync_interval=float(os.getenv("EMAIL_SPOOL_FSYNC_INTERVAL_SECONDS", "1"))
+            )
+        return _queue
+
+
+def start_email_sender():
+    """Re-queue leftovers and start the delivery threads (call on startup)"""
+    queue = get_email_queue()
+    if queue is not None:
+        queue.start()
+
+
+def stop_email_sender():
+    """Deliver queued email on shutdown"""
+    if _queue is not None:
+        _queue.close()
+
+
+def get_email_queue_stats() -> dict:
+    if not EMAIL_QUEUE_ENABLED:
+        return {"enabled": False}
+    if _queue is None:
+        return {"enabled": True, "started": False, "no_free_slot": _no_free_slot}
+    return {"enabled": True, **_queue.stats()}
@@ -3,26 +3,57 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
+from app.services.email_queue import get_email_queue
+from app.utils.logger import logger
+
 SMTP_HOST = os.getenv("SMTP_HOST")
-SMTP_PORT = int(os.getenv("SMTP_PORT"))
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USERNAME = os.getenv("SMTP_USERNAME")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") != "0"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT_SECONDS", "10"))
 FROM_EMAIL = os.getenv("FROM_EMAIL")
 
 
-def send_email(to_email: str, subject: str, body: str):
+def smtp_connect() -> smtplib.SMTP:
+    """A connected (STARTTLS, logged in) SMTP session"""
+    server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+    try:
+        if SMTP_STARTTLS:
+            server.starttls()
+        if SMTP_USERNAME:
+            server.login(SMTP_USERNAME, SMTP_PASSWORD)
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+def render_email(to_email: str, subject: str, body: str) -> str:
     msg = MIMEMultipart()
     msg["From"] = FROM_EMAIL
     msg["To"] = to_email
     msg["Subject"] = subject
 
     msg.attach(MIMEText(body, "plain"))
+    return msg.as_string()
+
+
+def send_email(to_email: str, subject: str, body: str):
+    """
+    Queue the email for background delivery (app/services/email_queue.py);
+    sent inside the call when EMAIL_QUEUE=0 or no spool slot is free.
+    """
+    queue = get_email_queue()
+    if queue is not None:
+        queue.enqueue(to_email, subject, body)
+        return
 
     try:
-        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT)
-        server.starttls()
-        server.login(SMTP_USERNAME, SMTP_PASSWORD)
-        server.sendmail(FROM_EMAIL, to_email, msg.as_string())
-        server.quit()
+        server = smtp_connect()
+        try:
+            server.sendmail(FROM_EMAIL, [to_email], render_email(to_email, subject, body))
+        finally:
+            server.quit()
     except Exception as e:
-        print(f"❌ Email sending failed: {e}")
+        logger.error(f"❌ Email sending failed: {e}")
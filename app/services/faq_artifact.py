@@ -0,0 +1,275 @@
+"""
+Precompiled FAQ index artifact.
+
+`python -m app.tools.faq_build_index` compiles the `faqs` table (or the
+SQL seed files) into one binary file; workers started with
+FAQ_INDEX_ARTIFACT=<path> load the FAQ index from it instead of
+querying Supabase, so startup needs no network. The file is read
+through mmap and its sections are numpy views on the mapping, so
+workers on one host share its pages through the page cache.
+
+Layout (little-endian, sections 8-byte aligned):
+
+    magic "FAQIDX\\0\\0" | u32 format version | u32 header length
+    header (JSON): source, built_at, faq count, faq_version (newest
+                   updated_at), content_hash, checksum, section table
+    sections:
+        strings, string_offsets          UTF-8 blob + offsets (all text)
+        faq_id, faq_priority             per FAQ, ordered by id
+        faq_question, faq_answer         string ids
+        faq_keywords_indptr, faq_keywords    keyword ids per FAQ, in order
+        vocabulary                       keyword string ids, sorted
+        postings_indptr, postings_faq, postings_count   keyword -> FAQs
+        phrases, phrase_words_indptr, phrase_words      multi-word keywords
+
+checksum is the SHA-256 of everything after the header and is verified
+on load. content_hash covers the FAQ content only (id, question, answer,
+keywords, priority), so comparing it against a fresh compile of the
+source tells whether an artifact is stale.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"FAQIDX\0\0"
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct("<8sII")
+ALIGNMENT = 8
+
+
+class FAQArtifactError(Exception):
+    """Raised when an artifact is missing, corrupt or of another format version"""
+
+
+def content_hash(entries: Iterable) -> str:
+    """SHA-256 of the FAQ content the index is built from (order independent)"""
+    canonical = [
+        [e.id, e.question, e.answer, list(e.keywords), e.priority]
+        for e in sorted(entries, key=lambda e: e.id)
+    ]
+    return hashlib.sha256(
+        json.dumps(canonical, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+
+
+class _Strings:
+    """Interns strings into one blob; ids index string_offsets"""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.encoded: List[bytes] = []
+
+    def add(self, text: str) -> int:
+        string_id = self.ids.get(text)
+        if string_id is None:
+            string_id = self.ids[text] = len(self.encoded)
+            self.encoded.append(text.encode("utf-8"))
+        return string_id
+
+    def sections(self) -> Dict[str, np.ndarray]:
+        offsets = np.zeros(len(self.encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in self.encoded])
+        return {
+            "strings": np.frombuffer(b"".join(self.encoded), dtype=np.uint8),
+            "string_offsets": offsets
+        }
+
+
+def _indptr(lengths: List[int]) -> np.ndarray:
+    indptr = np.zeros(len(lengths) + 1, dtype=np.int32)
+    indptr[1:] = np.cumsum(lengths)
+    return indptr
+
+
+def _compile_sections(entries: list) -> Dict[str, np.ndarray]:
+    strings = _Strings()
+    entries = sorted(entries, key=lambda e: e.id)
+
+    vocabulary = sorted({keyword for entry in entries for keyword in entry.keywords})
+    keyword_ids = {keyword: i for i, keyword in enumerate(vocabulary)}
+
+    postings: Dict[int, Dict[int, int]] = {}
+    for entry in entries:
+        for keyword in entry.keywords:
+            posting = postings.setdefault(keyword_ids[keyword], {})
+            posting[entry.id] = posting.get(entry.id, 0) + 1
+    posting_lists = [sorted(postings[k].items()) for k in range(len(vocabulary))]
+
+    phrases = [k for k, keyword in enumerate(vocabulary) if " " in keyword]
+    phrase_words = [vocabulary[k].split() for k in phrases]
+
+    return {
+        "faq_id": np.array([e.id for e in entries], dtype=np.int64),
+        "faq_priority": np.array([e.priority for e in entries], dtype=np.int32),
+        "faq_question": np.array([strings.add(e.question) for e in entries], dtype=np.int32),
+        "faq_answer": np.array([strings.add(e.answer) for e in entries], dtype=np.int32),
+        "faq_keywords_indptr": _indptr([len(e.keywords) for e in entries]),
+        "faq_keywords": np.array(
+            [keyword_ids[k] for e in entries for k in e.keywords], dtype=np.int32
+        ),
+        "vocabulary": np.array([strings.add(k) for k in vocabulary], dtype=np.int32),
+        "postings_indptr": _indptr([len(p) for p in posting_lists]),
+        "postings_faq": np.array([faq_id for p in posting_lists for faq_id, _ in p], dtype=np.int64),
+        "postings_count": np.array([count for p in posting_lists for _, count in p], dtype=np.int32),
+        "phrases": np.array(phrases, dtype=np.int32),
+        "phrase_words_indptr": _indptr([len(words) for words in phrase_words]),
+        "phrase_words": np.array([strings.add(w) for words in phrase_words for w in words], dtype=np.int32),
+        # Last, so every string id above is interned
+        **strings.sections()
+    }
+
+
+def write_faq_artifact(rows: Iterable[dict], path: str, source: str = "",
+                       faq_version: Optional[str] = None) -> dict:
+    """
+    Compile active FAQ rows into an artifact at `path` (written to a
+    temporary file and renamed, so readers never see a partial file).
+    Returns the header.
+    """
+    from app.services.faq_index import FAQEntry
+
+    rows = [row for row in rows if row.get("is_active", True)]
+    entries = [FAQEntry(row) for row in rows]
+    if faq_version is None:
+        faq_version = max((row["updated_at"] for row in rows if row.get("updated_at")), default=None)
+
+    sections = _compile_sections(entries)
+    payload, table = bytearray(), {}
+    for name, array in sections.items():
+        payload += b"\0" * (-len(payload) % ALIGNMENT)
+        table[name] = {"offset": len(payload), "dtype": array.dtype.str, "count": int(array.size)}
+        payload += array.tobytes()
+
+    header = {
+        "source": source,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "faqs": len(entries),
+        "keywords": int(sections["vocabulary"].size),
+        "faq_version": faq_version,
+        "content_hash": content_hash(entries),
+        "checksum": hashlib.sha256(payload).hexdigest(),
+        "sections": table
+    }
+    encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    encoded += b" " * (-(PREAMBLE.size + len(encoded)) % ALIGNMENT)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(encoded)))
+        f.write(encoded)
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return header
+
+
+class FAQArtifact:
+    """Read-only view of an artifact file; sections are numpy arrays over the mapping"""
+
+    def __init__(self, path: str, verify: bool = True):
+        self.path = path
+        try:
+            with open(path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise FAQArtifactError(f"Cannot map FAQ artifact {path}: {e}") from e
+
+        if len(self._mmap) < PREAMBLE.size:
+            raise FAQArtifactError(f"{path} is not a FAQ artifact")
+        magic, version, header_length = PREAMBLE.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise FAQArtifactError(f"{path} is not a FAQ artifact")
+        if version != FORMAT_VERSION:
+            raise FAQArtifactError(
+                f"{path} has format version {version}, expected {FORMAT_VERSION}; rebuild it"
+            )
+        self._payload = PREAMBLE.size + header_length
+        try:
+            self.header = json.loads(bytes(self._mmap[PREAMBLE.size:self._payload]))
+        except ValueError as e:
+            raise FAQArtifactError(f"{path} has a corrupt header") from e
+
+        if verify:
+            view = memoryview(self._mmap)[self._payload:]
+            try:
+                checksum = hashlib.sha256(view).hexdigest()
+            finally:
+                view.release()
+            if checksum != self.header["checksum"]:
+                raise FAQArtifactError(f"{path} failed its checksum; rebuild it")
+
+        self.sections = {
+            name: np.frombuffer(
+                self._mmap, dtype=np.dtype(spec["dtype"]), count=spec["count"],
+                offset=self._payload + spec["offset"]
+            )
+            for name, spec in self.header["sections"].items()
+        }
+        self._blob = self.sections["strings"]
+        self._offsets = self.sections["string_offsets"]
+
+    @property
+    def faq_version(self) -> Optional[str]:
+        return self.header.get("faq_version")
+
+    def __len__(self) -> int:
+        return self.header["faqs"]
+
+    def string(self, string_id: int) -> str:
+        start, end = self._offsets[string_id], self._offsets[string_id + 1]
+        return self._blob[start:end].tobytes().decode("utf-8")
+
+    def _strings(self, string_ids) -> List[str]:
+        return [self.string(i) for i in string_ids.tolist()]
+
+    def entries(self) -> Iterator[Tuple]:
+        """(id, question, answer, priority, keywords) per FAQ"""
+        s = self.sections
+        vocabulary = self.vocabulary()
+        indptr = s["faq_keywords_indptr"].tolist()
+        keywords = s["faq_keywords"].tolist()
+        questions = self._strings(s["faq_question"])
+        answers = self._strings(s["faq_answer"])
+        for i, (faq_id, priority) in enumerate(zip(s["faq_id"].tolist(), s["faq_priority"].tolist())):
+            yield (faq_id, questions[i], answers[i], priority,
+                   tuple(vocabulary[k] for k in keywords[indptr[i]:indptr[i + 1]]))
+
+    def vocabulary(self) -> List[str]:
+        return self._strings(self.sections["vocabulary"])
+
+    def postings(self) -> Dict[str, Dict[int, int]]:
+        """keyword -> {faq id: occurrences}"""
+        s = self.sections
+        indptr = s["postings_indptr"].tolist()
+        faq_ids = s["postings_faq"].tolist()
+        counts = s["postings_count"].tolist()
+        return {
+            keyword: dict(zip(faq_ids[indptr[k]:indptr[k + 1]], counts[indptr[k]:indptr[k + 1]]))
+            for k, keyword in enumerate(self.vocabulary())
+        }
+
+    def phrases(self) -> Dict[str, Tuple[str, ...]]:
+        """multi-word keyword -> its words"""
+        s = self.sections
+        vocabulary = self.vocabulary()
+        indptr = s["phrase_words_indptr"].tolist()
+        words = self._strings(s["phrase_words"])
+        return {
+            vocabulary[k]: tuple(words[indptr[i]:indptr[i + 1]])
+            for i, k in enumerate(s["phrases"].tolist())
+        }
+
+    def close(self):
+        self.sections = self._blob = self._offsets = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Arrays handed out by this artifact still reference the mapping
+            pass
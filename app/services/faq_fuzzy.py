@@ -0,0 +1,213 @@
+"""
+Typo correction of question tokens against the FAQ keyword vocabulary.
+
+Words the FAQ index has never seen ("subscripton", "invocie", "pasword")
+are replaced by the closest keyword word before ranking, and bigram
+tokens are rebuilt from the corrected words.
+
+Candidates come from a character-trigram index (words padded with "$"):
+an edit changes at most 4 trigrams (3 for an insertion, deletion or
+substitution, 4 for a transposition), so a word within k edits shares
+at least len(trigrams) - 4k of them. A word within k edits also differs
+in length by at most k: word ids are ordered by length, so each posting
+list is sliced to that length window before trigrams are counted. What
+is left is a handful of candidates. Each edit brings in at most one
+letter the other word lacks, so a candidate whose letter set (a bit
+mask) differs by more than k letters either way is dropped without
+computing its distance. The rest are verified with a bounded Damerau-
+Levenshtein distance (a transposition is one edit); the closest wins,
+then the one sharing most trigrams, then the most frequent keyword.
+
+Words shorter than 4 characters are never corrected; words of 4-7
+characters allow 1 edit and longer words 2 (capped by FAQ_FUZZY_MAX_EDITS).
+"""
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.utils.tokenizer import STOP_WORDS, tokenize
+
+MIN_WORD_LENGTH = 4
+# Trigrams one edit can change (a transposition touches 4)
+GRAMS_PER_EDIT = 4
+CACHE_SIZE = 10000
+
+
+def trigrams(word: str) -> List[str]:
+    padded = f"${word}$"
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def letter_mask(word: str) -> int:
+    """Bit set of the word's letters (bits are shared modulo 64, which only weakens the filter)"""
+    mask = 0
+    for ch in word:
+        mask |= 1 << (ord(ch) & 63)
+    return mask
+
+
+def max_edits_for(word: str, cap: int = 2) -> int:
+    if len(word) < MIN_WORD_LENGTH:
+        return 0
+    return min(cap, 1 if len(word) < 8 else 2)
+
+
+def bounded_distance(a: str, b: str, bound: int) -> int:
+    """
+    Optimal-string-alignment distance, or bound + 1 once it must exceed
+    bound. Only the diagonal band |i - j| <= bound is computed.
+    """
+    if abs(len(a) - len(b)) > bound:
+        return bound + 1
+    over = bound + 1
+    previous2 = None
+    previous = [j if j <= bound else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [over] * (len(b) + 1)
+        if i <= bound:
+            current[0] = i
+        row_min = current[0]
+        for j in range(max(1, i - bound), min(len(b), i + bound) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous2 is not None and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value if value < over else over
+            if value < row_min:
+                row_min = value
+        if row_min > bound:
+            return over
+        previous2, previous = previous, current
+    return previous[len(b)]
+
+
+class TrigramCorrector:
+    """
+    Corrector over `dictionary` (correction targets, with frequencies);
+    words in `known` are taken as correctly spelled. Read-only after
+    construction apart from a bounded cache of past corrections.
+    """
+
+    def __init__(self, dictionary: Dict[str, int], known: Iterable[str] = (), max_edits: int = 2):
+        # Ordered by length, so every posting list is too
+        self.words: List[str] = sorted(dictionary, key=lambda w: (len(w), w))
+        # length -> first word id of at least that length
+        self.length_start: List[int] = []
+        for word_id, word in enumerate(self.words):
+            while len(self.length_start) <= len(word):
+                self.length_start.append(word_id)
+        self.frequency = [dictionary[w] for w in self.words]
+        self.known = set(known) | set(self.words)
+        self.max_edits = max_edits
+        self.postings: Dict[str, List[int]] = {}
+        self.gram_counts: List[int] = []
+        self.letter_masks = [letter_mask(word) for word in self.words]
+        for word_id, word in enumerate(self.words):
+            grams = set(trigrams(word))
+            self.gram_counts.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(word_id)
+        self._cache: Dict[str, Optional[str]] = {}
+        self.counters = Counter()
+
+    def correct_word(self, word: str) -> Optional[str]:
+        """The closest dictionary word, or None if `word` is known or nothing is close"""
+        if word in self.known or not word.isalpha():
+            return None
+        if word in self._cache:
+            return self._cache[word]
+
+        bound = max_edits_for(word, self.max_edits)
+        best = None
+        if bound:
+            grams = set(trigrams(word))
+            # Only words whose length is within `bound` of this one
+            lo = self._first_of_length(len(word) - bound)
+            hi = self._first_of_length(len(word) + bound + 1)
+            shared = Counter()
+            for gram in grams:
+                posting = self.postings.get(gram)
+                if posting:
+                    shared.update(posting[bisect_left(posting, lo):bisect_left(posting, hi)])
+            # A word within `bound` edits shares at least len(grams) - GRAMS_PER_EDIT * bound trigrams
+            floor = len(grams) - GRAMS_PER_EDIT * bound
+            candidates = sorted(
+                ((count, word_id) for word_id, count in shared.items() if count >= floor),
+                reverse=True
+            )
+
+            mask = letter_mask(word)
+
+            # Most shared trigrams first: once a match at distance d is
+            # found, a closer one needs max(grams) - GRAMS_PER_EDIT * (d - 1) shared trigrams
+            best_key: Optional[Tuple] = None
+            for count, word_id in candidates:
+                if (best_key is not None and count < -best_key[1]
+                        and count < len(grams) - GRAMS_PER_EDIT * (best_key[0] - 1)):
+                    # Counts only go down from here: no later candidate can win
+                    break
+                most_grams = max(len(grams), self.gram_counts[word_id])
+                if count < most_grams - GRAMS_PER_EDIT * bound:
+                    continue
+                if (best_key is not None and count < -best_key[1]
+                        and count < most_grams - GRAMS_PER_EDIT * (best_key[0] - 1)):
+                    continue
+                candidate_mask = self.letter_masks[word_id]
+                if (bin(mask & ~candidate_mask).count("1") > bound
+                        or bin(candidate_mask & ~mask).count("1") > bound):
+                    continue
+                candidate = self.words[word_id]
+                distance = bounded_distance(word, candidate, bound)
+                if distance > bound:
+                    continue
+                key = (distance, -count, -self.frequency[word_id], candidate)
+                if best_key is None or key < best_key:
+                    best_key, best = key, candidate
+
+        if len(self._cache) >= CACHE_SIZE:
+            self._cache.clear()
+        self._cache[word] = best
+        return best
+
+    def _first_of_length(self, length: int) -> int:
+        """First word id of at least `length` characters (len(words) if none)"""
+        if length <= 0:
+            return 0
+        if length >= len(self.length_start):
+            return len(self.words)
+        return self.length_start[length]
+
+    def correct(self, tokens: List[str]) -> List[str]:
+        """Correct unigram and bigram tokens word by word"""
+        corrected = []
+        for token in tokens:
+            words = token.split()
+            fixed = []
+            for word in words:
+                replacement = self.correct_word(word)
+                fixed.append(replacement or word)
+                if replacement and len(words) == 1:
+                    self.counters["corrected"] += 1
+            corrected.append(" ".join(fixed))
+        self.counters["queries"] += 1
+        return list(dict.fromkeys(corrected))
+
+    @classmethod
+    def from_entries(cls, entries: Iterable, max_edits: int = 2) -> "TrigramCorrector":
+        """Dictionary: keyword words (weighted by how many FAQs use them); known: every FAQ word"""
+        dictionary: Counter = Counter()
+        known = set(STOP_WORDS)
+        for entry in entries:
+            keyword_words = {word for keyword in entry.keywords for word in keyword.split()}
+            dictionary.update(w for w in keyword_words if w.isalpha() and w not in STOP_WORDS)
+            known.update(keyword_words)
+            known.update(t for t in tokenize(f"{entry.question} {entry.answer}") if " " not in t)
+        return cls(dict(dictionary), known, max_edits)
+
+    def stats(self) -> dict:
+        return {
+            "dictionary_words": len(self.words),
+            "trigrams": len(self.postings),
+            **self.counters
+        }
@@ -0,0 +1,436 @@
+"""
+In-process inverted index over the `faqs` table.
+
+fetch_best_faq_match used to send an `overlaps` query per question and
+rescore the returned rows in Python. The index holds every active FAQ
+once, with keywords lowercased, a posting list per keyword, the phrase
+(multi-word) keywords pre-split and the priority, and scores a question
+exactly as before:
+
+    score = keyword matches + 2 * phrase matches + priority * 0.1
+
+over the FAQs sharing at least one keyword with the tokens, best by
+(score, priority, matches), ties to the lowest id. No database round
+trip is made per question.
+
+With FAQ_RANKING=bm25 (the default) questions are instead ranked over
+question, keyword and answer text by BM25 (app/services/faq_ranker.py),
+which weighs rare terms above generic ones and also finds FAQs sharing
+no exact keyword; matches below FAQ_MIN_SCORE are dropped. The BM25
+model is rebuilt lazily after the index changes.
+
+Before ranking, misspelled words are corrected to the nearest FAQ
+keyword word through a character-trigram index (app/services/faq_fuzzy.py)
+unless FAQ_FUZZY=0.
+
+A background thread keeps it current: every FAQ_INDEX_REFRESH_SECONDS it
+fetches only rows with updated_at >= the newest timestamp seen so far
+(deactivated rows are removed), and every FAQ_INDEX_FULL_REFRESH_SECONDS
+it rebuilds from scratch to pick up hard deletes. The schema's
+faqs_touch_updated_at trigger makes every UPDATE advance updated_at.
+
+With FAQ_INDEX_ARTIFACT set, the index is first loaded from a file
+compiled by `python -m app.tools.faq_build_index`
+(app/services/faq_artifact.py), with no database round trip at startup.
+The refresher then catches up right away: incrementally from the
+artifact's newest updated_at, or with a full rebuild if the artifact
+was compiled from the SQL seed (no updated_at). An artifact of another
+format version or with a bad checksum is ignored and the index is built
+from the database.
+
+Configuration (environment):
+    FAQ_INDEX_ENABLED                 1 | 0 (0 queries Supabase per question)
+    FAQ_INDEX_REFRESH_SECONDS         incremental refresh period (60)
+    FAQ_INDEX_FULL_REFRESH_SECONDS    full rebuild period (3600)
+    FAQ_INDEX_ARTIFACT                precompiled index file to load at startup (unset)
+    FAQ_RANKING                       bm25 | keyword (bm25)
+    FAQ_MIN_SCORE                     minimum BM25 score for an answer (3.0)
+    FAQ_FUZZY                         1 | 0 typo correction (1)
+    FAQ_FUZZY_MAX_EDITS               edit distance cap for corrections (2)
+"""
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.utils.logger import logger
+
+FAQ_INDEX_ENABLED = os.getenv("FAQ_INDEX_ENABLED", "1") != "0"
+REFRESH_INTERVAL = float(os.getenv("FAQ_INDEX_REFRESH_SECONDS", "60"))
+FULL_REFRESH_INTERVAL = float(os.getenv("FAQ_INDEX_FULL_REFRESH_SECONDS", "3600"))
+ARTIFACT_PATH = os.getenv("FAQ_INDEX_ARTIFACT", "")
+FAQ_RANKING = os.getenv("FAQ_RANKING", "bm25").lower()
+FAQ_MIN_SCORE = float(os.getenv("FAQ_MIN_SCORE", "3.0"))
+FAQ_FUZZY = os.getenv("FAQ_FUZZY", "1") != "0"
+FAQ_FUZZY_MAX_EDITS = int(os.getenv("FAQ_FUZZY_MAX_EDITS", "2"))
+
+FAQ_INDEX_COLUMNS = "id, question, answer, keywords, priority, is_active, updated_at"
+DEFAULT_PRIORITY = 5
+
+
+class FAQEntry:
+    __slots__ = ("id", "question", "answer", "priority", "keywords", "phrases")
+
+    def __init__(self, row: dict):
+        self.id = row["id"]
+        self.question = row["question"]
+        self.answer = row["answer"]
+        priority = row.get("priority")
+        self.priority = DEFAULT_PRIORITY if priority is None else priority
+        self.keywords: Tuple[str, ...] = tuple(kw.lower() for kw in (row.get("keywords") or []))
+        self.phrases: Tuple[Tuple[str, ...], ...] = tuple(
+            tuple(kw.split()) for kw in self.keywords if " " in kw
+        )
+
+    @classmethod
+    def from_fields(cls, faq_id: int, question: str, answer: str, priority: int,
+                    keywords: Tuple[str, ...], phrases: Dict[str, Tuple[str, ...]]) -> "FAQEntry":
+        """An entry from already normalized fields (phrases: keyword -> words)"""
+        entry = cls.__new__(cls)
+        entry.id = faq_id
+        entry.question = question
+        entry.answer = answer
+        entry.priority = priority
+        entry.keywords = keywords
+        entry.phrases = tuple(phrases[kw] for kw in keywords if kw in phrases)
+        return entry
+
+
+class FAQIndex:
+    """Keyword -> {faq id: occurrences} postings plus the entries they point to"""
+
+    def __init__(self):
+        self.entries: Dict[int, FAQEntry] = {}
+        self.postings: Dict[str, Dict[int, int]] = {}
+        # Newest updated_at applied (ISO string; compares correctly as text)
+        self.version: Optional[str] = None
+        # Bumped by every apply; derived models are rebuilt when it moves
+        self.generation = 0
+        self._derived: Dict[str, tuple] = {}  # name -> (generation, model)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict]) -> "FAQIndex":
+        index = cls()
+        index.apply(rows)
+        return index
+
+    @classmethod
+    def from_artifact(cls, artifact) -> "FAQIndex":
+        """Index with the entries, postings and phrases of a FAQArtifact"""
+        index = cls()
+        phrases = artifact.phrases()
+        for fields in artifact.entries():
+            entry = FAQEntry.from_fields(*fields, phrases)
+            index.entries[entry.id] = entry
+        index.postings = artifact.postings()
+        index.version = artifact.faq_version
+        index.generation = 1
+        return index
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    # ---------- updates ----------
+    def _remove(self, faq_id: int):
+        entry = self.entries.pop(faq_id, None)
+        if entry is None:
+            return
+        for keyword in set(entry.keywords):
+            posting = self.postings.get(keyword)
+            if posting is not None:
+                posting.pop(faq_id, None)
+                if not posting:
+                    del self.postings[keyword]
+
+    def _add(self, entry: FAQEntry):
+        self.entries[entry.id] = entry
+        for keyword in entry.keywords:
+            posting = self.postings.setdefault(keyword, {})
+            posting[entry.id] = posting.get(entry.id, 0) + 1
+
+    def apply(self, rows: Iterable[dict]) -> int:
+        """Insert, replace or (is_active false) remove rows; returns how many were applied"""
+        applied = 0
+        with self._lock:
+            for row in rows:
+                self._remove(row["id"])
+                if row.get("is_active", True):
+                    self._add(FAQEntry(row))
+                updated_at = row.get("updated_at")
+                if updated_at and (self.version is None or updated_at > self.version):
+                    self.version = updated_at
+                applied += 1
+            self.generation += 1
+        return applied
+
+    # ---------- lookup ----------
+    def _model(self, name: str, build):
+        """A model derived from the current entries, built on first use after a change"""
+        with self._lock:
+            generation, model = self._derived.get(name, (-1, None))
+            if generation == self.generation:
+                return model
+            generation, entries = self.generation, list(self.entries.values())
+        model = build(entries)
+        with self._lock:
+            if self.generation == generation:
+                self._derived[name] = (generation, model)
+        return model
+
+    def ranker(self):
+        """BM25 model of the current entries"""
+        from app.services.faq_ranker import BM25Ranker
+
+        return self._model("bm25", BM25Ranker)
+
+    def corrector(self):
+        """Trigram typo corrector over the current keywords"""
+        from app.services.faq_fuzzy import TrigramCorrector
+
+        return self._model(
+            "fuzzy", lambda entries: TrigramCorrector.from_entries(entries, FAQ_FUZZY_MAX_EDITS)
+        )
+
+    def best_match(self, tokens: List[str], ranking: str = None) -> Optional[dict]:
+        """Best FAQ for the tokenized question, in fetch_best_faq_match's format"""
+        if FAQ_FUZZY:
+            tokens = self.corrector().correct(tokens)
+        if (ranking or FAQ_RANKING) == "bm25":
+            match = self.ranker().best(tokens, FAQ_MIN_SCORE)
+            return self._answer(match[0]) if match else None
+        return self.keyword_match(tokens)
+
+    @staticmethod
+    def _answer(entry: FAQEntry) -> dict:
+        return {
+            "question": entry.question,
+            "answer": entry.answer,
+            "priority": entry.priority
+        }
+
+    def keyword_match(self, tokens: List[str]) -> Optional[dict]:
+        """Best FAQ by keyword overlap (the original scoring)"""
+        token_set = {t.lower() for t in tokens}
+        best_key, best = None, None
+        with self._lock:
+            match_counts: Dict[int, int] = {}
+            for token in token_set:
+                for faq_id, occurrences in self.postings.get(token, {}).items():
+                    match_counts[faq_id] = match_counts.get(faq_id, 0) + occurrences
+
+            for faq_id in sorted(match_counts):
+                entry = self.entries[faq_id]
+                match_count = match_counts[faq_id]
+                phrase_matches = 2 * sum(
+                    1 for words in entry.phrases if all(word in token_set for word in words)
+                )
+                score = match_count + phrase_matches + entry.priority * 0.1
+                key = (score, entry.priority, match_count)
+                if best_key is None or key > best_key:
+                    best_key, best = key, entry
+
+        if best is None:
+            return None
+        return self._answer(best)
+
+    def stats(self) -> dict:
+        return {
+            "faqs": len(self.entries),
+            "keywords": len(self.postings),
+            "version": self.version,
+            "ranking": FAQ_RANKING,
+            "fuzzy": self._derived["fuzzy"][1].stats() if "fuzzy" in self._derived else None
+        }
+
+
+# ---------- loading and refresh ----------
+def _fetch_rows(since: Optional[str] = None) -> List[dict]:
+    from app.utils.supabase_client import supabase
+
+    query = supabase.table("faqs").select(FAQ_INDEX_COLUMNS)
+    if since is None:
+        query = query.eq("is_active", True)
+    else:
+        # Inactive rows are fetched too, so deactivations reach the index
+        query = query.gte("updated_at", since)
+    return query.order("id").execute().data or []
+
+
+_index: Optional[FAQIndex] = None
+_index_lock = threading.Lock()
+_build_lock = threading.Lock()
+_refresher: Optional[threading.Thread] = None
+_refresher_stop = threading.Event()
+REFRESH_STATS = {"full_refreshes": 0, "incremental_refreshes": 0, "rows_applied": 0,
+                 "last_refresh": None, "last_error": None}
+# Set once the index has been loaded from FAQ_INDEX_ARTIFACT
+ARTIFACT_STATS: Dict[str, object] = {}
+
+
+def rebuild_faq_index() -> FAQIndex:
+    """Load every active FAQ into a fresh index and swap it in"""
+    global _index
+    index = FAQIndex.from_rows(_fetch_rows())
+    with _index_lock:
+        _index = index
+    REFRESH_STATS["full_refreshes"] += 1
+    REFRESH_STATS["last_refresh"] = time.time()
+    logger.info(f"FAQ index built: {len(index)} FAQs, {len(index.postings)} keywords")
+    return index
+
+
+def load_faq_artifact(path: str) -> FAQIndex:
+    """Load an index compiled by app.tools.faq_build_index and swap it in"""
+    from app.services.faq_artifact import FAQArtifact
+
+    started = time.perf_counter()
+    artifact = FAQArtifact(path)
+    try:
+        index = FAQIndex.from_artifact(artifact)
+    finally:
+        artifact.close()
+    set_faq_index(index)
+
+    header = artifact.header
+    ARTIFACT_STATS.clear()
+    ARTIFACT_STATS.update({
+        "path": path,
+        "source": header["source"],
+        "built_at": header["built_at"],
+        "faq_version": header["faq_version"],
+        "content_hash": header["content_hash"],
+        "load_ms": round((time.perf_counter() - started) * 1000, 2),
+        # Rows the first refresh found changed since the build (None until it ran)
+        "stale_rows": None
+    })
+    logger.info(f"FAQ index loaded from {path} in {ARTIFACT_STATS['load_ms']} ms: "
+                f"{len(index)} FAQs, built {header['built_at']} from {header['source'] or 'unknown source'}")
+    return index
+
+
+def refresh_faq_index() -> int:
+    """Apply rows changed since the index version; returns how many"""
+    index = get_faq_index()
+    applied = index.apply(_fetch_rows(since=index.version or "1970-01-01"))
+    REFRESH_STATS["incremental_refreshes"] += 1
+    REFRESH_STATS["rows_applied"] += applied
+    REFRESH_STATS["last_refresh"] = time.time()
+    return applied
+
+
+def get_faq_index() -> FAQIndex:
+    """The process-wide index, built on first use"""
+    index = _index
+    if index is None:
+        with _build_lock:
+            index = _index if _index is not None else _build_faq_index()
+    return index
+
+
+def _build_faq_index() -> FAQIndex:
+    if ARTIFACT_PATH:
+        from app.services.faq_artifact import FAQArtifactError
+
+        try:
+            return load_faq_artifact(ARTIFACT_PATH)
+        except FAQArtifactError as e:
+            logger.warning(f"{e}; building the FAQ index from the database")
+    return rebuild_faq_index()
+
+
+def loaded_faq_index() -> Optional[FAQIndex]:
+    """The index if it has been built, without building it"""
+    return _index
+
+
+def set_faq_index(index: FAQIndex):
+    """Swap the index (e.g. in tools and tests)"""
+    global _index
+    with _index_lock:
+        _index = index
+
+
+def _content(entry: Optional[FAQEntry]) -> Optional[tuple]:
+    return entry and (entry.question, entry.answer, entry.priority, entry.keywords)
+
+
+def _catch_up_artifact():
+    """Bring an index loaded from an artifact up to date with the database"""
+    index = get_faq_index()
+    version = index.version
+    if version is None:
+        # Compiled from the SQL seed: ids and deletions are only known to the database
+        fresh = rebuild_faq_index()
+        changed = sum(
+            1 for faq_id in index.entries.keys() | fresh.entries.keys()
+            if _content(index.entries.get(faq_id)) != _content(fresh.entries.get(faq_id))
+        )
+    else:
+        rows = _fetch_rows(since=version)
+        index.apply(rows)
+        REFRESH_STATS["incremental_refreshes"] += 1
+        REFRESH_STATS["rows_applied"] += len(rows)
+        REFRESH_STATS["last_refresh"] = time.time()
+        # The newest row of the build itself comes back too (updated_at >= version)
+        changed = sum(1 for row in rows if (row.get("updated_at") or "") > version)
+    ARTIFACT_STATS["stale_rows"] = changed
+    if changed:
+        logger.warning(f"FAQ artifact {ARTIFACT_STATS['path']} was stale: {changed} rows changed since it was built")
+
+
+def _refresh_loop():
+    last_full = time.monotonic()
+    # An artifact may be behind the database: catch up without waiting a period
+    catch_up = bool(ARTIFACT_STATS)
+    wait = 0.0 if catch_up else REFRESH_INTERVAL
+    while not _refresher_stop.wait(wait):
+        wait = REFRESH_INTERVAL
+        try:
+            if catch_up:
+                _catch_up_artifact()
+            elif time.monotonic() - last_full >= FULL_REFRESH_INTERVAL:
+                rebuild_faq_index()
+                last_full = time.monotonic()
+            else:
+                refresh_faq_index()
+            catch_up = False
+            REFRESH_STATS["last_error"] = None
+        except Exception as e:
+            # Keep serving the last good index
+            REFRESH_STATS["last_error"] = str(e)
+            logger.error(f"FAQ index refresh failed: {e}")
+
+
+def start_faq_index_refresher():
+    """Build the index and start the background refresher (idempotent)"""
+    global _refresher
+    if not FAQ_INDEX_ENABLED:
+        return
+    try:
+        get_faq_index()
+    except Exception as e:
+        # The first question retries the build
+        logger.error(f"FAQ index build failed: {e}")
+    if _refresher and _refresher.is_alive():
+        return
+    _refresher_stop.clear()
+    _refresher = threading.Thread(target=_refresh_loop, name="faq-index-refresher", daemon=True)
+    _refresher.start()
+
+
+def stop_faq_index_refresher():
+    _refresher_stop.set()
+
+
+def get_faq_index_stats() -> dict:
+    if not FAQ_INDEX_ENABLED:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        **(_index.stats() if _index is not None else {"faqs": None}),
+        "artifact": dict(ARTIFACT_STATS) or None,
+        "refresh_interval_seconds": REFRESH_INTERVAL,
+        "full_refresh_interval_seconds": FULL_REFRESH_INTERVAL,
+        **REFRESH_STATS
+    }
@@ -0,0 +1,142 @@
+"""
+BM25 ranking of FAQs with sparse matrices.
+
+Every FAQ is one document made of its question, keywords and answer,
+analyzed with the same `tokenize` (words + bigrams) as customer
+messages; each keyword also counts as a single term, so "cancel
+subscription" matches the bigram of the question. Fields are weighted
+by repeating their term counts (keywords 3, question 2, answer 1).
+
+The BM25 weight of every (FAQ, term) pair is precomputed once into a
+CSR matrix W (FAQs x vocabulary), so scoring is a sparse product:
+W @ q for one question, Q @ W.T for a batch of questions. Rare terms
+weigh more than generic ones ("my", "account") through the IDF.
+
+Terms made only of stop words ("what", "is", "what is") are ignored on
+both sides; they would otherwise let any question match an answer.
+
+Documents are ordered by (priority desc, id asc), so argmax breaks
+score ties the way the keyword scorer does.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from scipy import sparse
+
+from app.utils.tokenizer import is_content_term, tokenize
+
+FIELD_WEIGHTS = {"keywords": 3.0, "question": 2.0, "answer": 1.0}
+
+
+def document_terms(entry) -> Dict[str, float]:
+    """Weighted term counts of one FAQ entry (question, keywords, answer)"""
+    counts: Dict[str, float] = {}
+
+    def add(terms: Iterable[str], weight: float):
+        for term in terms:
+            if not is_content_term(term):
+                continue
+            counts[term] = counts.get(term, 0.0) + weight
+
+    add(tokenize(entry.question), FIELD_WEIGHTS["question"])
+    for keyword in entry.keywords:
+        add({keyword, *tokenize(keyword)}, FIELD_WEIGHTS["keywords"])
+    add(tokenize(entry.answer), FIELD_WEIGHTS["answer"])
+    return counts
+
+
+class BM25Ranker:
+    """Immutable BM25 model over a set of FAQ entries"""
+
+    def __init__(self, entries: Iterable, k1: float = 1.2, b: float = 0.75):
+        self.entries = sorted(entries, key=lambda e: (-e.priority, e.id))
+        self.k1 = k1
+        self.b = b
+
+        self.vocabulary: Dict[str, int] = {}
+        rows, cols, values = [], [], []
+        for doc, entry in enumerate(self.entries):
+            for term, count in document_terms(entry).items():
+                rows.append(doc)
+                cols.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                values.append(count)
+
+        shape = (len(self.entries), len(self.vocabulary))
+        tf = sparse.csr_matrix((np.array(values, dtype=np.float64), (rows, cols)), shape=shape)
+        self.weights = self._bm25(tf)
+        # Term-major copy: one question sums a few rows without building a matrix
+        self.term_weights = self.weights.T.tocsr()
+
+    def _bm25(self, tf: sparse.csr_matrix) -> sparse.csr_matrix:
+        n_docs = tf.shape[0]
+        self.idf = np.zeros(tf.shape[1])
+        if not n_docs or not tf.nnz:
+            return tf
+
+        doc_freq = np.bincount(tf.indices, minlength=tf.shape[1])
+        self.idf = np.log1p((n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+        doc_len = np.asarray(tf.sum(axis=1)).ravel()
+        norm = self.k1 * (1 - self.b + self.b * doc_len / doc_len.mean())
+
+        weights = tf.copy()
+        # Row of each stored value, to pick its document's length norm
+        row_of = np.repeat(np.arange(n_docs), np.diff(tf.indptr))
+        counts = weights.data
+        weights.data = self.idf[weights.indices] * counts * (self.k1 + 1) / (counts + norm[row_of])
+        return weights
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def query_matrix(self, token_lists: Sequence[List[str]]) -> sparse.csr_matrix:
+        """Binary (queries x vocabulary) matrix; unknown terms are dropped"""
+        rows, cols = [], []
+        for row, tokens in enumerate(token_lists):
+            for term in {self.vocabulary.get(t.lower()) for t in tokens} - {None}:
+                rows.append(row)
+                cols.append(term)
+        return sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, cols)),
+            shape=(len(token_lists), len(self.vocabulary))
+        )
+
+    def score_batch(self, token_lists: Sequence[List[str]]) -> np.ndarray:
+        """Dense (queries x FAQs) BM25 scores in one sparse matrix product"""
+        if not len(self.entries):
+            return np.zeros((len(token_lists), 0))
+        return (self.query_matrix(token_lists) @ self.weights.T).toarray()
+
+    def best_batch(self, token_lists: Sequence[List[str]], min_score: float = 0.0) -> List[Optional[tuple]]:
+        """(entry, score) of the best FAQ per query, or None below min_score"""
+        scores = self.score_batch(token_lists)
+        results = []
+        for row in scores:
+            if not row.size:
+                results.append(None)
+                continue
+            doc = int(row.argmax())
+            score = float(row[doc])
+            results.append((self.entries[doc], score) if score > 0 and score >= min_score else None)
+        return results
+
+    def score(self, tokens: List[str]) -> np.ndarray:
+        """BM25 scores of every FAQ for one question (same values as score_batch)"""
+        terms = {self.vocabulary.get(t.lower()) for t in tokens} - {None}
+        if not terms or not len(self.entries):
+            return np.zeros(len(self.entries))
+        indptr = self.term_weights.indptr
+        spans = [slice(indptr[t], indptr[t + 1]) for t in terms]
+        return np.bincount(
+            np.concatenate([self.term_weights.indices[s] for s in spans]),
+            weights=np.concatenate([self.term_weights.data[s] for s in spans]),
+            minlength=len(self.entries)
+        )
+
+    def best(self, tokens: List[str], min_score: float = 0.0) -> Optional[tuple]:
+        scores = self.score(tokens)
+        if not scores.size:
+            return None
+        doc = int(scores.argmax())
+        score = float(scores[doc])
+        return (self.entries[doc], score) if score > 0 and score >= min_score else None
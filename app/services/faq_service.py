@@ -1,28 +1,58 @@
+import asyncio
+from app.services.faq_index import FAQ_INDEX_ENABLED, get_faq_index, loaded_faq_index
+from app.utils import supabase_async as db
 from app.utils.supabase_client import supabase
 
+FAQ_COLUMNS = "id, question, answer, keywords, priority"
+
+
 def fetch_best_faq_match(tokens: list[str]):
     """
     Fetch best matching FAQ based on keyword overlap with improved scoring.
     Uses match count and priority to find the best match.
+    Answered from the in-process FAQ index unless FAQ_INDEX_ENABLED=0.
     """
+    if FAQ_INDEX_ENABLED:
+        return get_faq_index().best_match(tokens)
+
     # Get all FAQs that have at least one matching keyword
     response = (
         supabase
         .table("faqs")
-        .select("id, question, answer, keywords, priority")
+        .select(FAQ_COLUMNS)
         .overlaps("keywords", tokens)
         .eq("is_active", True)
         .execute()
     )
 
-    if not response.data:
+    return _best_match(response.data, tokens)
+
+
+async def fetch_best_faq_match_async(tokens: list[str]):
+    """Async variant of fetch_best_faq_match (pooled PostgREST client)"""
+    if FAQ_INDEX_ENABLED:
+        index = loaded_faq_index()
+        if index is None:
+            # Only the very first call builds the index (off the event loop)
+            index = await asyncio.to_thread(get_faq_index)
+        return index.best_match(tokens)
+
+    rows = await db.select(
+        "faqs", FAQ_COLUMNS,
+        {"keywords": db.overlaps(tokens), "is_active": db.eq(True)}
+    )
+    return _best_match(rows, tokens)
+
+
+def _best_match(rows: list, tokens: list[str]):
+    if not rows:
         return None
 
     # Score each FAQ based on keyword matches
     # Higher score = better match
     scored_faqs = []
     
-    for faq in response.data:
+    for faq in rows:
         faq_keywords = [kw.lower() for kw in (faq.get("keywords") or [])]
         user_tokens_lower = [t.lower() for t in tokens]
         
@@ -0,0 +1,425 @@
+"""
+Write-behind queue for technical issue inserts.
+
+create_technical_issue only appends the row (with a fresh idempotency
+key) to an on-disk spool and returns; a background thread bulk-inserts
+queued rows into `technical_issues` in batches. Inserts are upserts on
+idempotency_key that ignore duplicates, so re-sending a batch after a
+crash or a timed-out request never creates a second issue.
+
+Workers: every process needs a spool of its own (segments are numbered
+and deleted per process). ISSUE_SPOOL_DIR holds ISSUE_SPOOL_SLOTS slot
+directories, worker-0 ... worker-<n-1>; a process takes the first slot
+it can lock with an exclusive flock and keeps the lock until it exits.
+Slots are fixed rather than per pid, so a restarted worker picks up
+the spool a dead one left behind. A process that finds every slot
+locked inserts synchronously instead (as with ISSUE_WRITE_BEHIND=0).
+
+Spool: rows are appended to spool.<segment>.jsonl. A segment is deleted
+once every row in it has been inserted; on startup the remaining
+segments are re-queued.
+
+Failures: connection errors, timeouts, 5xx and any other unrecognised
+error are retried with exponential backoff (capped at
+ISSUE_RETRY_MAX_SECONDS) for as long as the database stays unreachable;
+the spool keeps the rows meanwhile. A permanent rejection (a 4xx
+response, a constraint or data error) sends the batch row by row: rows
+the database rejects are moved to dead.jsonl instead of blocking the
+queue, and a transient error part way through goes back to retrying.
+
+Configuration (environment):
+    ISSUE_WRITE_BEHIND              1 | 0 (0 inserts inside the request)
+    ISSUE_SPOOL_DIR                 directory of the slot directories (issue_spool)
+    ISSUE_SPOOL_SLOTS               slots, i.e. max writer processes (16)
+    ISSUE_SPOOL_FSYNC               always | interval | never (interval)
+    ISSUE_SPOOL_FSYNC_INTERVAL_SECONDS  fsync period for "interval" (1)
+    ISSUE_BATCH_SIZE                rows per insert (50)
+    ISSUE_BATCH_LINGER_SECONDS      wait for a batch to fill (0.2)
+    ISSUE_RETRY_MAX_SECONDS         backoff cap (30)
+    ISSUE_SHUTDOWN_FLUSH_SECONDS    how long shutdown waits to drain (10)
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from collections import Counter, deque
+from itertools import islice
+from typing import Callable, List, Optional
+
+from app.utils.logger import logger
+from app.utils.spool_slots import claim_spool_slot
+
+WRITE_BEHIND_ENABLED = os.getenv("ISSUE_WRITE_BEHIND", "1") != "0"
+SHUTDOWN_FLUSH_SECONDS = float(os.getenv("ISSUE_SHUTDOWN_FLUSH_SECONDS", "10"))
+
+# SQLSTATE classes no retry can fix: data exception, integrity constraint
+# violation, syntax error or undefined table/column
+PERMANENT_SQLSTATE_CLASSES = ("22", "23", "42")
+
+
+def classify_error(error: Exception) -> str:
+    """"permanent" (the database rejected the rows: dead-letter them) or "transient" (retry)"""
+    status = getattr(error, "status_code", None)
+    code = str(getattr(error, "code", None) or "")
+    if status is None and len(code) == 3 and code.isdigit():
+        # APIError for a non-JSON response carries the HTTP status as its code
+        status = int(code)
+    if isinstance(status, int):
+        return "permanent" if 400 <= status < 500 and status not in (408, 429) else "transient"
+    if len(code) == 5 and code[:2] in PERMANENT_SQLSTATE_CLASSES:
+        return "permanent"
+    if code.startswith(("PGRST1", "PGRST2")):
+        # PostgREST request and schema errors (PGRST0xx are connection errors)
+        return "permanent"
+    return "transient"
+
+
+class IssueWriteQueue:
+    """
+    Durable FIFO of rows for one table, drained by a single worker thread.
+    `insert_batch(rows)` must raise on failure and be idempotent per row;
+    `classify_error(error)` tells permanent rejections from transient failures.
+    """
+
+    FSYNC_POLICIES = ("always", "interval", "never")
+
+    def __init__(self, directory: str, insert_batch: Callable[[List[dict]], None],
+                 classify_error: Callable[[Exception], str] = classify_error,
+                 batch_size: int = 50, linger: float = 0.2,
+                 retry_base: float = 0.5, retry_max: float = 30.0, segment_records: int = 1000,
+                 fsync: str = "interval", fsync_interval: float = 1.0):
+        if fsync not in self.FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        self.directory = directory
+        self.insert_batch = insert_batch
+        self.classify_error = classify_error
+        self.batch_size = batch_size
+        self.linger = linger
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.segment_records = segment_records
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+
+        self._cond = threading.Condition()
+        self._pending: deque = deque()  # (segment, row)
+        self._outstanding: Counter = Counter()  # segment -> rows not yet inserted
+        self._segment_records = 0
+        self._last_fsync = time.monotonic()
+        self._worker: Optional[threading.Thread] = None
+        self._stopping = False
+        self._drain_deadline = 0.0
+        self.counters = Counter()
+        self.last_error: Optional[str] = None
+        self.last_batch_ms: Optional[float] = None
+
+        os.makedirs(directory, exist_ok=True)
+        self.segment = self._recover()
+        self._spool = open(self._segment_path(self.segment), "a", encoding="utf-8")
+
+    # ---------- spool ----------
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"spool.{segment}.jsonl")
+
+    def _segments(self) -> List[int]:
+        segments = []
+        for filename in os.listdir(self.directory):
+            if filename.startswith("spool.") and filename.endswith(".jsonl"):
+                try:
+                    segments.append(int(filename[6:-6]))
+                except ValueError:
+                    continue
+        return sorted(segments)
+
+    def _recover(self) -> int:
+        """Re-queue rows left in the spool by the previous process; returns the next segment"""
+        segments = self._segments()
+        for segment in segments:
+            with open(self._segment_path(segment), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        # Torn write at the tail after a crash
+                        break
+                    self._pending.append((segment, row))
+                    self._outstanding[segment] += 1
+            if not self._outstanding[segment]:
+                os.remove(self._segment_path(segment))
+        if self._pending:
+            self.counters["recovered"] = len(self._pending)
+            logger.info(f"Re-queued {len(self._pending)} spooled technical issues")
+        return (segments[-1] + 1) if segments else 0
+
+    def _rotate(self):
+        """Start a new segment (caller holds the lock)"""
+        self._spool.close()
+        if not self._outstanding[self.segment]:
+            self._delete_segment(self.segment)
+        self.segment += 1
+        self._segment_records = 0
+        self._spool = open(self._segment_path(self.segment), "a", encoding="utf-8")
+
+    def _delete_segment(self, segment: int):
+        self._outstanding.pop(segment, None)
+        try:
+            os.remove(self._segment_path(segment))
+        except FileNotFoundError:
+            pass
+
+    # ---------- producer ----------
+    def enqueue(self, row: dict):
+        """Spool the row and hand it to the worker; returns without touching the database"""
+        line = json.dumps(row, separators=(",", ":")) + "\n"
+        with self._cond:
+            self._spool.write(line)
+            self._spool.flush()
+            if self.fsync == "always":
+                os.fsync(self._spool.fileno())
+            elif self.fsync == "interval":
+                now = time.monotonic()
+                if now - self._last_fsync >= self.fsync_interval:
+                    os.fsync(self._spool.fileno())
+                    self._last_fsync = now
+
+            self._pending.append((self.segment, row))
+            self._outstanding[self.segment] += 1
+            self._segment_records += 1
+            if self._segment_records >= self.segment_records:
+                self._rotate()
+            self.counters["enqueued"] += 1
+            self._cond.notify_all()
+        self.start()
+
+    # ---------- worker ----------
+    def start(self):
+        """Start the worker thread (idempotent)"""
+        with self._cond:
+            if self._worker and self._worker.is_alive():
+                return
+            self._stopping = False
+            self._worker = threading.Thread(target=self._run, name="issue-writer", daemon=True)
+            self._worker.start()
+
+    def _should_exit(self) -> bool:
+        """Caller holds the lock"""
+        return self._stopping and (not self._pending or time.monotonic() >= self._drain_deadline)
+
+    def _next_batch(self) -> Optional[list]:
+        with self._cond:
+            while not self._pending and not self._stopping:
+                self._cond.wait()
+            if self._should_exit():
+                return None
+            # Give a burst the chance to fill the batch
+            self._cond.wait_for(
+                lambda: len(self._pending) >= self.batch_size or self._stopping,
+                timeout=self.linger
+            )
+            return list(islice(self._pending, self.batch_size))
+
+    def _run(self):
+        attempts = 0
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+
+            started = time.monotonic()
+            try:
+                self.insert_batch([row for _, row in batch])
+            except Exception as e:
+                self.counters["failures"] += 1
+                self.last_error = str(e)
+                settled = self._insert_one_by_one(batch) if self.classify_error(e) == "permanent" else 0
+                if not settled:
+                    # Database unreachable or overloaded: the rows stay spooled
+                    attempts += 1
+                    delay = min(self.retry_max, self.retry_base * 2 ** (attempts - 1))
+                    logger.warning(f"Technical issue batch insert failed (attempt {attempts}), retrying in {delay:.1f}s: {self.last_error}")
+                    self._backoff(delay)
+                    continue
+            else:
+                settled = len(batch)
+                self.counters["batches"] += 1
+                self.counters["inserted"] += len(batch)
+                self.last_batch_ms = round((time.monotonic() - started) * 1000, 1)
+
+            attempts = 0
+            self._ack(settled)
+
+    def _backoff(self, delay: float):
+        with self._cond:
+            if self._stopping:
+                delay = min(delay, max(0.0, self._drain_deadline - time.monotonic()))
+            self._cond.wait_for(lambda: self._should_exit(), timeout=delay)
+
+    def _insert_one_by_one(self, batch: list) -> int:
+        """
+        Isolate and dead-letter the rows of a rejected batch. Returns how many
+        leading rows were inserted or dead-lettered; stops at a transient error.
+        """
+        for settled, (_, row) in enumerate(batch):
+            try:
+                self.insert_batch([row])
+                self.counters["inserted"] += 1
+            except Exception as e:
+                if self.classify_error(e) != "permanent":
+                    self.last_error = str(e)
+                    return settled
+                self._dead_letter(row, str(e))
+        return len(batch)
+
+    def _dead_letter(self, row: dict, error: str):
+        logger.error(f"Technical issue {row.get('idempotency_key')} moved to dead letters: {error}")
+        with open(os.path.join(self.directory, "dead.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps({"row": row, "error": error, "failed_at": time.time()}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.counters["dead_lettered"] += 1
+
+    def _ack(self, count: int):
+        """Drop the first `count` pending rows and delete fully inserted segments"""
+        with self._cond:
+            for _ in range(count):
+                segment, _ = self._pending.popleft()
+                self._outstanding[segment] -= 1
+                if not self._outstanding[segment] and segment != self.segment:
+                    self._delete_segment(segment)
+            # Everything is in the database: start the spool afresh
+            if not self._pending and self._segment_records:
+                self._rotate()
+            self._cond.notify_all()
+
+    # ---------- lifecycle ----------
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until every queued row has been inserted; False on timeout"""
+        self.start()
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending, timeout=timeout)
+
+    def close(self, timeout: float = SHUTDOWN_FLUSH_SECONDS):
+        """Drain for up to `timeout` seconds, then stop; rows left over stay spooled for the next start"""
+        with self._cond:
+            self._stopping = True
+            self._drain_deadline = time.monotonic() + timeout
+            self._cond.notify_all()
+        if self._worker:
+            self._worker.join(timeout + 1)
+        with self._cond:
+            self._spool.flush()
+            os.fsync(self._spool.fileno())
+            if self._pending:
+                logger.warning(f"{len(self._pending)} technical issues left in the spool at shutdown")
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "spool_segments": len(self._segments()),
+                "directory": self.directory,
+                "fsync": self.fsync,
+                "batch_size": self.batch_size,
+                "last_batch_ms": self.last_batch_ms,
+                "last_error": self.last_error,
+                **{key: self.counters[key] for key in
+                   ("enqueued", "recovered", "batches", "inserted", "failures", "dead_lettered")}
+            }
+
+
+def _insert_issues(rows: List[dict]):
+    from app.utils.supabase_client import supabase
+
+    (
+        supabase
+        .table("technical_issues")
+        .upsert(rows, on_conflict="idempotency_key", ignore_duplicates=True)
+        .execute()
+    )
+
+
+_queue: Optional[IssueWriteQueue] = None
+_queue_lock = threading.Lock()
+_slot_lock_file = None  # held open for the life of the process
+_no_free_slot = False
+
+
+def _claim_spool_slot(base: str, slots: int) -> Optional[str]:
+    """Directory of the first spool slot this process can lock, or None if all are taken"""
+    global _slot_lock_file
+    claimed = claim_spool_slot(base, slots)
+    if claimed is None:
+        return None
+    slot, directory, _slot_lock_file = claimed
+    if slot == 0:
+        _adopt_unslotted_segments(base, directory)
+    return directory
+
+
+def _adopt_unslotted_segments(base: str, directory: str):
+    """Move segments spooled directly into `base` (before slots existed) into slot 0"""
+    legacy = sorted(
+        int(name[6:-6]) for name in os.listdir(base)
+        if name.startswith("spool.") and name.endswith(".jsonl") and name[6:-6].isdigit()
+    )
+    if not legacy:
+        return
+    existing = [
+        int(name[6:-6]) for name in os.listdir(directory)
+        if name.startswith("spool.") and name.endswith(".jsonl") and name[6:-6].isdigit()
+    ]
+    next_segment = max(existing, default=-1) + 1
+    for offset, segment in enumerate(legacy):
+        shutil.move(os.path.join(base, f"spool.{segment}.jsonl"),
+                    os.path.join(directory, f"spool.{next_segment + offset}.jsonl"))
+    logger.info(f"Moved {len(legacy)} spool segments from {base} into {directory}")
+
+
+def get_issue_queue() -> Optional[IssueWriteQueue]:
+    """
+    The process-wide queue, created (and its spool recovered) on first use;
+    None when write-behind is off or every spool slot is held by another process
+    """
+    global _queue, _no_free_slot
+    if not WRITE_BEHIND_ENABLED:
+        return None
+    with _queue_lock:
+        if _queue is None and not _no_free_slot:
+            base = os.getenv("ISSUE_SPOOL_DIR", "issue_spool")
+            directory = _claim_spool_slot(base, int(os.getenv("ISSUE_SPOOL_SLOTS", "16")))
+            if directory is None:
+                _no_free_slot = True
+                logger.warning(f"Every issue spool slot in {base} is locked; inserting technical issues synchronously")
+                return None
+            _queue = IssueWriteQueue(
+                directory=directory,
+                insert_batch=_insert_issues,
+                batch_size=int(os.getenv("ISSUE_BATCH_SIZE", "50")),
+                linger=float(os.getenv("ISSUE_BATCH_LINGER_SECONDS", "0.2")),
+                retry_max=float(os.getenv("ISSUE_RETRY_MAX_SECONDS", "30")),
+                fsync=os.getenv("ISSUE_SPOOL_FSYNC", "interval").lower(),
+                fsync_interval=float(os.getenv("ISSUE_SPOOL_FSYNC_INTERVAL_SECONDS", "1"))
+            )
+        return _queue
+
+
+def start_issue_writer():
+    """Recover the spool and start inserting (call on startup)"""
+    queue = get_issue_queue()
+    if queue is not None:
+        queue.start()
+
+
+def stop_issue_writer():
+    """Flush queued issues on shutdown"""
+    if _queue is not None:
+        _queue.close()
+
+
+def get_issue_queue_stats() -> dict:
+    if not WRITE_BEHIND_ENABLED:
+        return {"enabled": False}
+    if _queue is None:
+        return {"enabled": True, "started": False, "no_free_slot": _no_free_slot}
+    return {"enabled": True, **_queue.stats()}
@@ -0,0 +1,299 @@
+"""
+Pluggable LLM backends for the orchestrator's classification calls.
+
+Backends:
+    groq  - Groq SDK (set LLM_BASE_URL to point it at any OpenAI-compatible
+            server, e.g. the local stand-in in app/tools/llm_stub_server.py)
+    stub  - in-process deterministic stand-in with latency / error-rate /
+            response-script knobs, for load tests and benchmarks offline
+
+Configuration (environment):
+    LLM_BACKEND              default backend for every call site (groq)
+    LLM_BACKEND_<SITE>       backend override for one call site
+    LLM_MODEL                default model (llama-3.1-8b-instant)
+    LLM_MODEL_<SITE>         model override for one call site
+    LLM_BASE_URL             base URL for the groq backend
+    LLM_STUB_LATENCY_MS      stub latency per call
+    LLM_STUB_ERROR_RATE      stub probability (0-1) of raising an error
+    LLM_STUB_SCRIPT          "module:callable" response script for the stub
+
+Call sites are PRIORITY, ROUTER, CLASSIFY and SUMMARIZE, e.g. LLM_MODEL_ROUTER.
+"""
+import asyncio
+import importlib
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from typing import Callable, Optional
+
+DEFAULT_MODEL = os.getenv("LLM_MODEL", "llama-3.1-8b-instant")
+REQUEST_TIMEOUT = 10
+
+
+class LLMBackendError(Exception):
+    """Raised by a backend when a completion cannot be produced"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token)"""
+    return max(1, len(text) // 4) if text else 0
+
+
+class LLMBackend:
+    """
+    Base class. Subclasses implement _complete (and optionally _acomplete)
+    returning (text, prompt_tokens, completion_tokens); token counts may be
+    None, in which case they are estimated. Usage is tracked per backend.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.usage = Counter()
+        self._usage_lock = threading.Lock()
+
+    def complete(self, messages: list, max_tokens: int = 10, model: str = None, response_format: dict = None) -> str:
+        text, prompt_tokens, completion_tokens = self._complete(
+            messages, max_tokens, model or DEFAULT_MODEL, response_format
+        )
+        self._record_usage(messages, text, prompt_tokens, completion_tokens)
+        return text
+
+    async def acomplete(self, messages: list, max_tokens: int = 10, model: str = None, response_format: dict = None) -> str:
+        text, prompt_tokens, completion_tokens = await self._acomplete(
+            messages, max_tokens, model or DEFAULT_MODEL, response_format
+        )
+        self._record_usage(messages, text, prompt_tokens, completion_tokens)
+        return text
+
+    def _complete(self, messages, max_tokens, model, response_format):
+        raise NotImplementedError
+
+    async def _acomplete(self, messages, max_tokens, model, response_format):
+        return await asyncio.to_thread(self._complete, messages, max_tokens, model, response_format)
+
+    def _record_usage(self, messages, text, prompt_tokens, completion_tokens):
+        if prompt_tokens is None:
+            prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+        if completion_tokens is None:
+            completion_tokens = estimate_tokens(text)
+        with self._usage_lock:
+            self.usage["calls"] += 1
+            self.usage["prompt_tokens"] += prompt_tokens
+            self.usage["completion_tokens"] += completion_tokens
+
+    def stats(self) -> dict:
+        return {"backend": self.name, **self.usage}
+
+
+class GroqBackend(LLMBackend):
+    """Groq SDK backend (sync + async clients sharing one keep-alive pool config)"""
+
+    name = "groq"
+
+    def __init__(self, api_key: str = None, base_url: str = None,
+                 max_connections: int = 32, max_keepalive: int = 16):
+        super().__init__()
+        # Imported lazily so offline/stub deployments don't need the SDK
+        import httpx
+        from groq import Groq, AsyncGroq
+
+        api_key = api_key or os.getenv("GROQ_API_KEY")
+        base_url = base_url or os.getenv("LLM_BASE_URL") or None
+        self.client = Groq(api_key=api_key, base_url=base_url)
+        self.async_client = AsyncGroq(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_keepalive
+                ),
+                timeout=REQUEST_TIMEOUT
+            )
+        )
+
+    @staticmethod
+    def _request(messages, max_tokens, model, response_format) -> dict:
+        request = dict(
+            model=model,
+            messages=messages,
+            temperature=0,
+            max_tokens=max_tokens,
+            timeout=REQUEST_TIMEOUT
+        )
+        if response_format:
+            request["response_format"] = response_format
+        return request
+
+    @staticmethod
+    def _result(response):
+        usage = getattr(response, "usage", None)
+        return (
+            response.choices[0].message.content,
+            getattr(usage, "prompt_tokens", None),
+            getattr(usage, "completion_tokens", None)
+        )
+
+    def _complete(self, messages, max_tokens, model, response_format):
+        response = self.client.chat.completions.create(
+            **self._request(messages, max_tokens, model, response_format)
+        )
+        return self._result(response)
+
+    async def _acomplete(self, messages, max_tokens, model, response_format):
+        response = await self.async_client.chat.completions.create(
+            **self._request(messages, max_tokens, model, response_format)
+        )
+        return self._result(response)
+
+
+def keyword_responder(messages: list, max_tokens: int = 10, model: str = None, **kwargs) -> str:
+    """
+    Deterministic default script: answers each prompt type with the keyword
+    classifiers, in the same output format the real model is asked for.
+    """
+    orchestrator = importlib.import_module("app.services.orchestrator")
+    system = messages[0]["content"]
+    user_message = messages[-1]["content"]
+
+    agent = orchestrator.fallback_keyword_router(user_message)
+    priority = orchestrator.fallback_keyword_priority(user_message)
+
+    if system == orchestrator.SUMMARY_PROMPT:
+        return " ".join(user_message.split())[:orchestrator.SUMMARY_MAX_CHARS]
+    if system == orchestrator.CLASSIFY_PROMPT:
+        return json.dumps({"priority": priority, "agent": agent})
+    if system == orchestrator.ROUTER_PROMPT:
+        return agent
+    return priority
+
+
+def load_script(spec: Optional[str]) -> Callable:
+    """Resolve "package.module:name" to a response script (default: keyword_responder)"""
+    if not spec:
+        return keyword_responder
+    module_name, _, attr = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attr or "script")
+
+
+class StubBackend(LLMBackend):
+    """
+    In-process stand-in for load tests and benchmarks without network.
+
+    latency_ms   fixed latency per call (plus up to jitter_ms of random jitter)
+    error_rate   probability (0-1) that a call raises LLMBackendError
+    script       callable(messages=..., max_tokens=..., model=...) -> str,
+                 or a list of responses returned in rotation
+    seed         RNG seed so error injection and jitter are reproducible
+    """
+
+    name = "stub"
+
+    def __init__(self, latency_ms: float = 0, error_rate: float = 0.0,
+                 script=None, jitter_ms: float = 0, seed: Optional[int] = None):
+        super().__init__()
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.script = script or keyword_responder
+        self._rng = random.Random(seed)
+        self._rotation = 0
+        self._lock = threading.Lock()
+
+    def _delay(self) -> float:
+        with self._lock:
+            return self.latency + (self._rng.random() * self.jitter if self.jitter else 0)
+
+    def _respond(self, messages, max_tokens, model):
+        with self._lock:
+            fail = self.error_rate and self._rng.random() < self.error_rate
+        if fail:
+            raise LLMBackendError("stub backend injected error")
+
+        if isinstance(self.script, (list, tuple)):
+            with self._lock:
+                text = self.script[self._rotation % len(self.script)]
+                self._rotation += 1
+        else:
+            text = self.script(messages=messages, max_tokens=max_tokens, model=model)
+        return text, None, None
+
+    def _complete(self, messages, max_tokens, model, response_format):
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+        return self._respond(messages, max_tokens, model)
+
+    async def _acomplete(self, messages, max_tokens, model, response_format):
+        delay = self._delay()
+        if delay:
+            await asyncio.sleep(delay)
+        return self._respond(messages, max_tokens, model)
+
+
+# ---------- Registry ----------
+_BACKENDS: dict = {}
+_OVERRIDES: dict = {}
+_registry_lock = threading.Lock()
+
+
+def _build_backend(name: str) -> LLMBackend:
+    if name == "stub":
+        return StubBackend(
+            latency_ms=float(os.getenv("LLM_STUB_LATENCY_MS", "0")),
+            error_rate=float(os.getenv("LLM_STUB_ERROR_RATE", "0")),
+            script=load_script(os.getenv("LLM_STUB_SCRIPT")),
+            jitter_ms=float(os.getenv("LLM_STUB_JITTER_MS", "0"))
+        )
+    if name == "groq":
+        return GroqBackend(
+            max_connections=int(os.getenv("GROQ_MAX_CONNECTIONS", "32")),
+            max_keepalive=int(os.getenv("GROQ_MAX_KEEPALIVE", "16"))
+        )
+    raise ValueError(f"Unknown LLM backend: {name}")
+
+
+def get_backend(site: str = None) -> LLMBackend:
+    """Backend for a call site: explicit override, then LLM_BACKEND_<SITE>, then LLM_BACKEND"""
+    site_key = (site or "").upper()
+    if site_key in _OVERRIDES:
+        return _OVERRIDES[site_key]
+    if "" in _OVERRIDES:
+        return _OVERRIDES[""]
+
+    name = (os.getenv(f"LLM_BACKEND_{site_key}") if site_key else None) or os.getenv("LLM_BACKEND", "groq")
+    name = name.lower()
+    with _registry_lock:
+        if name not in _BACKENDS:
+            _BACKENDS[name] = _build_backend(name)
+        return _BACKENDS[name]
+
+
+def set_backend(backend: Optional[LLMBackend], site: str = None):
+    """Override the backend for one call site (or all sites); None removes the override"""
+    key = (site or "").upper()
+    if backend is None:
+        _OVERRIDES.pop(key, None)
+    else:
+        _OVERRIDES[key] = backend
+
+
+def model_for(site: str) -> str:
+    """Model for a call site: LLM_MODEL_<SITE>, then LLM_MODEL"""
+    return os.getenv(f"LLM_MODEL_{site.upper()}", DEFAULT_MODEL)
+
+
+def get_backend_stats() -> dict:
+    """Usage counters of every instantiated backend"""
+    stats = {}
+    backends = {id(b): b for b in list(_BACKENDS.values()) + list(_OVERRIDES.values())}
+    for backend in backends.values():
+        label = backend.name
+        while label in stats:
+            label += "'"
+        stats[label] = dict(backend.usage)
+    return stats
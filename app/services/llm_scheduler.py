@@ -0,0 +1,123 @@
+import asyncio
+import json
+from typing import Awaitable, Callable, Optional
+
+from app.utils.logger import logger
+
+
+class ClassificationScheduler:
+    """
+    Micro-batching scheduler for small async LLM classification calls.
+
+    Requests arriving within `window_ms` of each other are collected into one
+    batch (up to `max_batch`). Identical requests in the same batch are sent
+    once and the result is fanned back to every caller. Each distinct request
+    is dispatched concurrently, but never more than `max_in_flight` at a
+    time across the whole process, so a burst of customers turns into a
+    steady, bounded stream against the provider's rate limits.
+    """
+
+    def __init__(
+        self,
+        dispatch: Callable[..., Awaitable],
+        window_ms: float = 5,
+        max_batch: int = 32,
+        max_in_flight: int = 16
+    ):
+        self.dispatch = dispatch
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.max_in_flight = max_in_flight
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self.requests = 0
+        self.batches = 0
+        self.deduplicated = 0
+        self.dispatched = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.max_batch_seen = 0
+
+    def _ensure_started(self):
+        """Bind queue/semaphore/worker to the running loop (re-binds if the loop changed)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, **request):
+        """Queue one request and wait for its result (exceptions are re-raised)"""
+        self._ensure_started()
+        self.requests += 1
+        future = self._loop.create_future()
+        await self._queue.put((request, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.window
+
+            while len(batch) < self.max_batch:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            self.batches += 1
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+
+            # Fan-in identical requests so each is only sent once
+            groups = {}
+            for request, future in batch:
+                key = json.dumps(request, sort_keys=True, default=str)
+                groups.setdefault(key, (request, []))[1].append(future)
+            self.deduplicated += len(batch) - len(groups)
+
+            for request, futures in groups.values():
+                self._loop.create_task(self._dispatch(request, futures))
+
+    async def _dispatch(self, request: dict, futures: list):
+        async with self._semaphore:
+            self.in_flight += 1
+            self.dispatched += 1
+            try:
+                result = await self.dispatch(**request)
+            except Exception as e:
+                self.failed += 1
+                logger.debug(f"Scheduled LLM request failed: {e}")
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            finally:
+                self.in_flight -= 1
+
+        for future in futures:
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        """Batching statistics (useful for monitoring)"""
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_seen,
+            "deduplicated": self.deduplicated,
+            "dispatched": self.dispatched,
+            "failed": self.failed,
+            "in_flight": self.in_flight,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "window_ms": self.window * 1000,
+            "max_in_flight": self.max_in_flight
+        }
@@ -1,13 +1,20 @@
 import os
-import re
-from groq import Groq
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
-from app.services.session_store import get_history
+import json
+import time
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, wait, FIRST_COMPLETED
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type, retry_if_not_exception_type
+from app.services.session_store import (
+    get_history, get_history_async, get_compaction_candidates, get_compaction_candidates_async,
+    apply_compaction, apply_compaction_async
+)
+from app.services.llm_backend import get_backend, get_backend_stats, model_for
 from app.utils.logger import logger
-
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-
-PHONE_REGEX = r"\+?\d{8,15}"
+from app.utils.ttl_cache import TTLCache
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.llm_scheduler import ClassificationScheduler
+from app.utils.intent_lexer import IntentFeatures, extract_intents
 
 SYSTEM_PROMPT = """You are a customer support priority analyzer. Your task is to classify user messages as HIGH or LOW priority based ONLY on the severity and impact of the issue, NOT on sentiment, tone, or politeness.
 
@@ -289,171 +296,716 @@ TECHNICAL_AGENT
 BILLING_AGENT"""
 
 
+CLASSIFY_PROMPT = f"""You are a customer support classifier. For the user's latest message, perform BOTH tasks below and answer them together.
+
+===== TASK 1: PRIORITY =====
+{SYSTEM_PROMPT.split("Return ONLY")[0].strip()}
+
+===== TASK 2: ROUTING =====
+{ROUTER_PROMPT.split("Return ONLY")[0].strip()}
+
+Return ONLY a JSON object with exactly these two keys and nothing else:
+{{"priority": "HIGH" | "LOW", "agent": "FAQ_AGENT" | "ACCOUNT_AGENT" | "TECHNICAL_AGENT" | "BILLING_AGENT"}}"""
+
+SUMMARY_PROMPT = """You maintain a running summary of a customer support conversation. You are given the previous summary (if any) and the next messages of the conversation.
+
+Write an updated summary that keeps everything an agent needs to continue the conversation:
+- what the customer asked for and which issues they reported
+- account details, order numbers, dates and values they mentioned
+- what support already answered, did or promised
+- anything still unresolved
+
+Be factual and concise (at most 120 words). Do not add greetings or commentary.
+
+Return ONLY the summary text."""
+
+# Fallback summary size when the LLM cannot produce one
+SUMMARY_MAX_CHARS = 800
+
+ALLOWED_AGENTS = {
+    "ACCOUNT_AGENT",
+    "BILLING_AGENT",
+    "TECHNICAL_AGENT",
+    "FAQ_AGENT"
+}
+
+# Routing/priority decision cache: skips the LLM for repeated messages with
+# identical recent context. ROUTING_CACHE_SIZE=0 disables it.
+DECISION_CACHE = TTLCache(
+    max_size=int(os.getenv("ROUTING_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("ROUTING_CACHE_TTL_SECONDS", "600"))
+)
+
+# Local router confidence at or above which the LLM is skipped entirely.
+# Set above 1.0 to disable the fast path.
+FAST_PATH_CONFIDENCE = float(os.getenv("FAST_PATH_CONFIDENCE", "0.9"))
+
+# How routing decisions were made (fast_path / cache / llm / fallback)
+ROUTING_STATS = {"fast_path": 0, "cache": 0, "llm": 0, "fallback": 0}
+
+# Call sites: each picks its backend (LLM_BACKEND_<SITE>) and model
+# (LLM_MODEL_<SITE>) independently, see app/services/llm_backend.py
+PRIORITY_SITE = "priority"
+ROUTER_SITE = "router"
+CLASSIFY_SITE = "classify"
+SUMMARY_SITE = "summarize"
+
+# Shared breaker for every LLM call: while open, callers go straight to
+# their keyword fallbacks instead of sitting through tenacity retries.
+LLM_BREAKER = CircuitBreaker(
+    name="llm",
+    window_seconds=float(os.getenv("LLM_BREAKER_WINDOW_SECONDS", "60")),
+    min_calls=int(os.getenv("LLM_BREAKER_MIN_CALLS", "10")),
+    error_rate_threshold=float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5")),
+    slow_call_seconds=float(os.getenv("LLM_BREAKER_SLOW_CALL_SECONDS", "5")),
+    slow_rate_threshold=float(os.getenv("LLM_BREAKER_SLOW_RATE", "0.8")),
+    open_seconds=float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
+)
+
+# Hedged requests: if a call is slower than the recent p95, fire a second
+# identical call and take whichever answers first.
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "150")) / 1000
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_MS", "1000")) / 1000
+HEDGE_STATS = {"hedged": 0, "hedge_wins": 0}
+_HEDGE_POOL = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_HEDGE_POOL_SIZE", "32")), thread_name_prefix="llm-hedge")
+
+
+def _complete(site: str, messages: list, max_tokens: int = 10, response_format: dict = None) -> str:
+    """One backend call; only its own duration is reported to the breaker"""
+    start = time.monotonic()
+    try:
+        output = get_backend(site).complete(
+            messages,
+            max_tokens=max_tokens,
+            model=model_for(site),
+            response_format=response_format
+        )
+    except Exception:
+        LLM_BREAKER.record_failure(time.monotonic() - start)
+        raise
+    LLM_BREAKER.record_success(time.monotonic() - start)
+    return output
+
+
+async def _acomplete(site: str, **request) -> str:
+    """Async variant of _complete"""
+    start = time.monotonic()
+    try:
+        output = await get_backend(site).acomplete(model=model_for(site), **request)
+    except Exception:
+        LLM_BREAKER.record_failure(time.monotonic() - start)
+        raise
+    LLM_BREAKER.record_success(time.monotonic() - start)
+    return output
+
+
+def _dispatch_completion(site: str, **request):
+    """
+    Send one request, hedged when enabled. Runs after batching linger and
+    the in-flight wait, so the hedge delay (and every latency sample behind
+    its p95) only covers the backend calls themselves.
+    """
+    if LLM_HEDGE_ENABLED:
+        return _ahedged_call(lambda: _acomplete(site, **request))
+    return _acomplete(site, **request)
+
+
+# Async classification calls are coalesced in small windows and dispatched
+# under a global in-flight cap instead of as independent retry storms.
+LLM_BATCHING_ENABLED = os.getenv("LLM_BATCHING_ENABLED", "true").lower() == "true"
+LLM_SCHEDULER = ClassificationScheduler(
+    dispatch=_dispatch_completion,
+    window_ms=float(os.getenv("LLM_BATCH_WINDOW_MS", "5")),
+    max_batch=int(os.getenv("LLM_BATCH_MAX_SIZE", "32")),
+    max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", "16"))
+)
+
+
+def _hedge_delay() -> float:
+    """Seconds to wait before hedging: recent p95 latency, floored at LLM_HEDGE_MIN_DELAY"""
+    p95 = LLM_BREAKER.latency_percentile(95)
+    if p95 is None:
+        return LLM_HEDGE_DEFAULT_DELAY
+    return max(LLM_HEDGE_MIN_DELAY, p95)
+
+
+def _hedged_call(fn):
+    """Run fn; if it is still running after the hedge delay, race a second copy and take the first success"""
+    primary = _HEDGE_POOL.submit(fn)
+    try:
+        return primary.result(timeout=_hedge_delay())
+    except FuturesTimeoutError:
+        pass
+
+    HEDGE_STATS["hedged"] += 1
+    hedge = _HEDGE_POOL.submit(fn)
+    pending = {primary, hedge}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is hedge:
+                    HEDGE_STATS["hedge_wins"] += 1
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+async def _ahedged_call(coro_fn):
+    """Async variant of _hedged_call; the losing request is cancelled"""
+    primary = asyncio.ensure_future(coro_fn())
+    done, _ = await asyncio.wait({primary}, timeout=_hedge_delay())
+    if done:
+        return primary.result()
+
+    HEDGE_STATS["hedged"] += 1
+    hedge = asyncio.ensure_future(coro_fn())
+    pending = {primary, hedge}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        HEDGE_STATS["hedge_wins"] += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
 @retry(
     stop=stop_after_attempt(3),
     wait=wait_exponential(multiplier=1, min=2, max=10),
-    retry=retry_if_exception_type(Exception)
+    retry=retry_if_exception_type(Exception) & retry_if_not_exception_type(CircuitOpenError)
 )
-def _call_groq_api(messages: list, max_tokens: int = 10, model: str = "llama-3.1-8b-instant"):
-    """Call Groq API with retry logic"""
+def _call_llm(site: str, messages: list, max_tokens: int = 10, response_format: dict = None) -> str:
+    """Call the call site's LLM backend with retry logic, circuit breaker and optional request hedging"""
+    # Fails fast (no retries) while the breaker is open
+    LLM_BREAKER.before_call()
+
+    def create():
+        return _complete(site, messages, max_tokens=max_tokens, response_format=response_format)
+
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=0,
-            max_tokens=max_tokens,
-            timeout=10
-        )
-        return response
+        return _hedged_call(create) if LLM_HEDGE_ENABLED else create()
+    except Exception as e:
+        logger.error(f"LLM call ({site}) failed: {e}")
+        raise
+
+
+@retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=1, min=2, max=10),
+    retry=retry_if_exception_type(Exception) & retry_if_not_exception_type(CircuitOpenError)
+)
+async def _acall_llm(site: str, messages: list, max_tokens: int = 10, response_format: dict = None) -> str:
+    """Async variant of _call_llm (same retry policy, does not block a worker thread)"""
+    LLM_BREAKER.before_call()
+
+    request = dict(site=site, messages=messages, max_tokens=max_tokens, response_format=response_format)
+    try:
+        if LLM_BATCHING_ENABLED:
+            return await LLM_SCHEDULER.submit(**request)
+        return await _dispatch_completion(**request)
     except Exception as e:
-        logger.error(f"Groq API call failed: {e}")
+        logger.error(f"LLM call ({site}) failed: {e}")
         raise
+    except BaseException:
+        # Cancelled (client disconnect, timeout, lost hedge race): nothing
+        # was recorded, so a half-open probe slot must be handed back
+        LLM_BREAKER.release()
+        raise
+
+
+def get_llm_health() -> dict:
+    """Backend usage, circuit breaker state and hedging/batching counters for the LLM dependency"""
+    return {
+        "sites": {
+            site: {"backend": get_backend(site).name, "model": model_for(site)}
+            for site in (PRIORITY_SITE, ROUTER_SITE, CLASSIFY_SITE, SUMMARY_SITE)
+        },
+        "usage": get_backend_stats(),
+        "breaker": LLM_BREAKER.snapshot(),
+        "hedging": {
+            "enabled": LLM_HEDGE_ENABLED,
+            "current_delay_ms": round(_hedge_delay() * 1000, 1),
+            **HEDGE_STATS
+        },
+        "scheduler": {"enabled": LLM_BATCHING_ENABLED, **LLM_SCHEDULER.stats()}
+    }
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return " ".join(message.lower().split()).rstrip(" .!?")
+
+
+def _decision_key(kind: str, message: str, history: list) -> tuple:
+    """Cache key: decision kind + normalized message + fingerprint of recent history"""
+    fingerprint = hashlib.blake2b(digest_size=16)
+    for msg in history:
+        fingerprint.update(msg["role"].encode())
+        fingerprint.update(b"\x00")
+        fingerprint.update(normalize_message(msg["content"]).encode())
+        fingerprint.update(b"\x01")
+    return (kind, normalize_message(message), fingerprint.hexdigest())
+
+
+def _lookup_decision(kind: str, customer_id: str, message: str):
+    """Fetch history once and check the decision cache. Returns (history, key, cached)"""
+    history = get_history(customer_id)
+    key = _decision_key(kind, message, history)
+    cached = DECISION_CACHE.get(key)
+    if cached is not None:
+        logger.info(f"Decision cache hit ({kind}) for customer {customer_id}: {cached}")
+    return history, key, cached
+
+
+async def _lookup_decision_async(kind: str, customer_id: str, message: str):
+    """Async variant of _lookup_decision"""
+    history = await get_history_async(customer_id)
+    key = _decision_key(kind, message, history)
+    cached = DECISION_CACHE.get(key)
+    if cached is not None:
+        logger.info(f"Decision cache hit ({kind}) for customer {customer_id}: {cached}")
+    return history, key, cached
+
+
+def _build_messages(prompt: str, history: list, message: str) -> list:
+    """System prompt + conversation history + current user message"""
+    return [
+        {"role": "system", "content": prompt},
+        *history,
+        {"role": "user", "content": message}
+    ]
+
+
+def _parse_priority(output: str):
+    """Extract HIGH/LOW from LLM output, or None if unclear"""
+    output = (output or "").strip().upper()
+    # More robust parsing: check for HIGH priority indicators
+    if "HIGH" in output:
+        return "HIGH"
+    if "LOW" in output:
+        return "LOW"
+    return None
+
+
+def _parse_agent(output: str):
+    """Extract an agent name from LLM output, or None if unclear"""
+    output = (output or "").strip().upper()
+
+    # Check if any allowed agent name appears in the output
+    for agent in ALLOWED_AGENTS:
+        if agent in output:
+            return agent
+
+    # Fallback: try to match partial agent names
+    if "ACCOUNT" in output and "AGENT" in output:
+        return "ACCOUNT_AGENT"
+    elif "BILLING" in output and "AGENT" in output:
+        return "BILLING_AGENT"
+    elif "TECHNICAL" in output and "AGENT" in output:
+        return "TECHNICAL_AGENT"
+    elif "FAQ" in output and "AGENT" in output:
+        return "FAQ_AGENT"
+    return None
+
+
+def _hard_override_agent(features: IntentFeatures):
+    """Phone number + update verb always goes to ACCOUNT_AGENT, without asking the LLM"""
+    # Only route to ACCOUNT_AGENT if phone number is present AND it's an update request
+    if features.phone and features.has("update_verb"):
+        logger.info(f"Hard override: ACCOUNT_AGENT (phone number detected)")
+        return "ACCOUNT_AGENT"
+    return None
+
+
+def fallback_keyword_priority(message: str, features: IntentFeatures = None) -> str:
+    """Fallback priority when LLM fails: analyze keywords for priority"""
+    features = features or extract_intents(message)
+    if features.has("high_priority"):
+        return "HIGH"
+    return "LOW"
 
 
-def analyze_priority(customer_id: str, message: str) -> str:
+def _priority_from_output(customer_id: str, output: str, cache_key: tuple) -> str:
+    priority = _parse_priority(output)
+    if priority:
+        logger.info(f"Priority analysis: {priority} for customer {customer_id}")
+        DECISION_CACHE.set(cache_key, priority)
+        return priority
+
+    # Fallback: if unclear, default to LOW (safer default)
+    logger.warning(f"Priority analysis unclear, defaulting to LOW for customer {customer_id}")
+    return "LOW"
+
+
+def analyze_priority(customer_id: str, message: str, features: IntentFeatures = None) -> str:
     """Analyze message priority with retry and fallback logic"""
     try:
-        history = get_history(customer_id)
-
-        messages = [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            *history,
-            {"role": "user", "content": message}
-        ]
-
-        response = _call_groq_api(messages, max_tokens=10)
-        output = response.choices[0].message.content.strip().upper()
-        
-        # More robust parsing: check for HIGH priority indicators
-        if "HIGH" in output:
-            logger.info(f"Priority analysis: HIGH for customer {customer_id}")
-            return "HIGH"
-        elif "LOW" in output:
-            logger.info(f"Priority analysis: LOW for customer {customer_id}")
-            return "LOW"
-        else:
-            # Fallback: if unclear, default to LOW (safer default)
-            logger.warning(f"Priority analysis unclear, defaulting to LOW for customer {customer_id}")
-            return "LOW"
+        history, key, cached = _lookup_decision("priority", customer_id, message)
+        if cached:
+            return cached
+
+        messages = _build_messages(SYSTEM_PROMPT, history, message)
+        output = _call_llm(PRIORITY_SITE, messages, max_tokens=10)
+        return _priority_from_output(customer_id, output, key)
     except Exception as e:
         logger.error(f"Priority analysis failed for customer {customer_id}: {e}")
-        # Fallback: analyze keywords for priority
-        message_lower = message.lower()
-        high_priority_keywords = [
-            "cannot", "can't", "failed", "error", "broken", "crash", 
-            "lost", "hacked", "unauthorized", "payment failed", "data loss"
-        ]
-        if any(kw in message_lower for kw in high_priority_keywords):
-            return "HIGH"
-        return "LOW"
+        return fallback_keyword_priority(message, features)
 
 
-def fallback_keyword_router(message: str) -> str:
+async def analyze_priority_async(customer_id: str, message: str, features: IntentFeatures = None) -> str:
+    """Async variant of analyze_priority"""
+    try:
+        history, key, cached = await _lookup_decision_async("priority", customer_id, message)
+        if cached:
+            return cached
+
+        messages = _build_messages(SYSTEM_PROMPT, history, message)
+        output = await _acall_llm(PRIORITY_SITE, messages, max_tokens=10)
+        return _priority_from_output(customer_id, output, key)
+    except Exception as e:
+        logger.error(f"Priority analysis failed for customer {customer_id}: {e}")
+        return fallback_keyword_priority(message, features)
+
+
+def score_local_route(message: str, features: IntentFeatures = None) -> tuple[str, float, str]:
     """
-    Fallback router when LLM fails or confidence is low.
-    Uses keyword matching as backup for reliability.
+    Scored keyword router. Returns (agent, confidence, reason).
+    The agent follows the same precedence as the keyword fallback; the
+    confidence (0-1) says whether it is safe to answer without the LLM.
     """
-    message_lower = message.lower()
-    
-    # Billing actions (high priority - must check first)
-    billing_action_keywords = [
-        "cancel subscription", "want to cancel", "need refund", "dispute",
-        "cancel my", "i want to cancel", "i need a refund", "i want to dispute"
-    ]
-    if any(kw in message_lower for kw in billing_action_keywords):
-        logger.info("Fallback router: TECHNICAL_AGENT (billing action)")
-        return "TECHNICAL_AGENT"
-    
+    features = features or extract_intents(message)
+    # "How do I cancel...?" is instructional, not an action - let the LLM decide
+    is_question = features.has_any("how_to", "question_mark")
+    other_signals = features.has_any(
+        "route_billing_action", "route_technical", "billing_keyword",
+        "update_verb", "failure", "critical_security"
+    )
+
+    # A message that is only a greeting ("hi", "good morning!"); anything
+    # after it ("hey my data disappeared") may be the actual request
+    if features.only("greeting"):
+        return "FAQ_AGENT", 0.97, "greeting"
+    # Introductions are often followed by the problem ("I am locked out"):
+    # below the fast-path threshold, the LLM decides
+    if not other_signals and features.has("personal_statement") and not features.has_any("question_mark", "request_word"):
+        return "FAQ_AGENT", 0.6, "personal statement"
+
+    # Billing actions (high priority - must check first); only explicit when
+    # they name what is cancelled or refunded ("cancel my order" is not)
+    if features.has("route_billing_action"):
+        explicit = features.matched("route_billing_action") - {"dispute"}
+        if explicit and features.has("billing_object") and not is_question:
+            return "TECHNICAL_AGENT", 0.95, "billing action"
+        return "TECHNICAL_AGENT", 0.5, "billing action"
+
     # Technical issues
-    technical_keywords = [
-        "cannot", "can't", "not working", "broken", "error", "failed", 
-        "crash", "bug", "is slow", "is hanging", "lost", "corrupted",
-        "not loading", "freezing", "timeout"
-    ]
-    if any(kw in message_lower for kw in technical_keywords):
-        logger.info("Fallback router: TECHNICAL_AGENT (technical issue)")
-        return "TECHNICAL_AGENT"
-    
-    # Account updates (check for phone/DOB with update keywords)
-    phone_match = re.search(PHONE_REGEX, message_lower)
-    dob_match = re.search(r"\b\d{4}-\d{2}-\d{2}\b", message)
-    update_keywords = ["update", "change", "modify", "new", "set"]
-    
-    if (phone_match or dob_match) and any(kw in message_lower for kw in update_keywords):
-        logger.info("Fallback router: ACCOUNT_AGENT (account update)")
-        return "ACCOUNT_AGENT"
-    
+    if features.has("route_technical"):
+        return "TECHNICAL_AGENT", 0.4 if is_question else 0.75, "technical issue"
+
+    # Account updates: an update verb with a phone number, or with a date
+    # that is called a date of birth (any other date may be an order or an
+    # incident date, and would be written as the DOB)
+    account_value = features.phone or (features.dob and features.has("dob_cue"))
+    if account_value and features.has("update_verb"):
+        # Billing or technical words make it ambiguous - let the LLM decide,
+        # as does an update verb inside another word ("renew", "reset")
+        ambiguous = is_question or features.has_any("billing_keyword", "failure") or not features.has_word("update_verb")
+        return "ACCOUNT_AGENT", 0.5 if ambiguous else 0.95, "account update"
+
     # Billing viewing (must have billing keywords AND viewing verbs)
-    billing_keywords = ["billing", "invoice", "receipt", "order", "payment", "subscription", "plan"]
-    viewing_verbs = ["show", "view", "see", "tell", "want", "email", "list", "what", "when"]
-    
-    if any(kw in message_lower for kw in billing_keywords) and any(kw in message_lower for kw in viewing_verbs):
-        logger.info("Fallback router: BILLING_AGENT (billing viewing)")
-        return "BILLING_AGENT"
-    
+    if features.has("billing_keyword") and features.has("viewing_verb"):
+        return "BILLING_AGENT", 0.7, "billing viewing"
+
     # Default to FAQ
-    logger.info("Fallback router: FAQ_AGENT (default)")
-    return "FAQ_AGENT"
+    if features.has("how_to") and not other_signals:
+        return "FAQ_AGENT", 0.8, "how-to question"
+    return "FAQ_AGENT", 0.4, "default"
 
 
-def route_query(customer_id: str, message: str) -> str:
+def fallback_keyword_router(message: str, features: IntentFeatures = None) -> str:
+    """
+    Fallback router when LLM fails or confidence is low.
+    Uses keyword matching as backup for reliability.
+    """
+    agent, confidence, reason = score_local_route(message, features)
+    logger.info(f"Fallback router: {agent} ({reason})")
+    return agent
+
+
+def _fast_path_route(customer_id: str, message: str, features: IntentFeatures):
+    """Return the local route if it is confident enough to skip the LLM, else None"""
+    override = _hard_override_agent(features)
+    if override:
+        ROUTING_STATS["fast_path"] += 1
+        return override
+
+    agent, confidence, reason = score_local_route(message, features)
+    if confidence >= FAST_PATH_CONFIDENCE:
+        ROUTING_STATS["fast_path"] += 1
+        logger.info(f"Fast path: {agent} ({reason}, confidence {confidence:.2f}) for customer {customer_id}")
+        return agent
+    return None
+
+
+def get_routing_stats() -> dict:
+    """Routing decision counters (useful for monitoring)"""
+    total = sum(ROUTING_STATS.values())
+    return {
+        **ROUTING_STATS,
+        "total": total,
+        "fast_path_ratio": round(ROUTING_STATS["fast_path"] / total, 4) if total else 0.0,
+        "fast_path_confidence": FAST_PATH_CONFIDENCE
+    }
+
+
+def _agent_from_output(message: str, output: str, cache_key: tuple, features: IntentFeatures) -> str:
+    agent = _parse_agent(output)
+    if agent:
+        logger.info(f"LLM routed to: {agent}")
+        ROUTING_STATS["llm"] += 1
+        DECISION_CACHE.set(cache_key, agent)
+        return agent
+
+    # LLM output unclear, use fallback
+    ROUTING_STATS["fallback"] += 1
+    logger.warning(f"LLM output unclear: {output}, using fallback router")
+    return fallback_keyword_router(message, features)
+
+
+def route_query(customer_id: str, message: str, features: IntentFeatures = None) -> str:
     """Route query to appropriate agent with retry and fallback logic"""
     logger.info(f"Routing query for customer {customer_id}: {message[:100]}")
     
     # 🔑 HARD OVERRIDE: phone number input (only if it's clearly an update request)
-    message_lower = message.lower()
-    phone_match = re.search(PHONE_REGEX, message)
-    
-    # Only route to ACCOUNT_AGENT if phone number is present AND it's an update request
-    if phone_match and any(keyword in message_lower for keyword in ["update", "change", "modify", "new", "set"]):
-        logger.info(f"Hard override: ACCOUNT_AGENT (phone number detected)")
-        return "ACCOUNT_AGENT"
+    features = features or extract_intents(message)
+    fast_agent = _fast_path_route(customer_id, message, features)
+    if fast_agent:
+        return fast_agent
 
     try:
-        history = get_history(customer_id)
-
-        messages = [
-            {"role": "system", "content": ROUTER_PROMPT},
-            *history,
-            {"role": "user", "content": message}
-        ]
-
-        response = _call_groq_api(messages, max_tokens=20)
-        output = response.choices[0].message.content.strip().upper()
-        
-        # Extract agent name even if there's extra text
-        allowed_agents = {
-            "ACCOUNT_AGENT",
-            "BILLING_AGENT",
-            "TECHNICAL_AGENT",
-            "FAQ_AGENT"
-        }
-        
-        # Check if any allowed agent name appears in the output
-        for agent in allowed_agents:
-            if agent in output:
-                logger.info(f"LLM routed to: {agent}")
-                return agent
-        
-        # Fallback: try to match partial agent names
-        if "ACCOUNT" in output and "AGENT" in output:
-            logger.info(f"Partial match routed to: ACCOUNT_AGENT")
-            return "ACCOUNT_AGENT"
-        elif "BILLING" in output and "AGENT" in output:
-            logger.info(f"Partial match routed to: BILLING_AGENT")
-            return "BILLING_AGENT"
-        elif "TECHNICAL" in output and "AGENT" in output:
-            logger.info(f"Partial match routed to: TECHNICAL_AGENT")
-            return "TECHNICAL_AGENT"
-        elif "FAQ" in output and "AGENT" in output:
-            logger.info(f"Partial match routed to: FAQ_AGENT")
-            return "FAQ_AGENT"
-        
-        # LLM output unclear, use fallback
-        logger.warning(f"LLM output unclear: {output}, using fallback router")
-        return fallback_keyword_router(message)
-        
+        history, key, cached = _lookup_decision("route", customer_id, message)
+        if cached:
+            ROUTING_STATS["cache"] += 1
+            return cached
+
+        messages = _build_messages(ROUTER_PROMPT, history, message)
+        output = _call_llm(ROUTER_SITE, messages, max_tokens=20)
+        return _agent_from_output(message, output, key, features)
     except Exception as e:
         logger.error(f"Routing failed for customer {customer_id}: {e}, using fallback router")
-        return fallback_keyword_router(message)
+        ROUTING_STATS["fallback"] += 1
+        return fallback_keyword_router(message, features)
+
+
+async def route_query_async(customer_id: str, message: str, features: IntentFeatures = None) -> str:
+    """Async variant of route_query"""
+    logger.info(f"Routing query for customer {customer_id}: {message[:100]}")
+
+    features = features or extract_intents(message)
+    fast_agent = _fast_path_route(customer_id, message, features)
+    if fast_agent:
+        return fast_agent
+
+    try:
+        history, key, cached = await _lookup_decision_async("route", customer_id, message)
+        if cached:
+            ROUTING_STATS["cache"] += 1
+            return cached
+
+        messages = _build_messages(ROUTER_PROMPT, history, message)
+        output = await _acall_llm(ROUTER_SITE, messages, max_tokens=20)
+        return _agent_from_output(message, output, key, features)
+    except Exception as e:
+        logger.error(f"Routing failed for customer {customer_id}: {e}, using fallback router")
+        ROUTING_STATS["fallback"] += 1
+        return fallback_keyword_router(message, features)
+
+
+def _parse_classification(output: str) -> dict:
+    """
+    Parse the fused classifier output into {"priority", "agent"}.
+    Fields that cannot be parsed are returned as None so callers can
+    apply the keyword fallback per field.
+    """
+    output = (output or "").strip()
+    try:
+        # Tolerate prose around the JSON object
+        data = json.loads(output[output.index("{"):output.rindex("}") + 1])
+        if not isinstance(data, dict):
+            data = {}
+    except ValueError:
+        data = {}
+
+    if data:
+        return {
+            "priority": _parse_priority(str(data.get("priority", ""))),
+            "agent": _parse_agent(str(data.get("agent", "")))
+        }
 
+    # Non-JSON answers like "HIGH, BILLING_AGENT" still carry usable fields
+    return {"priority": _parse_priority(output), "agent": _parse_agent(output)}
+
+
+def _finish_classification(customer_id: str, message: str, result: dict, features: IntentFeatures) -> dict:
+    """Apply the per-field keyword fallbacks"""
+    if not result["priority"]:
+        result["priority"] = fallback_keyword_priority(message, features)
+    if not result["agent"]:
+        logger.warning(f"Classifier agent unclear for customer {customer_id}, using fallback router")
+        ROUTING_STATS["fallback"] += 1
+        result["agent"] = fallback_keyword_router(message, features)
+
+    logger.info(f"Classified as priority={result['priority']} agent={result['agent']} for customer {customer_id}")
+    return result
+
+
+def classify_query(customer_id: str, message: str, features: IntentFeatures = None) -> dict:
+    """
+    Fused priority + routing classification in a single LLM call.
+    Returns {"priority": "HIGH"|"LOW", "agent": "<AGENT>"}; each field falls
+    back to its keyword classifier independently when it cannot be parsed.
+    """
+    logger.info(f"Classifying query for customer {customer_id}: {message[:100]}")
+
+    features = features or extract_intents(message)
+
+    # Confident local route: no LLM call, keyword priority
+    fast_agent = _fast_path_route(customer_id, message, features)
+    if fast_agent:
+        result = {"priority": fallback_keyword_priority(message, features), "agent": fast_agent}
+        return _finish_classification(customer_id, message, result, features)
+
+    try:
+        history, key, cached = _lookup_decision("classify", customer_id, message)
+        if cached:
+            ROUTING_STATS["cache"] += 1
+            return _finish_classification(customer_id, message, dict(cached), features)
+
+        messages = _build_messages(CLASSIFY_PROMPT, history, message)
+        output = _call_llm(
+            CLASSIFY_SITE,
+            messages,
+            max_tokens=30,
+            response_format={"type": "json_object"}
+        )
+        result = _parse_classification(output)
+        if result["agent"]:
+            ROUTING_STATS["llm"] += 1
+        # Only cache fully-parsed LLM answers, never keyword fallbacks
+        if result["priority"] and result["agent"]:
+            DECISION_CACHE.set(key, dict(result))
+    except Exception as e:
+        logger.error(f"Classification failed for customer {customer_id}: {e}, using fallback classifiers")
+        result = {"priority": None, "agent": None}
+
+    return _finish_classification(customer_id, message, result, features)
+
+
+async def classify_query_async(customer_id: str, message: str, features: IntentFeatures = None) -> dict:
+    """Async variant of classify_query"""
+    logger.info(f"Classifying query for customer {customer_id}: {message[:100]}")
+
+    features = features or extract_intents(message)
+
+    # Confident local route: no LLM call, keyword priority
+    fast_agent = _fast_path_route(customer_id, message, features)
+    if fast_agent:
+        result = {"priority": fallback_keyword_priority(message, features), "agent": fast_agent}
+        return _finish_classification(customer_id, message, result, features)
+
+    try:
+        history, key, cached = await _lookup_decision_async("classify", customer_id, message)
+        if cached:
+            ROUTING_STATS["cache"] += 1
+            return _finish_classification(customer_id, message, dict(cached), features)
+
+        messages = _build_messages(CLASSIFY_PROMPT, history, message)
+        output = await _acall_llm(
+            CLASSIFY_SITE,
+            messages,
+            max_tokens=30,
+            response_format={"type": "json_object"}
+        )
+        result = _parse_classification(output)
+        if result["agent"]:
+            ROUTING_STATS["llm"] += 1
+        # Only cache fully-parsed LLM answers, never keyword fallbacks
+        if result["priority"] and result["agent"]:
+            DECISION_CACHE.set(key, dict(result))
+    except Exception as e:
+        logger.error(f"Classification failed for customer {customer_id}: {e}, using fallback classifiers")
+        result = {"priority": None, "agent": None}
+
+    return _finish_classification(customer_id, message, result, features)
+
+
+def _summary_request(previous: str, messages: list) -> list:
+    transcript = "\n".join(f"{role}: {content}" for role, content, _ in messages)
+    return [
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": f"Previous summary:\n{previous or '(none)'}\n\nNext messages:\n{transcript}"}
+    ]
+
+
+def fallback_summary(previous: str, messages: list) -> str:
+    """Extractive summary when the LLM fails: previous summary + clipped messages, newest kept"""
+    parts = [previous] if previous else []
+    parts.extend(f"{role}: {' '.join(content.split())[:160]}" for role, content, _ in messages)
+    return " | ".join(parts)[-SUMMARY_MAX_CHARS:]
+
+
+def _summary_text(customer_id: str, candidates: tuple, output: str) -> str:
+    previous, messages, _ = candidates
+    summary = " ".join((output or "").split())
+    if not summary:
+        logger.warning(f"Summary unclear for customer {customer_id}, using extractive fallback")
+        summary = fallback_summary(previous, messages)
+    return summary
+
+
+def _store_summary(customer_id: str, candidates: tuple, output: str) -> bool:
+    apply_compaction(customer_id, _summary_text(customer_id, candidates, output), candidates[2])
+    logger.info(f"Compacted {len(candidates[1])} messages into a summary for customer {customer_id}")
+    return True
+
+
+async def _store_summary_async(customer_id: str, candidates: tuple, output: str) -> bool:
+    await apply_compaction_async(customer_id, _summary_text(customer_id, candidates, output), candidates[2])
+    logger.info(f"Compacted {len(candidates[1])} messages into a summary for customer {customer_id}")
+    return True
+
+
+def compact_session(customer_id: str) -> bool:
+    """Fold older turns into the rolling summary if the session is over its token budget"""
+    candidates = get_compaction_candidates(customer_id)
+    if not candidates:
+        return False
+    try:
+        output = _call_llm(SUMMARY_SITE, _summary_request(candidates[0], candidates[1]), max_tokens=200)
+    except Exception as e:
+        logger.error(f"Summarization failed for customer {customer_id}: {e}")
+        output = None
+    return _store_summary(customer_id, candidates, output)
+
+
+async def compact_session_async(customer_id: str) -> bool:
+    """Async variant of compact_session (run after the response is sent)"""
+    candidates = await get_compaction_candidates_async(customer_id)
+    if not candidates:
+        return False
+    try:
+        output = await _acall_llm(SUMMARY_SITE, _summary_request(candidates[0], candidates[1]), max_tokens=200)
+    except Exception as e:
+        logger.error(f"Summarization failed for customer {customer_id}: {e}")
+        output = None
+    return await _store_summary_async(customer_id, candidates, output)
@@ -0,0 +1,728 @@
+"""
+Session storage backends behind app/services/session_store.py.
+
+Backends:
+    memory  - per-process dicts (default; one uvicorn worker only)
+    sqlite  - shared SQLite database in WAL mode; every worker process on
+              the host (or every node on a shared volume) sees the same
+              history and turn counts
+
+Configuration (environment):
+    SESSION_BACKEND                   memory | sqlite
+    SESSION_DB_PATH                   SQLite file (sessions.db)
+    SESSION_CLEANUP_INTERVAL_SECONDS  how often the sqlite backend purges
+                                      expired sessions (60)
+    SESSION_PERSIST_DIR               makes the memory backend crash-safe:
+                                      snapshot + append-only log in this dir
+    SESSION_FSYNC                     always | interval | never (interval)
+    SESSION_FSYNC_INTERVAL_SECONDS    fsync period for "interval" (1)
+    SESSION_SNAPSHOT_EVERY            log records between snapshots; bounds
+                                      replay time at startup (10000)
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from enum import Enum
+from typing import List, Optional
+
+from app.utils.logger import logger
+
+
+class SessionBackend:
+    """
+    Interface. `max_history` messages are kept per customer and sessions
+    idle for longer than `ttl_seconds` are dropped with their turn count.
+    """
+
+    name = "base"
+    # True if calls may wait on disk or locks; async callers then run them in a thread
+    blocking = False
+
+    def __init__(self, max_history: int, ttl_seconds: float):
+        self.max_history = max_history
+        self.ttl_seconds = ttl_seconds
+
+    def append_message(self, customer_id: str, role: str, content: str):
+        """Append a message and trim the history to max_history, atomically"""
+        raise NotImplementedError
+
+    def get_history(self, customer_id: str) -> List[dict]:
+        """
+        Compact LLM context as [{"role", "content"}], oldest first: the
+        rolling summary (if any) as a system message, then the last
+        max_history messages
+        """
+        raise NotImplementedError
+
+    def get_compaction_state(self, customer_id: str):
+        """(summary or None, [(role, content, timestamp), ...]) for the summarizer"""
+        raise NotImplementedError
+
+    def compact(self, customer_id: str, summary: str, through: float):
+        """Replace the summary and drop every message with timestamp <= through, atomically"""
+        raise NotImplementedError
+
+    def get_user_turn_count(self, customer_id: str) -> int:
+        raise NotImplementedError
+
+    def clear_session(self, customer_id: str):
+        raise NotImplementedError
+
+    def cleanup(self):
+        """Drop expired sessions"""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        """{"active_sessions", "total_messages", "oldest_session"}"""
+        raise NotImplementedError
+
+    def close(self):
+        """Flush and release resources (called on application shutdown)"""
+
+    @staticmethod
+    def _summary_message(summary: str) -> dict:
+        return {"role": "system", "content": f"Summary of the earlier conversation: {summary}"}
+
+
+class Role(Enum):
+    """Message roles; members are singletons, so every stored message shares them"""
+    USER = "user"
+    ASSISTANT = "assistant"
+    SYSTEM = "system"
+
+
+class Message:
+    """One stored chat message (~80 bytes plus content, vs ~260 for a dict with an ISO timestamp)"""
+
+    __slots__ = ("role", "content", "timestamp")
+
+    def __init__(self, role: Role, content: str, timestamp: float):
+        self.role = role
+        self.content = content
+        self.timestamp = timestamp  # epoch seconds
+
+    def __repr__(self) -> str:
+        return f"Message({self.role.value!r}, {self.content[:30]!r}, {self.timestamp})"
+
+
+class Session:
+    """
+    Per-customer state. `messages` is a tuple of at most max_history
+    records, replaced on append (copying <= max_history pointers is cheaper
+    than a deque, whose empty size alone is ~760 bytes). The LLM-format
+    view is built on first read and reused until the next change.
+    """
+
+    __slots__ = ("messages", "user_turns", "last_active", "summary", "_llm_view")
+
+    def __init__(self, messages: tuple = (), user_turns: int = 0, last_active: float = 0.0,
+                 summary: Optional[str] = None):
+        self.messages = messages
+        self.user_turns = user_turns
+        self.last_active = last_active
+        self.summary = summary
+        self._llm_view = None
+
+    def llm_view(self) -> List[dict]:
+        if self._llm_view is None:
+            view = [SessionBackend._summary_message(self.summary)] if self.summary else []
+            view.extend({"role": m.role.value, "content": m.content} for m in self.messages)
+            self._llm_view = view
+        return self._llm_view
+
+
+class MemorySessionBackend(SessionBackend):
+    """
+    In-process store. Sessions live in an OrderedDict ordered by last
+    activity, so expiry pops from the front instead of scanning, and stats
+    are maintained incrementally.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_history: int, ttl_seconds: float):
+        super().__init__(max_history, ttl_seconds)
+        # customer_id → Session, least recently active first
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.total_messages = 0
+        self._lock = threading.RLock()
+
+    def _drop(self, customer_id: str):
+        session = self.sessions.pop(customer_id, None)
+        if session is not None:
+            self.total_messages -= len(session.messages)
+
+    def cleanup(self):
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            while self.sessions:
+                customer_id, session = next(iter(self.sessions.items()))
+                if session.last_active >= cutoff:
+                    break
+                self._drop(customer_id)
+
+    def append_message(self, customer_id: str, role: str, content: str):
+        with self._lock:
+            self.cleanup()
+            self._append(customer_id, self._new_message(role, content, time.time()))
+
+    @staticmethod
+    def _new_message(role: str, content: str, timestamp: float) -> Message:
+        """Validated message; ValueError for an unknown role, TypeError for non-text content"""
+        if not isinstance(content, str):
+            raise TypeError(f"Message content must be str, not {type(content).__name__}")
+        return Message(Role(role), content, timestamp)
+
+    def _append(self, customer_id: str, message: Message):
+        """Apply one append (caller holds the lock)"""
+        session = self.sessions.get(customer_id)
+        if session is None:
+            session = self.sessions[customer_id] = Session()
+        else:
+            self.sessions.move_to_end(customer_id)
+
+        # The oldest message drops off when the history is full
+        messages = session.messages
+        if len(messages) >= self.max_history:
+            messages = messages[len(messages) - self.max_history + 1:]
+        else:
+            self.total_messages += 1
+        session.messages = messages + (message,)
+        session.last_active = message.timestamp
+        session._llm_view = None
+
+        if message.role is Role.USER:
+            session.user_turns += 1
+
+    def get_history(self, customer_id: str) -> List[dict]:
+        with self._lock:
+            self.cleanup()
+            session = self.sessions.get(customer_id)
+            # Shallow copy: callers may extend the list, the dicts are shared
+            return list(session.llm_view()) if session else []
+
+    def get_compaction_state(self, customer_id: str):
+        with self._lock:
+            session = self.sessions.get(customer_id)
+            if session is None:
+                return None, []
+            return session.summary, [(m.role.value, m.content, m.timestamp) for m in session.messages]
+
+    def compact(self, customer_id: str, summary: str, through: float):
+        with self._lock:
+            self._compact(customer_id, summary, through)
+
+    def _compact(self, customer_id: str, summary: str, through: float):
+        session = self.sessions.get(customer_id)
+        if session is None:
+            return
+        kept = tuple(m for m in session.messages if m.timestamp > through)
+        self.total_messages -= len(session.messages) - len(kept)
+        session.messages = kept
+        session.summary = summary
+        session._llm_view = None
+
+    def get_user_turn_count(self, customer_id: str) -> int:
+        session = self.sessions.get(customer_id)
+        return session.user_turns if session else 0
+
+    def clear_session(self, customer_id: str):
+        with self._lock:
+            self._drop(customer_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self.cleanup()
+            oldest = next(iter(self.sessions.values()), None)
+            return {
+                "active_sessions": len(self.sessions),
+                "total_messages": self.total_messages,
+                "oldest_session": datetime.fromtimestamp(oldest.last_active).isoformat() if oldest else None
+            }
+
+
+class PersistentMemorySessionBackend(MemorySessionBackend):
+    """
+    Memory backend that survives restarts.
+
+    Every append/clear is written to an append-only log (log.<gen>.jsonl)
+    before it is applied. Once `snapshot_every` records have been logged,
+    the log is rotated under the lock and a compact snapshot of the state
+    at that point is written in the background (tmp file + fsync + rename),
+    after which older logs are deleted. Startup loads the snapshot and
+    replays only the logs from its generation on, so replay time is
+    bounded by `snapshot_every` records plus the (bounded) snapshot size.
+
+    fsync policy:
+        always    fsync every record (no acknowledged append is ever lost)
+        interval  fsync at most every `fsync_interval` seconds (default)
+        never     leave flushing to the OS (survives process crashes only)
+    """
+
+    name = "memory+log"
+
+    FSYNC_POLICIES = ("always", "interval", "never")
+
+    def __init__(self, max_history: int, ttl_seconds: float, directory: str,
+                 fsync: str = "interval", fsync_interval: float = 1.0,
+                 snapshot_every: int = 10000):
+        if fsync not in self.FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+        super().__init__(max_history, ttl_seconds)
+        self.directory = directory
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+        # Appends may fsync
+        self.blocking = fsync != "never"
+
+        self.generation = 0
+        self._records_since_snapshot = 0
+        self._last_fsync = time.monotonic()
+        self._snapshot_thread: Optional[threading.Thread] = None
+        self._log = None
+        self.replayed_records = 0
+        self.recovery_seconds = 0.0
+
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+        self._log = open(self._log_path(self.generation), "a", encoding="utf-8")
+        # Start from a fresh snapshot if replay was long
+        with self._lock:
+            self._maybe_snapshot()
+
+    # ---------- files ----------
+    def _log_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"log.{generation}.jsonl")
+
+    @property
+    def _snapshot_path(self) -> str:
+        return os.path.join(self.directory, "snapshot.json")
+
+    def _log_generations(self) -> List[int]:
+        generations = []
+        for filename in os.listdir(self.directory):
+            if filename.startswith("log.") and filename.endswith(".jsonl"):
+                try:
+                    generations.append(int(filename[4:-6]))
+                except ValueError:
+                    continue
+        return sorted(generations)
+
+    # ---------- recovery ----------
+    def _recover(self):
+        started = time.monotonic()
+        snapshot_generation = 0
+        if os.path.exists(self._snapshot_path):
+            with open(self._snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            snapshot_generation = snapshot["generation"]
+            self._load_snapshot(snapshot["sessions"])
+
+        generations = [g for g in self._log_generations() if g >= snapshot_generation]
+        for generation in generations:
+            self._replay(self._log_path(generation))
+        # Logs older than the snapshot are already folded into it
+        for generation in self._log_generations():
+            if generation < snapshot_generation:
+                os.remove(self._log_path(generation))
+
+        self.generation = max([snapshot_generation, *generations])
+        self.cleanup()
+        self.recovery_seconds = time.monotonic() - started
+
+    def _load_snapshot(self, sessions: list):
+        for customer_id, last_active, user_turns, messages, summary in sessions:
+            history = tuple(
+                Message(Role(role), content, timestamp)
+                for role, content, timestamp in messages[-self.max_history:]
+            )
+            self.sessions[customer_id] = Session(history, user_turns, last_active, summary)
+            self.total_messages += len(history)
+
+    def _replay(self, path: str):
+        with open(path, "rb") as f:
+            lines = f.readlines()
+        valid_bytes = 0
+        for number, line in enumerate(lines):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                if number == len(lines) - 1:
+                    # Torn write at the tail of the log after a crash: cut it off,
+                    # or the log reopened for appending would continue the fragment
+                    self._truncate(path, valid_bytes)
+                    break
+                # Left by a crash before torn tails were truncated
+                logger.warning(f"Skipping corrupt session log record {path}:{number + 1}")
+                valid_bytes += len(line)
+                continue
+            valid_bytes += len(line)
+            if not line.endswith(b"\n"):
+                # Complete record whose newline never reached the disk
+                self._truncate(path, valid_bytes, b"\n")
+            try:
+                self._apply(record)
+            except (KeyError, TypeError, ValueError) as e:
+                # Unusable record (e.g. an unknown role): skip it rather than refuse to start
+                logger.warning(f"Skipping invalid session log record {path}:{number + 1}: {e!r}")
+                continue
+            self.replayed_records += 1
+            self._records_since_snapshot += 1
+
+    def _apply(self, record: dict):
+        """Apply one replayed log record (caller holds the lock)"""
+        if record["op"] == "append":
+            message = self._new_message(record["r"], record["m"], record["t"])
+            # The session had expired before this append: it started over
+            session = self.sessions.get(record["c"])
+            if session is not None and message.timestamp - session.last_active > self.ttl_seconds:
+                self._drop(record["c"])
+            self._append(record["c"], message)
+        elif record["op"] == "clear":
+            self._drop(record["c"])
+        elif record["op"] == "compact":
+            self._compact(record["c"], record["s"], record["t"])
+
+    @staticmethod
+    def _truncate(path: str, size: int, suffix: bytes = b""):
+        with open(path, "r+b") as f:
+            f.truncate(size)
+            f.seek(size)
+            f.write(suffix)
+            f.flush()
+            os.fsync(f.fileno())
+
+    # ---------- logging ----------
+    def _write(self, record: dict):
+        """Append one record to the log (caller holds the lock)"""
+        self._log.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._log.flush()
+
+        if self.fsync == "always":
+            os.fsync(self._log.fileno())
+        elif self.fsync == "interval":
+            now = time.monotonic()
+            if now - self._last_fsync >= self.fsync_interval:
+                os.fsync(self._log.fileno())
+                self._last_fsync = now
+
+        self._records_since_snapshot += 1
+
+    def _maybe_snapshot(self):
+        """Snapshot once enough records were logged (caller holds the lock, record already applied)"""
+        if self._records_since_snapshot >= self.snapshot_every:
+            self._start_snapshot()
+
+    def append_message(self, customer_id: str, role: str, content: str):
+        with self._lock:
+            self.cleanup()
+            # Validate before logging: a bad record would be replayed at every start
+            message = self._new_message(role, content, time.time())
+            self._write({"op": "append", "c": customer_id, "r": role, "m": content, "t": message.timestamp})
+            self._append(customer_id, message)
+            self._maybe_snapshot()
+
+    def clear_session(self, customer_id: str):
+        with self._lock:
+            if customer_id in self.sessions:
+                self._write({"op": "clear", "c": customer_id})
+            self._drop(customer_id)
+            self._maybe_snapshot()
+
+    def compact(self, customer_id: str, summary: str, through: float):
+        with self._lock:
+            if customer_id not in self.sessions:
+                return
+            self._write({"op": "compact", "c": customer_id, "s": summary, "t": through})
+            self._compact(customer_id, summary, through)
+            self._maybe_snapshot()
+
+    # ---------- snapshots ----------
+    def _start_snapshot(self):
+        """Rotate the log and write a snapshot of the current state in the background (caller holds the lock)"""
+        if self._snapshot_thread and self._snapshot_thread.is_alive():
+            return
+
+        sessions = [
+            [customer_id, session.last_active, session.user_turns,
+             [[m.role.value, m.content, m.timestamp] for m in session.messages],
+             session.summary]
+            for customer_id, session in self.sessions.items()
+        ]
+        self._rotate()
+        self._records_since_snapshot = 0
+        self._snapshot_thread = threading.Thread(
+            target=self._write_snapshot,
+            args=(self.generation, sessions),
+            name="session-snapshot",
+            daemon=True
+        )
+        self._snapshot_thread.start()
+
+    def _rotate(self):
+        if self._log:
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._log.close()
+        self.generation += 1
+        self._log = open(self._log_path(self.generation), "a", encoding="utf-8")
+
+    def _write_snapshot(self, generation: int, sessions: list):
+        tmp_path = self._snapshot_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"generation": generation, "sessions": sessions}, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._snapshot_path)
+
+        for old in self._log_generations():
+            if old < generation:
+                os.remove(self._log_path(old))
+
+    def snapshot(self):
+        """Rotate and write a snapshot now, waiting for it to finish"""
+        with self._lock:
+            if self._snapshot_thread:
+                self._snapshot_thread.join()
+            self._start_snapshot()
+            thread = self._snapshot_thread
+        thread.join()
+
+    def close(self):
+        """Snapshot on shutdown so the next start replays nothing"""
+        self.snapshot()
+        with self._lock:
+            self._log.close()
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["persistence"] = {
+            "directory": self.directory,
+            "fsync": self.fsync,
+            "generation": self.generation,
+            "records_since_snapshot": self._records_since_snapshot,
+            "replayed_records": self.replayed_records,
+            "recovery_ms": round(self.recovery_seconds * 1000, 1)
+        }
+        return stats
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """
+    Shared store in a SQLite database in WAL mode (concurrent readers, one
+    writer at a time across processes). Append, trim and turn counting run
+    in one IMMEDIATE transaction, so concurrent workers never interleave a
+    half-applied append. Expired sessions are invisible to reads right away
+    and physically purged at most every `cleanup_interval` seconds.
+    """
+
+    name = "sqlite"
+    # busy_timeout waits up to 5 s for another worker's write
+    blocking = True
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS session_messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        customer_id TEXT NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        created_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_session_messages_customer ON session_messages(customer_id, id);
+    CREATE TABLE IF NOT EXISTS sessions (
+        customer_id TEXT PRIMARY KEY,
+        user_turns INTEGER NOT NULL DEFAULT 0,
+        message_count INTEGER NOT NULL DEFAULT 0,
+        last_active REAL NOT NULL,
+        summary TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_sessions_last_active ON sessions(last_active);
+    """
+
+    def __init__(self, max_history: int, ttl_seconds: float, path: str = "sessions.db",
+                 cleanup_interval: float = 60):
+        super().__init__(max_history, ttl_seconds)
+        self.path = path
+        self.cleanup_interval = cleanup_interval
+        self._local = threading.local()
+        self._next_cleanup = 0.0
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+        # Databases created before rolling summaries
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}
+        if "summary" not in columns:
+            conn.execute("ALTER TABLE sessions ADD COLUMN summary TEXT")
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread (sqlite3 connections are not thread-safe)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def _cutoff(self) -> float:
+        return time.time() - self.ttl_seconds
+
+    def _maybe_cleanup(self):
+        now = time.monotonic()
+        if now >= self._next_cleanup:
+            self._next_cleanup = now + self.cleanup_interval
+            self.cleanup()
+
+    def cleanup(self):
+        conn = self._conn()
+        cutoff = self._cutoff()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "DELETE FROM session_messages WHERE customer_id IN "
+                "(SELECT customer_id FROM sessions WHERE last_active < ?)",
+                (cutoff,)
+            )
+            conn.execute("DELETE FROM sessions WHERE last_active < ?", (cutoff,))
+
+    def append_message(self, customer_id: str, role: str, content: str):
+        self._maybe_cleanup()
+        conn = self._conn()
+        now = time.time()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # A session that expired but was not purged yet starts over
+            conn.execute(
+                "DELETE FROM session_messages WHERE customer_id = ? AND EXISTS "
+                "(SELECT 1 FROM sessions WHERE customer_id = ? AND last_active < ?)",
+                (customer_id, customer_id, self._cutoff())
+            )
+            conn.execute(
+                "DELETE FROM sessions WHERE customer_id = ? AND last_active < ?",
+                (customer_id, self._cutoff())
+            )
+
+            conn.execute(
+                "INSERT INTO session_messages (customer_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                (customer_id, role, content, now)
+            )
+            conn.execute(
+                "INSERT INTO sessions (customer_id, user_turns, message_count, last_active) VALUES (?, ?, 1, ?) "
+                "ON CONFLICT(customer_id) DO UPDATE SET "
+                "user_turns = user_turns + excluded.user_turns, "
+                "message_count = message_count + 1, "
+                "last_active = excluded.last_active",
+                (customer_id, 1 if role == "user" else 0, now)
+            )
+            # Trim to the newest max_history messages
+            trimmed = conn.execute(
+                "DELETE FROM session_messages WHERE customer_id = ? AND id <= "
+                "(SELECT id FROM session_messages WHERE customer_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (customer_id, customer_id, self.max_history)
+            ).rowcount
+            if trimmed:
+                conn.execute(
+                    "UPDATE sessions SET message_count = message_count - ? WHERE customer_id = ?",
+                    (trimmed, customer_id)
+                )
+
+    def _read_session(self, customer_id: str):
+        """(summary, [(role, content, created_at), ...]) of a live session, read in one transaction"""
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN")
+            session = conn.execute(
+                "SELECT summary FROM sessions WHERE customer_id = ? AND last_active >= ?",
+                (customer_id, self._cutoff())
+            ).fetchone()
+            if session is None:
+                return None, []
+            rows = conn.execute(
+                "SELECT role, content, created_at FROM ("
+                "  SELECT id, role, content, created_at FROM session_messages"
+                "  WHERE customer_id = ? ORDER BY id DESC LIMIT ?"
+                ") ORDER BY id",
+                (customer_id, self.max_history)
+            ).fetchall()
+        return session[0], rows
+
+    def get_history(self, customer_id: str) -> List[dict]:
+        summary, rows = self._read_session(customer_id)
+        history = [self._summary_message(summary)] if summary else []
+        history.extend({"role": role, "content": content} for role, content, _ in rows)
+        return history
+
+    def get_compaction_state(self, customer_id: str):
+        return self._read_session(customer_id)
+
+    def compact(self, customer_id: str, summary: str, through: float):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            removed = conn.execute(
+                "DELETE FROM session_messages WHERE customer_id = ? AND created_at <= ?",
+                (customer_id, through)
+            ).rowcount
+            conn.execute(
+                "UPDATE sessions SET summary = ?, message_count = message_count - ? WHERE customer_id = ?",
+                (summary, removed, customer_id)
+            )
+
+    def get_user_turn_count(self, customer_id: str) -> int:
+        row = self._conn().execute(
+            "SELECT user_turns FROM sessions WHERE customer_id = ? AND last_active >= ?",
+            (customer_id, self._cutoff())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def clear_session(self, customer_id: str):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM session_messages WHERE customer_id = ?", (customer_id,))
+            conn.execute("DELETE FROM sessions WHERE customer_id = ?", (customer_id,))
+
+    def stats(self) -> dict:
+        active, total, oldest = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(message_count), 0), MIN(last_active) "
+            "FROM sessions WHERE last_active >= ?",
+            (self._cutoff(),)
+        ).fetchone()
+        return {
+            "active_sessions": active,
+            "total_messages": total,
+            "oldest_session": datetime.fromtimestamp(oldest).isoformat() if oldest is not None else None
+        }
+
+
+def create_session_backend(name: Optional[str], max_history: int, ttl_seconds: float) -> SessionBackend:
+    name = (name or "memory").lower()
+    if name == "memory":
+        persist_dir = os.getenv("SESSION_PERSIST_DIR")
+        if persist_dir:
+            return PersistentMemorySessionBackend(
+                max_history,
+                ttl_seconds,
+                directory=persist_dir,
+                fsync=os.getenv("SESSION_FSYNC", "interval").lower(),
+                fsync_interval=float(os.getenv("SESSION_FSYNC_INTERVAL_SECONDS", "1")),
+                snapshot_every=int(os.getenv("SESSION_SNAPSHOT_EVERY", "10000"))
+            )
+        return MemorySessionBackend(max_history, ttl_seconds)
+    if name == "sqlite":
+        return SQLiteSessionBackend(
+            max_history,
+            ttl_seconds,
+            path=os.getenv("SESSION_DB_PATH", "sessions.db"),
+            cleanup_interval=float(os.getenv("SESSION_CLEANUP_INTERVAL_SECONDS", "60"))
+        )
+    raise ValueError(f"Unknown session backend: {name}")
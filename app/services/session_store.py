@@ -1,94 +1,130 @@
-from collections import defaultdict
-from typing import List, Dict
-from datetime import datetime, timedelta
+import asyncio
+import os
+from typing import List, Optional
+from datetime import timedelta
 
-# customer_id → message history (for LLM context)
-SESSION_MEMORY: Dict[str, List[dict]] = defaultdict(list)
-
-# customer_id → total user turns (for escalation logic)
-USER_TURN_COUNT: Dict[str, int] = defaultdict(int)
-
-# customer_id → last activity timestamp (for cleanup)
-SESSION_TIMESTAMPS: Dict[str, datetime] = {}
+from app.services.llm_backend import estimate_tokens
+from app.services.session_backend import SessionBackend, create_session_backend
 
 MAX_HISTORY = 10
 SESSION_TTL = timedelta(hours=24)  # Sessions expire after 24 hours
-CLEANUP_INTERVAL = 100  # Cleanup every 100 messages
+
+# Rolling summarization: once the LLM context of a session exceeds the token
+# budget, everything but the newest SUMMARY_KEEP_RECENT messages is folded
+# into a summary after the response has been sent.
+SUMMARY_ENABLED = os.getenv("SESSION_SUMMARY_ENABLED", "true").lower() == "true"
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SESSION_SUMMARY_TOKEN_BUDGET", "600"))
+SUMMARY_KEEP_RECENT = int(os.getenv("SESSION_SUMMARY_KEEP_RECENT", "4"))
+
+# SESSION_BACKEND=sqlite shares sessions between uvicorn workers and
+# SESSION_PERSIST_DIR makes the in-memory default survive restarts (see
+# app/services/session_backend.py)
+_backend: SessionBackend = create_session_backend(
+    os.getenv("SESSION_BACKEND"), MAX_HISTORY, SESSION_TTL.total_seconds()
+)
+
+
+def get_session_backend() -> SessionBackend:
+    return _backend
+
+
+def set_session_backend(backend: SessionBackend):
+    """Swap the session backend (e.g. in tools and load tests)"""
+    global _backend
+    _backend = backend
+
+
+def close_session_store():
+    """Flush the session backend (snapshots persistent sessions); call on shutdown"""
+    _backend.close()
 
 
 def cleanup_old_sessions():
     """Remove sessions older than TTL to prevent memory leaks"""
-    now = datetime.now()
-    to_remove = [
-        customer_id for customer_id, timestamp in SESSION_TIMESTAMPS.items()
-        if now - timestamp > SESSION_TTL
-    ]
-    
-    for customer_id in to_remove:
-        if customer_id in SESSION_MEMORY:
-            del SESSION_MEMORY[customer_id]
-        if customer_id in USER_TURN_COUNT:
-            del USER_TURN_COUNT[customer_id]
-        if customer_id in SESSION_TIMESTAMPS:
-            del SESSION_TIMESTAMPS[customer_id]
+    _backend.cleanup()
 
 
 def append_message(customer_id: str, role: str, content: str):
-    # Periodic cleanup to prevent memory leaks
-    if len(SESSION_MEMORY) % CLEANUP_INTERVAL == 0:
-        cleanup_old_sessions()
-    
-    # Append message with timestamp
-    SESSION_MEMORY[customer_id].append({
-        "role": role,
-        "content": content,
-        "timestamp": datetime.now().isoformat()
-    })
-    
-    # Update session timestamp
-    SESSION_TIMESTAMPS[customer_id] = datetime.now()
-
-    # 🔥 IMPORTANT: track user turns separately
-    if role == "user":
-        USER_TURN_COUNT[customer_id] += 1
+    """Append a message; history is trimmed to MAX_HISTORY and user turns are counted"""
+    _backend.append_message(customer_id, role, content)
+
+
+async def _run(method, *args):
+    """Call a backend method, in a worker thread if it may block the event loop"""
+    if _backend.blocking:
+        return await asyncio.to_thread(method, *args)
+    return method(*args)
+
+
+async def append_message_async(customer_id: str, role: str, content: str):
+    """Async variant of append_message"""
+    await _run(_backend.append_message, customer_id, role, content)
 
 
 def get_history(customer_id: str) -> List[dict]:
-    """Get conversation history for LLM context (last MAX_HISTORY messages)"""
-    # Clean up old sessions first
-    cleanup_old_sessions()
-    
-    # Return only recent messages (without timestamps for LLM)
-    messages = SESSION_MEMORY.get(customer_id, [])
-    recent_messages = messages[-MAX_HISTORY:]
-    
-    # Return in format expected by LLM (without timestamp)
-    return [
-        {"role": msg["role"], "content": msg["content"]}
-        for msg in recent_messages
-    ]
+    """Get conversation history for LLM context (rolling summary + last MAX_HISTORY messages)"""
+    return _backend.get_history(customer_id)
+
+
+async def get_history_async(customer_id: str) -> List[dict]:
+    """Async variant of get_history"""
+    return await _run(_backend.get_history, customer_id)
+
+
+def get_compaction_candidates(customer_id: str) -> Optional[tuple]:
+    """
+    If the session's context is over SUMMARY_TOKEN_BUDGET, return
+    (previous summary, [(role, content, timestamp), ...] to fold, through);
+    otherwise None
+    """
+    if not SUMMARY_ENABLED:
+        return None
+    return _compaction_candidates(*_backend.get_compaction_state(customer_id))
+
+
+async def get_compaction_candidates_async(customer_id: str) -> Optional[tuple]:
+    """Async variant of get_compaction_candidates"""
+    if not SUMMARY_ENABLED:
+        return None
+    return _compaction_candidates(*await _run(_backend.get_compaction_state, customer_id))
+
+
+def _compaction_candidates(summary: Optional[str], messages: list) -> Optional[tuple]:
+    if len(messages) <= SUMMARY_KEEP_RECENT:
+        return None
+    tokens = estimate_tokens(summary or "") + sum(estimate_tokens(content) for _, content, _ in messages)
+    if tokens <= SUMMARY_TOKEN_BUDGET:
+        return None
+
+    older = messages[:-SUMMARY_KEEP_RECENT] if SUMMARY_KEEP_RECENT else messages
+    return summary, older, older[-1][2]
+
+
+def apply_compaction(customer_id: str, summary: str, through: float):
+    """Store the new summary and drop the messages it covers (timestamp <= through)"""
+    _backend.compact(customer_id, summary, through)
+
+
+async def apply_compaction_async(customer_id: str, summary: str, through: float):
+    """Async variant of apply_compaction"""
+    await _run(_backend.compact, customer_id, summary, through)
 
 
 def get_user_turn_count(customer_id: str) -> int:
     """Get user turn count for escalation logic"""
-    return USER_TURN_COUNT.get(customer_id, 0)
+    return _backend.get_user_turn_count(customer_id)
+
+
+async def get_user_turn_count_async(customer_id: str) -> int:
+    """Async variant of get_user_turn_count"""
+    return await _run(_backend.get_user_turn_count, customer_id)
 
 
 def clear_session(customer_id: str):
     """Clear session for a specific customer (useful for testing or logout)"""
-    if customer_id in SESSION_MEMORY:
-        del SESSION_MEMORY[customer_id]
-    if customer_id in USER_TURN_COUNT:
-        del USER_TURN_COUNT[customer_id]
-    if customer_id in SESSION_TIMESTAMPS:
-        del SESSION_TIMESTAMPS[customer_id]
+    _backend.clear_session(customer_id)
 
 
 def get_session_stats() -> dict:
     """Get statistics about active sessions (useful for monitoring)"""
-    cleanup_old_sessions()
-    return {
-        "active_sessions": len(SESSION_MEMORY),
-        "total_messages": sum(len(msgs) for msgs in SESSION_MEMORY.values()),
-        "oldest_session": min(SESSION_TIMESTAMPS.values()).isoformat() if SESSION_TIMESTAMPS else None
-    }
+    return {"backend": _backend.name, **_backend.stats()}
@@ -1,24 +1,59 @@
+import uuid
 from datetime import datetime
+from app.services.issue_queue import get_issue_queue
+from app.utils import supabase_async as db
 from app.utils.supabase_client import supabase
 
+
+def _issue_row(customer_id: str, issue_type: str, description: str, idempotency_key: str = None) -> dict:
+    return {
+        "customer_id": customer_id,
+        "issue_type": issue_type,
+        "description": description,
+        "status": "open",
+        "solution": None,
+        "created_at": datetime.utcnow().isoformat(),
+        "resolved_at":None,
+        # Retried inserts of the same issue are ignored by the unique index
+        "idempotency_key": idempotency_key or uuid.uuid4().hex
+    }
+
+
 def create_technical_issue(
     customer_id: str,
     issue_type: str,
-    description: str
+    description: str,
+    idempotency_key: str = None
 ):
+    row = _issue_row(customer_id, issue_type, description, idempotency_key)
+
+    # Write-behind: spool locally, the issue writer inserts it in the background
+    queue = get_issue_queue()
+    if queue is not None:
+        queue.enqueue(row)
+        return [row]
+
     response = (
         supabase
         .table("technical_issues")
-        .insert({
-            "customer_id": customer_id,
-            "issue_type": issue_type,
-            "description": description,
-            "status": "open",
-            "solution": None,
-            "created_at": datetime.utcnow().isoformat(),
-            "resolved_at":None
-        })
+        .insert(row)
         .execute()
     )
 
     return response.data
+
+
+async def create_technical_issue_async(
+    customer_id: str,
+    issue_type: str,
+    description: str,
+    idempotency_key: str = None
+):
+    row = _issue_row(customer_id, issue_type, description, idempotency_key)
+
+    queue = get_issue_queue()
+    if queue is not None:
+        queue.enqueue(row)
+        return [row]
+
+    return await db.insert("technical_issues", row)
@@ -1,16 +1,19 @@
-from app.utils.supabase_client import supabase
+from app.services.account_service import fetch_account_row, fetch_account_row_async
 
 def get_user_email(customer_id: str) -> str:
-    response = (
-        supabase
-        .table("accounts")
-        .select("email")
-        .eq("customer_id", customer_id)
-        .single()
-        .execute()
-    )
+    # Read through the account cache: billing chats ask for this every time
+    row = fetch_account_row(customer_id)
 
-    if not response.data:
+    if not row or not row.get("email"):
         raise Exception("User email not found")
 
-    return response.data["email"]
+    return row["email"]
+
+
+async def get_user_email_async(customer_id: str) -> str:
+    row = await fetch_account_row_async(customer_id)
+
+    if not row or not row.get("email"):
+        raise Exception("User email not found")
+
+    return row["email"]
@@ -0,0 +1 @@
+# Offline tools: evaluation harnesses, benchmarks and index builds
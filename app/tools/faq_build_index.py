@@ -0,0 +1,210 @@
+"""
+Compile the FAQ index artifact loaded by workers with FAQ_INDEX_ARTIFACT.
+
+The source is the `faqs` table, or the SQL seed files with --sql: the
+INSERT INTO faqs statements of database_schema_updated.sql and the
+UPDATE faqs statements of update_faq_keywords.sql are applied in the
+order given (ids are assigned like the SERIAL column, from 1). Other
+statements are ignored.
+
+--check verifies an existing artifact (format version, checksum) and
+compares its content hash with a fresh compile of the source; the exit
+status is 1 if the artifact is unreadable or stale.
+
+Usage:
+    python -m app.tools.faq_build_index faq_index.bin
+    python -m app.tools.faq_build_index faq_index.bin --sql database_schema_updated.sql update_faq_keywords.sql
+    python -m app.tools.faq_build_index faq_index.bin --check
+"""
+import argparse
+import re
+import sys
+import time
+from typing import List
+
+from app.services.faq_artifact import FAQArtifact, FAQArtifactError, content_hash, write_faq_artifact
+from app.services.faq_index import FAQEntry, _fetch_rows
+
+TOKEN_RE = re.compile(r"""
+    (?P<space>\s+|--[^\n]*)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<number>-?\d+(?:\.\d+)?)
+  | (?P<word>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<punct>[(),;=\[\]*.])
+  | (?P<other>.)
+""", re.VERBOSE | re.DOTALL)
+
+LITERALS = {"TRUE": True, "FALSE": False, "NULL": None}
+FAQ_DEFAULTS = {"priority": 5, "is_active": True, "keywords": []}
+
+
+def _statements(sql: str) -> List[list]:
+    """SQL split into statements of (kind, value) tokens, comments dropped"""
+    statements, current = [], []
+    for match in TOKEN_RE.finditer(sql):
+        kind, text = match.lastgroup, match.group()
+        if kind == "space":
+            continue
+        if kind == "punct" and text == ";":
+            if current:
+                statements.append(current)
+            current = []
+            continue
+        if kind == "string":
+            text = text[1:-1].replace("''", "'")
+        elif kind == "word" and (text.upper() in LITERALS or text.upper() == "ARRAY"):
+            text = text.upper()
+        current.append((kind, text))
+    if current:
+        statements.append(current)
+    return statements
+
+
+class _Parser:
+    def __init__(self, tokens: list):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, expected: str = None) -> str:
+        kind, text = self.peek()
+        if kind is None or (expected is not None and text.upper() != expected.upper()):
+            raise ValueError(f"Expected {expected or 'a token'}, found {text!r}")
+        self.pos += 1
+        return text
+
+    def value(self):
+        kind, text = self.peek()
+        if kind == "string":
+            self.pos += 1
+            return text
+        if kind == "number":
+            self.pos += 1
+            return float(text) if "." in text else int(text)
+        if kind == "word" and text in LITERALS:
+            self.pos += 1
+            return LITERALS[text]
+        if kind == "word" and text == "ARRAY":
+            self.pos += 1
+            self.take("[")
+            items = []
+            while self.peek()[1] != "]":
+                items.append(self.value())
+                if self.peek()[1] == ",":
+                    self.pos += 1
+            self.take("]")
+            return items
+        raise ValueError(f"Unsupported SQL value {text!r}")
+
+    def names(self) -> List[str]:
+        self.take("(")
+        names = [self.take()]
+        while self.peek()[1] == ",":
+            self.pos += 1
+            names.append(self.take())
+        self.take(")")
+        return names
+
+
+def _insert(parser: _Parser, rows: List[dict]):
+    columns = parser.names()
+    parser.take("VALUES")
+    while True:
+        parser.take("(")
+        values = [parser.value()]
+        while parser.peek()[1] == ",":
+            parser.pos += 1
+            values.append(parser.value())
+        parser.take(")")
+        row = {**FAQ_DEFAULTS, **dict(zip(columns, values))}
+        row.setdefault("id", max((r["id"] for r in rows), default=0) + 1)
+        rows.append(row)
+        if parser.peek()[1] != ",":
+            return
+        parser.pos += 1
+
+
+def _update(parser: _Parser, rows: List[dict]):
+    parser.take("SET")
+    changes = {}
+    while True:
+        column = parser.take()
+        parser.take("=")
+        changes[column] = parser.value()
+        if parser.peek()[1] != ",":
+            break
+        parser.pos += 1
+    parser.take("WHERE")
+    column = parser.take()
+    parser.take("=")
+    match = parser.value()
+    if parser.peek()[0] is not None:
+        raise ValueError("Only single-column equality WHERE clauses are supported")
+    for row in rows:
+        if row.get(column) == match:
+            row.update(changes)
+
+
+def parse_faq_sql(paths: List[str]) -> List[dict]:
+    """faqs rows produced by the INSERT and UPDATE statements of the SQL files, in order"""
+    rows: List[dict] = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            statements = _statements(f.read())
+        for tokens in statements:
+            parser = _Parser(tokens)
+            words = [text.lower() for _, text in tokens[:3]]
+            try:
+                if words == ["insert", "into", "faqs"]:
+                    parser.pos = 3
+                    _insert(parser, rows)
+                elif words[:2] == ["update", "faqs"]:
+                    parser.pos = 2
+                    _update(parser, rows)
+            except ValueError as e:
+                raise ValueError(f"{path}: {e}") from e
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compile the FAQ index artifact")
+    parser.add_argument("output", help="artifact path")
+    parser.add_argument("--sql", nargs="+", metavar="FILE", help="compile from SQL seed files instead of the faqs table")
+    parser.add_argument("--check", action="store_true", help="verify the artifact against the source instead of writing it")
+    args = parser.parse_args(argv)
+
+    if args.sql:
+        rows, source = parse_faq_sql(args.sql), "sql:" + ",".join(args.sql)
+    else:
+        rows, source = _fetch_rows(), "table:faqs"
+
+    if args.check:
+        try:
+            artifact = FAQArtifact(args.output)
+        except FAQArtifactError as e:
+            print(e)
+            return 1
+        header = artifact.header
+        artifact.close()
+        expected = content_hash(FAQEntry(row) for row in rows if row.get("is_active", True))
+        stale = header["content_hash"] != expected
+        print(f"{args.output}: {header['faqs']} FAQs, built {header['built_at']} from {header['source']}, "
+              f"checksum ok, {'STALE against ' + source if stale else 'up to date'}")
+        return 1 if stale else 0
+
+    started = time.perf_counter()
+    header = write_faq_artifact(rows, args.output, source)
+    built_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    FAQArtifact(args.output).close()
+    load_ms = (time.perf_counter() - started) * 1000
+    print(f"{args.output}: {header['faqs']} FAQs, {header['keywords']} keywords from {source} "
+          f"(built in {built_ms:.1f} ms, verified load {load_ms:.2f} ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
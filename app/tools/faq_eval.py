@@ -0,0 +1,99 @@
+"""
+Offline FAQ retrieval evaluation.
+
+Scores a labeled corpus of questions against the FAQ set with BM25 (all
+questions in one sparse matrix product) and with the keyword scorer, and
+reports accuracy, no-answer rate and timing per ranking.
+
+Corpus records (one JSON object per line):
+    {"message": "how do i get my money back", "expected_question": "How do I request a refund?"}
+
+Records with "expected_question": null expect no answer (the message
+should fall through to the fallback reply). FAQs are read from the
+`faqs` table, or from a JSON list of rows with --faqs.
+
+Usage:
+    python -m app.tools.faq_eval corpus.jsonl
+    python -m app.tools.faq_eval corpus.jsonl --faqs faqs.json --min-score 2.5 --json report.json
+"""
+import argparse
+import json
+import sys
+import time
+
+from app.services.faq_index import FAQ_MIN_SCORE, FAQIndex, _fetch_rows
+from app.utils.tokenizer import tokenize
+
+
+def load_corpus(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _summarize(corpus: list, predicted: list, seconds: float) -> dict:
+    labeled = [(r, p) for r, p in zip(corpus, predicted) if "expected_question" in r]
+    correct = sum(1 for r, p in labeled if r["expected_question"] == p)
+    return {
+        "records": len(corpus),
+        "labeled": len(labeled),
+        "accuracy": round(correct / len(labeled), 4) if labeled else None,
+        "no_answer_rate": round(sum(1 for p in predicted if p is None) / len(predicted), 4) if predicted else None,
+        "total_ms": round(seconds * 1000, 2),
+        "per_query_us": round(seconds / len(corpus) * 1e6, 2) if corpus else None,
+        "misses": [
+            {"message": r["message"], "expected": r["expected_question"], "got": p}
+            for r, p in labeled if r["expected_question"] != p
+        ]
+    }
+
+
+def evaluate(index: FAQIndex, corpus: list, min_score: float) -> dict:
+    token_lists = [tokenize(record["message"]) for record in corpus]
+    ranker = index.ranker()
+
+    started = time.perf_counter()
+    matches = ranker.best_batch(token_lists, min_score)
+    bm25_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    keyword = [index.keyword_match(tokens) for tokens in token_lists]
+    keyword_seconds = time.perf_counter() - started
+
+    return {
+        "faqs": len(index),
+        "vocabulary": len(ranker.vocabulary),
+        "min_score": min_score,
+        "bm25": _summarize(corpus, [m[0].question if m else None for m in matches], bm25_seconds),
+        "keyword": _summarize(corpus, [m["question"] if m else None for m in keyword], keyword_seconds)
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline FAQ retrieval accuracy (BM25 vs keyword)")
+    parser.add_argument("corpus", help="JSONL corpus")
+    parser.add_argument("--faqs", help="JSON list of FAQ rows (default: the faqs table)")
+    parser.add_argument("--min-score", type=float, default=FAQ_MIN_SCORE, help="BM25 no-answer threshold")
+    parser.add_argument("--json", dest="json_path", help="also write the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.faqs:
+        with open(args.faqs, encoding="utf-8") as f:
+            rows = json.load(f)
+    else:
+        rows = _fetch_rows()
+    report = evaluate(FAQIndex.from_rows(rows), load_corpus(args.corpus), args.min_score)
+
+    print(f"{report['faqs']} FAQs, {report['vocabulary']} terms, min score {report['min_score']}")
+    for ranking in ("bm25", "keyword"):
+        r = report[ranking]
+        print(f"{ranking:>8}: accuracy {r['accuracy']}  no-answer {r['no_answer_rate']}  "
+              f"{r['total_ms']} ms total ({r['per_query_us']} us/query)")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
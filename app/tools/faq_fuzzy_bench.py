@@ -0,0 +1,119 @@
+"""
+Typo-correction latency and accuracy benchmark.
+
+Builds the trigram corrector over N synthetic keyword words, then
+corrects questions containing one misspelled keyword (a random
+insertion, deletion, substitution or transposition) and reports latency
+percentiles per question (correction cache cleared, so every lookup is
+cold) and how often the intended keyword was recovered. Exits 1 when
+p99 exceeds the 1 ms per-query budget (--max-p99-ms).
+
+Usage:
+    python -m app.tools.faq_fuzzy_bench
+    python -m app.tools.faq_fuzzy_bench --keywords 10000 --queries 5000 --max-p99-ms 0
+"""
+import argparse
+import json
+import random
+import string
+import sys
+import time
+
+from app.services.faq_fuzzy import TrigramCorrector
+from app.utils.tokenizer import tokenize
+
+SYLLABLES = [c + v for c in "bcdfghjklmnprstvwz" for v in "aeiou"] + ["tion", "ment", "ing", "er", "ly", "ous"]
+CONTEXT = ["how do i", "my", "cannot", "please help with", "where is the", "i want to"]
+
+
+def synthetic_keywords(count: int, rng: random.Random) -> dict:
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return {word: rng.randint(1, 5) for word in words}
+
+
+def misspell(word: str, rng: random.Random) -> str:
+    i = rng.randrange(len(word))
+    edit = rng.choice(("insert", "delete", "substitute", "transpose"))
+    if edit == "insert":
+        return word[:i] + rng.choice(string.ascii_lowercase) + word[i:]
+    if edit == "delete":
+        return word[:i] + word[i + 1:]
+    if edit == "substitute":
+        return word[:i] + rng.choice(string.ascii_lowercase.replace(word[i], "")) + word[i + 1:]
+    i = min(i, len(word) - 2)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run(keywords: int, queries: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    dictionary = synthetic_keywords(keywords, rng)
+
+    started = time.perf_counter()
+    corrector = TrigramCorrector(dictionary)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    words = sorted(dictionary)
+    latencies, recovered, changed = [], 0, 0
+    for _ in range(queries):
+        target = rng.choice(words)
+        typo = misspell(target, rng)
+        tokens = tokenize(f"{rng.choice(CONTEXT)} {typo}")
+        corrector._cache.clear()
+
+        started = time.perf_counter()
+        corrected = corrector.correct(tokens)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        if typo not in dictionary:
+            changed += 1
+            recovered += target in corrected
+
+    return {
+        "keywords": keywords,
+        "queries": queries,
+        "trigrams": len(corrector.postings),
+        "build_ms": round(build_ms, 1),
+        "p50_ms": round(percentile(latencies, 50), 4),
+        "p95_ms": round(percentile(latencies, 95), 4),
+        "p99_ms": round(percentile(latencies, 99), 4),
+        "max_ms": round(max(latencies), 4),
+        "recovered": round(recovered / changed, 4) if changed else None
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Trigram typo-correction latency at N keywords")
+    parser.add_argument("--keywords", default="1000,10000", help="comma-separated dictionary sizes")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--max-p99-ms", type=float, default=1.0, help="fail if p99 latency exceeds this (0 disables)")
+    parser.add_argument("--json", dest="json_path", help="also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'keywords':>9} {'build ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'recovered':>10}")
+    for keywords in (int(n) for n in args.keywords.split(",") if n.strip()):
+        result = run(keywords, args.queries, args.seed)
+        results.append(result)
+        print(f"{keywords:>9} {result['build_ms']:>9} {result['p50_ms']:>8} {result['p95_ms']:>8} "
+              f"{result['p99_ms']:>8} {result['recovered']:>10}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.max_p99_ms and any(r["p99_ms"] > args.max_p99_ms for r in results):
+        print(f"FAIL: p99 above {args.max_p99_ms} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
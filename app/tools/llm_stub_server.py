@@ -0,0 +1,131 @@
+"""
+Local OpenAI-compatible stand-in for the Groq chat completions API.
+
+Serves POST /openai/v1/chat/completions (the path the Groq SDK uses) and
+/v1/chat/completions, answering from a StubBackend, so the full /chat
+pipeline (real SDK, real HTTP, connection pooling) can be load-tested on a
+machine with no network:
+
+    python -m app.tools.llm_stub_server --port 8089 --latency-ms 300 --error-rate 0.05
+    LLM_BACKEND=groq LLM_BASE_URL=http://127.0.0.1:8089 GROQ_API_KEY=stub uvicorn app.main:app
+
+Injected errors are returned as HTTP 500 with an OpenAI-style error body.
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.services.llm_backend import LLMBackendError, StubBackend, estimate_tokens, load_script
+
+COMPLETION_PATHS = {"/openai/v1/chat/completions", "/v1/chat/completions"}
+
+
+def _handler_for(backend: StubBackend):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+        def _send_json(self, status: int, payload: dict):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length)
+            if self.path.rstrip("/") not in COMPLETION_PATHS:
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "not_found"}})
+                return
+
+            try:
+                request = json.loads(raw or b"{}")
+                messages = request["messages"]
+            except (ValueError, KeyError):
+                self._send_json(400, {"error": {"message": "Invalid request body", "type": "invalid_request_error"}})
+                return
+
+            model = request.get("model")
+            try:
+                text = backend.complete(
+                    messages,
+                    max_tokens=request.get("max_tokens") or 10,
+                    model=model,
+                    response_format=request.get("response_format")
+                )
+            except LLMBackendError as e:
+                self._send_json(500, {"error": {"message": str(e), "type": "server_error"}})
+                return
+
+            prompt_tokens = sum(estimate_tokens(m.get("content") or "") for m in messages)
+            completion_tokens = estimate_tokens(text)
+            self._send_json(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens
+                }
+            })
+
+        def log_message(self, format, *args):
+            pass  # one line per request would dominate a load test
+
+    return StubHandler
+
+
+def start_stub_server(backend: StubBackend = None, host: str = "127.0.0.1", port: int = 0):
+    """
+    Start the server on a background thread. Returns (server, base_url);
+    port 0 picks a free port. Stop it with server.shutdown().
+    """
+    server = ThreadingHTTPServer((host, port), _handler_for(backend or StubBackend()))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="llm-stub-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible LLM stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latency added to every completion")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="extra random latency, 0..jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 500")
+    parser.add_argument("--script", default=None, help="module:callable response script (default: keyword responder)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    backend = StubBackend(
+        latency_ms=args.latency_ms,
+        error_rate=args.error_rate,
+        script=load_script(args.script),
+        jitter_ms=args.jitter_ms,
+        seed=args.seed
+    )
+    server = ThreadingHTTPServer((args.host, args.port), _handler_for(backend))
+    server.daemon_threads = True
+    print(f"LLM stub server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Served {backend.usage['calls']} completions")
+
+
+if __name__ == "__main__":
+    main()
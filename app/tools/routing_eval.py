@@ -0,0 +1,271 @@
+"""
+Offline routing evaluation and latency harness.
+
+Replays a JSONL corpus through route_query, analyze_priority,
+classify_query and fallback_keyword_router with a deterministic LLM stub
+(no network), in parallel worker processes, and reports accuracy,
+confusion matrices, latency percentiles, LLM call counts and token
+estimates per mode.
+
+Corpus records (one JSON object per line):
+    {"message": "I cannot login", "expected_agent": "TECHNICAL_AGENT",
+     "expected_priority": "HIGH", "history": [{"role": "user", "content": "hi"}]}
+
+Only the message is required; records without labels are still timed and
+counted. Use --message-field to read another key (e.g. "body"). An
+"expected_source" (fast_path, cache, llm or fallback) asserts how route
+mode decided, e.g. that a message must not skip the LLM; any mismatch
+fails the run. app/tools/routing_eval_corpus.jsonl holds such cases.
+
+Usage:
+    python -m app.tools.routing_eval corpus.jsonl --workers 4
+    python -m app.tools.routing_eval app/tools/routing_eval_corpus.jsonl --modes route
+    python -m app.tools.routing_eval corpus.jsonl --llm-stub mypkg.stubs:scripted_responses --json report.json
+    python -m app.tools.routing_eval corpus.jsonl --min-accuracy 0.9 --max-p95-ms 50
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from multiprocessing import Pool
+from typing import Optional
+
+from app.services.llm_backend import StubBackend, load_script, set_backend
+
+MODES = ["route", "classify", "priority", "fallback"]
+AGENTS = ["FAQ_AGENT", "ACCOUNT_AGENT", "BILLING_AGENT", "TECHNICAL_AGENT"]
+PRIORITIES = ["HIGH", "LOW"]
+
+# Set per worker process by _init_worker
+_orchestrator = None
+_stub_backend = None
+
+
+def _init_worker(stub_spec: Optional[str], latency_ms: float, keep_cache: bool, verbose: bool = False):
+    """Import the orchestrator in this process and point every call site at the stub backend"""
+    global _orchestrator, _stub_backend
+    orchestrator = importlib.import_module("app.services.orchestrator")
+    if not verbose:
+        logging.getLogger("customer_support").setLevel(logging.WARNING)
+
+    _stub_backend = StubBackend(latency_ms=latency_ms, script=load_script(stub_spec))
+    set_backend(_stub_backend)
+    orchestrator.LLM_HEDGE_ENABLED = False
+    if not keep_cache:
+        orchestrator.DECISION_CACHE.max_size = 0
+    _orchestrator = orchestrator
+
+
+def _seed_session(customer_id: str, record: dict, message: str):
+    """Recreate the session the way /chat does: prior history, then the user message"""
+    session_store = importlib.import_module("app.services.session_store")
+    session_store.clear_session(customer_id)
+    for msg in record.get("history") or []:
+        session_store.append_message(customer_id, msg["role"], msg["content"])
+    session_store.append_message(customer_id, "user", message)
+
+
+def _evaluate_record(job: tuple) -> list:
+    index, record, message_field, modes = job
+    message = record.get(message_field) or ""
+    expected_agent = record.get("expected_agent") or record.get("agent")
+    expected_priority = record.get("expected_priority") or record.get("priority")
+    expected_source = record.get("expected_source")
+
+    results = []
+    for mode in modes:
+        customer_id = f"eval-{os.getpid()}-{index}-{mode}"
+        _seed_session(customer_id, record, message)
+
+        usage_before = Counter(_stub_backend.usage)
+        stats_before = dict(_orchestrator.ROUTING_STATS)
+        start = time.perf_counter()
+
+        if mode == "route":
+            predicted = _orchestrator.route_query(customer_id, message)
+            expected = expected_agent
+        elif mode == "classify":
+            predicted = _orchestrator.classify_query(customer_id, message)["agent"]
+            expected = expected_agent
+        elif mode == "priority":
+            predicted = _orchestrator.analyze_priority(customer_id, message)
+            expected = expected_priority
+        else:
+            predicted = _orchestrator.fallback_keyword_router(message)
+            expected = expected_agent
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        usage = Counter(_stub_backend.usage)
+        usage.subtract(usage_before)
+        source = next(
+            (k for k, v in _orchestrator.ROUTING_STATS.items() if v != stats_before.get(k)),
+            None
+        )
+
+        results.append({
+            "index": index,
+            "mode": mode,
+            "expected": expected.upper() if isinstance(expected, str) else None,
+            "predicted": predicted,
+            "latency_ms": latency_ms,
+            "llm_calls": usage["calls"],
+            "prompt_tokens": usage["prompt_tokens"],
+            "completion_tokens": usage["completion_tokens"],
+            "source": source,
+            "expected_source": expected_source if mode == "route" else None
+        })
+    return results
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(results: list) -> dict:
+    """Aggregate per-record results into a per-mode report"""
+    by_mode = defaultdict(list)
+    for result in results:
+        by_mode[result["mode"]].append(result)
+
+    report = {}
+    for mode, rows in by_mode.items():
+        labeled = [r for r in rows if r["expected"]]
+        correct = sum(1 for r in labeled if r["expected"] == r["predicted"])
+        confusion = defaultdict(Counter)
+        for r in labeled:
+            confusion[r["expected"]][r["predicted"]] += 1
+        latencies = [r["latency_ms"] for r in rows]
+        source_checked = [r for r in rows if r["expected_source"]]
+
+        report[mode] = {
+            "records": len(rows),
+            "labeled": len(labeled),
+            "accuracy": round(correct / len(labeled), 4) if labeled else None,
+            "confusion": {exp: dict(pred) for exp, pred in confusion.items()},
+            "predictions": dict(Counter(r["predicted"] for r in rows)),
+            "latency_ms": {
+                "p50": round(percentile(latencies, 50), 3),
+                "p95": round(percentile(latencies, 95), 3),
+                "p99": round(percentile(latencies, 99), 3),
+                "max": round(max(latencies), 3) if latencies else 0.0
+            },
+            "llm_calls": sum(r["llm_calls"] for r in rows),
+            "llm_calls_per_request": round(sum(r["llm_calls"] for r in rows) / len(rows), 3) if rows else 0.0,
+            "prompt_tokens": sum(r["prompt_tokens"] for r in rows),
+            "completion_tokens": sum(r["completion_tokens"] for r in rows),
+            "decision_sources": dict(Counter(r["source"] for r in rows if r["source"])),
+            "source_checked": len(source_checked),
+            "source_mismatches": [r["index"] for r in source_checked if r["source"] != r["expected_source"]]
+        }
+    return report
+
+
+def format_confusion(confusion: dict, labels: list) -> str:
+    width = max(len(label) for label in labels) + 2
+    lines = ["expected \\ predicted".ljust(width) + "".join(label[:width - 2].rjust(width) for label in labels)]
+    for expected in labels:
+        row = confusion.get(expected, {})
+        lines.append(expected.ljust(width) + "".join(str(row.get(p, 0)).rjust(width) for p in labels))
+    return "\n".join(lines)
+
+
+def print_report(report: dict):
+    for mode in MODES:
+        if mode not in report:
+            continue
+        r = report[mode]
+        accuracy = f"{r['accuracy']:.2%}" if r["accuracy"] is not None else "n/a (no labels)"
+        print(f"\n=== {mode} ===")
+        print(f"records: {r['records']}  labeled: {r['labeled']}  accuracy: {accuracy}")
+        print(f"latency ms: p50={r['latency_ms']['p50']}  p95={r['latency_ms']['p95']}  "
+              f"p99={r['latency_ms']['p99']}  max={r['latency_ms']['max']}")
+        print(f"llm calls: {r['llm_calls']} ({r['llm_calls_per_request']}/request)  "
+              f"tokens: prompt~{r['prompt_tokens']} completion~{r['completion_tokens']}")
+        if r["decision_sources"]:
+            print(f"decision sources: {r['decision_sources']}")
+        if r["source_checked"]:
+            print(f"decision source mismatches: {len(r['source_mismatches'])}/{r['source_checked']} "
+                  f"(records {r['source_mismatches']})")
+        if r["labeled"]:
+            labels = PRIORITIES if mode == "priority" else AGENTS
+            print(format_confusion(r["confusion"], labels))
+        else:
+            print(f"predictions: {r['predictions']}")
+
+
+def load_corpus(path: str) -> list:
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline routing accuracy and latency harness")
+    parser.add_argument("corpus", help="JSONL corpus")
+    parser.add_argument("--message-field", default="message", help="record key holding the user message")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"comma-separated subset of {MODES}")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--llm-stub", default=None, help="module:callable stub response script (default: keyword responder)")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0, help="simulated LLM latency per call")
+    parser.add_argument("--keep-cache", action="store_true", help="keep the routing decision cache enabled")
+    parser.add_argument("--verbose", action="store_true", help="keep per-request INFO logging")
+    parser.add_argument("--json", dest="json_path", help="also write the report as JSON")
+    parser.add_argument("--min-accuracy", type=float, help="fail if any labeled mode is below this accuracy")
+    parser.add_argument("--max-p95-ms", type=float, help="fail if any mode's p95 latency exceeds this")
+    args = parser.parse_args(argv)
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"unknown modes: {sorted(unknown)}")
+
+    records = load_corpus(args.corpus)
+    jobs = [(i, record, args.message_field, modes) for i, record in enumerate(records)]
+
+    started = time.perf_counter()
+    with Pool(
+        processes=max(1, args.workers),
+        initializer=_init_worker,
+        initargs=(args.llm_stub, args.stub_latency_ms, args.keep_cache, args.verbose)
+    ) as pool:
+        chunks = pool.map(_evaluate_record, jobs, chunksize=max(1, len(jobs) // (args.workers * 4) or 1))
+    elapsed = time.perf_counter() - started
+
+    results = [result for chunk in chunks for result in chunk]
+    report = summarize(results)
+
+    print(f"Evaluated {len(records)} records x {len(modes)} modes in {elapsed:.2f}s with {args.workers} workers")
+    print_report(report)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    failed = False
+    for mode, r in report.items():
+        if args.min_accuracy is not None and r["accuracy"] is not None and r["accuracy"] < args.min_accuracy:
+            print(f"FAIL: {mode} accuracy {r['accuracy']:.2%} < {args.min_accuracy:.2%}", file=sys.stderr)
+            failed = True
+        if args.max_p95_ms is not None and r["latency_ms"]["p95"] > args.max_p95_ms:
+            print(f"FAIL: {mode} p95 {r['latency_ms']['p95']}ms > {args.max_p95_ms}ms", file=sys.stderr)
+            failed = True
+        if r["source_mismatches"]:
+            print(f"FAIL: {mode} decided records {r['source_mismatches']} from an unexpected source", file=sys.stderr)
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Session store memory benchmark.
+
+Fills the in-memory session backend with N sessions of M messages each and
+reports bytes per session (measured with tracemalloc), next to the legacy
+layout it replaced (a list of {"role", "content", "timestamp": ISO str}
+dicts per customer plus separate turn-count and timestamp dicts).
+
+Message contents come from a small shared pool by default, so the numbers
+are per-session overhead; --unique-content allocates a fresh string per
+message to include content as well.
+
+Usage:
+    python -m app.tools.session_memory_bench
+    python -m app.tools.session_memory_bench --sessions 10000,100000 --messages 10 --json mem.json
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from app.services.session_backend import MemorySessionBackend
+
+SAMPLE_MESSAGES = [
+    "Hi, I cannot login to my account since this morning",
+    "Sorry to hear that! Can you tell me which error you see?",
+    "It says invalid credentials but my password is correct",
+    "Please try resetting your password from the login page.",
+    "Show me my billing history for the last three months",
+    "Here are your recent orders: #1042, #1057 and #1063.",
+]
+
+
+def _content(i: int, j: int, unique: bool) -> str:
+    text = SAMPLE_MESSAGES[(i + j) % len(SAMPLE_MESSAGES)]
+    return f"{text} ({i}.{j})" if unique else text
+
+
+def fill_backend(sessions: int, messages: int, max_history: int, unique: bool):
+    backend = MemorySessionBackend(max_history, ttl_seconds=86400)
+    now = time.time()
+    for i in range(sessions):
+        customer_id = f"customer-{i:08d}"
+        for j in range(messages):
+            backend._append(customer_id, "user" if j % 2 == 0 else "assistant", _content(i, j, unique), now)
+    return backend
+
+
+def fill_legacy(sessions: int, messages: int, max_history: int, unique: bool):
+    """The pre-compact layout: dict records with ISO timestamps and three dicts"""
+    memory, turns, timestamps = {}, {}, {}
+    now = datetime.now()
+    for i in range(sessions):
+        customer_id = f"customer-{i:08d}"
+        history = memory.setdefault(customer_id, [])
+        for j in range(messages):
+            role = "user" if j % 2 == 0 else "assistant"
+            history.append({"role": role, "content": _content(i, j, unique), "timestamp": now.isoformat()})
+            del history[:-max_history]
+            if role == "user":
+                turns[customer_id] = turns.get(customer_id, 0) + 1
+            timestamps[customer_id] = now
+    return memory, turns, timestamps
+
+
+def measure(fill, sessions: int, messages: int, max_history: int, unique: bool) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    store = fill(sessions, messages, max_history, unique)
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del store
+    gc.collect()
+    return {
+        "bytes_total": current,
+        "bytes_per_session": round(current / sessions, 1),
+        "peak_bytes": peak,
+        "fill_seconds": round(elapsed, 3)
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Bytes per session of the in-memory session store")
+    parser.add_argument("--sessions", default="10000,100000,1000000", help="comma-separated session counts")
+    parser.add_argument("--messages", type=int, default=6, help="messages appended per session")
+    parser.add_argument("--max-history", type=int, default=10)
+    parser.add_argument("--unique-content", action="store_true", help="count message content too")
+    parser.add_argument("--skip-legacy", action="store_true", help="only measure the current layout")
+    parser.add_argument("--json", dest="json_path", help="also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'sessions':>10} {'layout':>8} {'bytes/session':>14} {'total MiB':>10} {'fill s':>8}")
+    for sessions in (int(n) for n in args.sessions.split(",") if n.strip()):
+        layouts = [("compact", fill_backend)] + ([] if args.skip_legacy else [("legacy", fill_legacy)])
+        for layout, fill in layouts:
+            result = measure(fill, sessions, args.messages, args.max_history, args.unique_content)
+            result.update(sessions=sessions, layout=layout)
+            results.append(result)
+            print(f"{sessions:>10} {layout:>8} {result['bytes_per_session']:>14} "
+                  f"{result['bytes_total'] / 2 ** 20:>10.1f} {result['fill_seconds']:>8}")
+            sys.stdout.flush()
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency while its breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Rolling-window circuit breaker.
+
+    Trips OPEN when, over the last `window_seconds` (and at least `min_calls`
+    calls), either the error rate or the slow-call rate reaches its threshold.
+    While OPEN every call fails fast with CircuitOpenError. After
+    `open_seconds` it goes HALF_OPEN and lets `half_open_max_calls` probes
+    through: a successful probe closes it, a failed one re-opens it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float = 60,
+        min_calls: int = 10,
+        error_rate_threshold: float = 0.5,
+        slow_call_seconds: float = 5.0,
+        slow_rate_threshold: float = 0.8,
+        open_seconds: float = 30,
+        half_open_max_calls: int = 1,
+        latency_samples: int = 200
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.error_rate_threshold = error_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate_threshold = slow_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        # (timestamp, ok, slow) for calls inside the rolling window
+        self._calls: deque = deque()
+        # recent successful call latencies, for percentile estimates
+        self._latencies: deque = deque(maxlen=latency_samples)
+
+        self.times_opened = 0
+        self.rejected_calls = 0
+
+    # ---------- state ----------
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return self._state
+
+    def _maybe_half_open(self, now: float):
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._half_open_in_flight = 0
+
+    def _trim(self, now: float):
+        cutoff = now - self.window_seconds
+        while self._calls and self._calls[0][0] < cutoff:
+            self._calls.popleft()
+
+    def _open(self, now: float):
+        self._state = OPEN
+        self._opened_at = now
+        self.times_opened += 1
+
+    # ---------- call protocol ----------
+    def before_call(self):
+        """Raise CircuitOpenError if the call must not be attempted"""
+        with self._lock:
+            now = time.monotonic()
+            self._maybe_half_open(now)
+
+            if self._state == OPEN:
+                self.rejected_calls += 1
+                raise CircuitOpenError(f"{self.name} circuit is open")
+
+            if self._state == HALF_OPEN:
+                if self._half_open_in_flight >= self.half_open_max_calls:
+                    self.rejected_calls += 1
+                    raise CircuitOpenError(f"{self.name} circuit is half-open, probe in flight")
+                self._half_open_in_flight += 1
+
+    def release(self):
+        """Give back the slot taken by before_call for a call that ended without an outcome (cancelled)"""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+
+    def record_success(self, latency: float):
+        self._record(ok=True, latency=latency)
+
+    def record_failure(self, latency: float):
+        self._record(ok=False, latency=latency)
+
+    def _record(self, ok: bool, latency: float):
+        with self._lock:
+            now = time.monotonic()
+            slow = latency >= self.slow_call_seconds
+            if ok:
+                self._latencies.append(latency)
+
+            if self._state == HALF_OPEN:
+                self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+                if ok and not slow:
+                    self._state = CLOSED
+                    self._calls.clear()
+                else:
+                    self._open(now)
+                return
+
+            self._calls.append((now, ok, slow))
+            self._trim(now)
+
+            if self._state == CLOSED and len(self._calls) >= self.min_calls:
+                total = len(self._calls)
+                errors = sum(1 for _, call_ok, _ in self._calls if not call_ok)
+                slow_calls = sum(1 for _, _, call_slow in self._calls if call_slow)
+                if errors / total >= self.error_rate_threshold or slow_calls / total >= self.slow_rate_threshold:
+                    self._open(now)
+
+    # ---------- metrics ----------
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """Latency (seconds) at the given percentile of recent successful calls"""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(percentile / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def snapshot(self) -> dict:
+        """Breaker state and rolling-window statistics (useful for monitoring)"""
+        state = self.state
+        with self._lock:
+            self._trim(time.monotonic())
+            total = len(self._calls)
+            errors = sum(1 for _, ok, _ in self._calls if not ok)
+            slow_calls = sum(1 for _, _, slow in self._calls if slow)
+        p50 = self.latency_percentile(50)
+        p95 = self.latency_percentile(95)
+        return {
+            "name": self.name,
+            "state": state,
+            "window_calls": total,
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "slow_call_rate": round(slow_calls / total, 4) if total else 0.0,
+            "latency_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "times_opened": self.times_opened,
+            "rejected_calls": self.rejected_calls
+        }
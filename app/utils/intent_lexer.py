@@ -0,0 +1,253 @@
+"""
+Single-pass intent lexer shared by the router, the graph and every agent.
+
+All keyword lists live here. They are compiled once at import time into a
+single regex that is scanned over the lowercased message exactly once per
+request; consumers then read the resulting IntentFeatures instead of
+re-running `any(kw in message_lower ...)` loops.
+"""
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Set
+
+PHONE_REGEX = r"\+?\d{8,15}"
+DOB_REGEX = r"\b\d{4}-\d{2}-\d{2}\b"  # YYYY-MM-DD
+
+# ---------- Keyword groups ----------
+INTENT_KEYWORDS: Dict[str, List[str]] = {
+    # Orchestrator: priority fallback
+    "high_priority": [
+        "cannot", "can't", "failed", "error", "broken", "crash",
+        "lost", "hacked", "unauthorized", "payment failed", "data loss"
+    ],
+    # Orchestrator: fallback router
+    "route_billing_action": [
+        "cancel subscription", "want to cancel", "need refund", "dispute",
+        "cancel my", "i want to cancel", "i need a refund", "i want to dispute"
+    ],
+    "route_technical": [
+        "cannot", "can't", "not working", "broken", "error", "failed",
+        "crash", "bug", "is slow", "is hanging", "lost", "corrupted",
+        "not loading", "freezing", "timeout"
+    ],
+    "update_verb": ["update", "change", "modify", "new", "set"],
+    "billing_keyword": ["billing", "invoice", "receipt", "order", "payment", "subscription", "plan"],
+    "viewing_verb": ["show", "view", "see", "tell", "want", "email", "list", "what", "when"],
+    # Orchestrator: local fast-path router (instructional phrasing lowers confidence)
+    "how_to": [
+        "how do i", "how can i", "how to", "how does", "how do you",
+        "what should i do", "where can i", "where is"
+    ],
+    # Graph: immediate escalation
+    "critical_security": [
+        "hacked", "breach", "unauthorized access", "security breach",
+        "data breach", "compromised", "stolen", "fraud"
+    ],
+    # FAQ agent
+    "greeting": [
+        "hi", "hello", "hey", "hii", "hiii", "hi there", "hello there",
+        "good morning", "good afternoon", "good evening", "greetings",
+        "what's up", "whats up", "sup", "yo"
+    ],
+    "personal_statement": ["my name is", "i am", "i'm", "call me", "this is"],
+    "request_word": ["want", "need", "help", "can you", "please"],
+    "question_mark": ["?"],
+    # Technical agent
+    "failure": [
+        "cannot", "can't", "cant", "unable", "not able", "cant able",
+        "failed", "failing", "error", "issue", "problem", "broken",
+        "not working", "does not work", "is not working"
+    ],
+    "billing_action": [
+        "cancel", "cancellation", "cancel my", "want to cancel", "need to cancel",
+        "refund", "i want a refund", "need a refund", "dispute", "dispute this",
+        "stop subscription", "end subscription", "terminate subscription"
+    ],
+    # Orchestrator: what a billing action acts on (not "cancel my order")
+    "billing_object": [
+        "subscription", "subscriptions", "plan", "plans", "membership", "refund", "refunds"
+    ],
+    "cancel": ["cancel"],
+    "subscription": ["subscription"],
+    "refund": ["refund"],
+    # Account agent
+    "forbidden_account_field": ["email", "name", "status", "username"],
+    "dob_mention": ["dob", "date of birth"],
+    # Orchestrator: a YYYY-MM-DD date is only a DOB next to one of these
+    "dob_cue": ["dob", "birth", "born", "birthday"],
+    "phone_mention": ["phone"],
+}
+
+# Groups matched as whole words only ("born" must not match "reborn", "plan" not "explain").
+# update_verb keeps substring matching for the hard override and keyword
+# fallback ("updated", "changed"); the fast path checks it with has_word().
+WHOLE_WORD_GROUPS = {"dob_cue", "billing_object"}
+
+# Technical agent issue classification (checked in this order)
+ISSUE_TYPE_KEYWORDS: Dict[str, List[str]] = {
+    "login_error": ["login", "sign in", "password", "credentials"],
+    "upload_error": ["upload", "file", "attachment"],
+    "performance": ["slow", "lag", "performance", "freeze"],
+    "api_error": ["api", "timeout", "request", "endpoint"],
+    "sync_error": ["sync", "synchronization"],
+    "display_error": ["ui", "display", "screen", "layout"],
+    "notification_error": ["notification", "email", "alert"],
+    "integration_error": ["integration", "slack", "webhook"],
+    "storage_error": ["storage", "file access", "disk"],
+    "search_error": ["search", "find", "results"],
+    "billing_action": ["cancel", "cancellation", "refund", "dispute", "subscription"]
+}
+
+ISSUE_GROUP_PREFIX = "issue:"
+
+
+def _trie_pattern(keywords) -> str:
+    """
+    Regex for a set of literals, factored by shared prefix (a trie), so the
+    regex engine walks one branch per character instead of trying every
+    alternative. Optional suffix groups are greedy: the longest keyword wins.
+    """
+    trie: dict = {}
+    for kw in keywords:
+        node = trie
+        for ch in kw:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node) -> str:
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return emit(trie)
+
+
+def _build_lexer():
+    """
+    Compile every keyword into one trie-shaped regex wrapped in a lookahead,
+    so a single finditer pass reports a match at every start position.
+
+    The regex returns only the longest keyword starting at each position;
+    every shorter keyword starting there is necessarily a prefix of it, so we
+    precompute that prefix closure to recover all (overlapping) matches.
+    """
+    pattern_groups: Dict[str, Set[str]] = {}
+    for group, keywords in INTENT_KEYWORDS.items():
+        for kw in keywords:
+            pattern_groups.setdefault(kw, set()).add(group)
+    for issue_type, keywords in ISSUE_TYPE_KEYWORDS.items():
+        for kw in keywords:
+            pattern_groups.setdefault(kw, set()).add(ISSUE_GROUP_PREFIX + issue_type)
+
+    regex = re.compile("(?=(" + _trie_pattern(pattern_groups) + "))")
+
+    # longest match -> [(keyword, groups), ...] for every keyword that is a prefix of it
+    prefix_closure = {
+        p: [(q, tuple(pattern_groups[q])) for q in pattern_groups if p.startswith(q)]
+        for p in pattern_groups
+    }
+    return regex, prefix_closure
+
+
+_LEXER_REGEX, _PREFIX_CLOSURE = _build_lexer()
+_PHONE_RE = re.compile(PHONE_REGEX)
+_DOB_RE = re.compile(DOB_REGEX)
+
+
+def _is_whole_word(text: str, start: int, end: int) -> bool:
+    return (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
+
+
+@lru_cache(maxsize=None)
+def _word_regex(keyword: str):
+    return re.compile(r"(?<![^\W_])" + re.escape(keyword) + r"(?![^\W_])")
+
+
+class IntentFeatures:
+    """Keyword/regex features of one message, extracted in a single pass"""
+
+    __slots__ = ("text", "groups", "leading", "phone", "dob")
+
+    def __init__(self, text: str, groups: Dict[str, Set[str]], leading: Set[str],
+                 phone: Optional[str], dob: Optional[str]):
+        self.text = text          # lowercased, stripped message
+        self.groups = groups      # group -> matched keywords
+        self.leading = leading    # keywords matched at position 0 as a whole word
+        self.phone = phone        # first phone-number-like match, if any
+        self.dob = dob            # first YYYY-MM-DD match, if any
+
+    def has(self, group: str) -> bool:
+        return group in self.groups
+
+    def has_any(self, *groups: str) -> bool:
+        return any(group in self.groups for group in groups)
+
+    def matched(self, group: str) -> Set[str]:
+        return self.groups.get(group, set())
+
+    def starts_with(self, group: str) -> bool:
+        """True if the message is, or begins with, a whole keyword from the group"""
+        return any(kw in self.leading for kw in self.matched(group))
+
+    def has_word(self, group: str) -> bool:
+        """True if a keyword from the group occurs as a whole word (has() also counts substrings)"""
+        return any(_word_regex(kw).search(self.text) for kw in self.matched(group))
+
+    def only(self, *groups: str) -> bool:
+        """True if the message is nothing but whole keywords from the groups (and punctuation)"""
+        keywords = set().union(*(self.matched(group) for group in groups))
+        if not keywords:
+            return False
+        rest = self.text
+        for kw in sorted(keywords, key=len, reverse=True):
+            rest = _word_regex(kw).sub(" ", rest)
+        return not any(ch.isalnum() for ch in rest)
+
+    def issue_type(self) -> Optional[str]:
+        """First ISSUE_TYPE_KEYWORDS entry (in declaration order) that matched"""
+        for issue_type in ISSUE_TYPE_KEYWORDS:
+            if ISSUE_GROUP_PREFIX + issue_type in self.groups:
+                return issue_type
+        return None
+
+    def __repr__(self) -> str:
+        return f"IntentFeatures(groups={sorted(self.groups)}, phone={self.phone!r}, dob={self.dob!r})"
+
+
+def extract_intents(message: str) -> IntentFeatures:
+    """Scan the message once and return every intent feature"""
+    text = message.lower().strip()
+    groups: Dict[str, Set[str]] = {}
+    leading: Set[str] = set()
+
+    for match in _LEXER_REGEX.finditer(text):
+        start = match.start()
+        for kw, kw_groups in _PREFIX_CLOSURE[match.group(1)]:
+            for group in kw_groups:
+                if group in WHOLE_WORD_GROUPS and not _is_whole_word(text, start, start + len(kw)):
+                    continue
+                if group in groups:
+                    groups[group].add(kw)
+                else:
+                    groups[group] = {kw}
+
+    # Whole-word keywords at the very start (greetings etc.)
+    first = _LEXER_REGEX.match(text)
+    if first:
+        for kw, _ in _PREFIX_CLOSURE[first.group(1)]:
+            end = len(kw)
+            if end == len(text) or text[end] == " ":
+                leading.add(kw)
+
+    phone = _PHONE_RE.search(message)
+    dob = _DOB_RE.search(message)
+
+    return IntentFeatures(
+        text=text,
+        groups=groups,
+        leading=leading,
+        phone=phone.group(0) if phone else None,
+        dob=dob.group(0) if dob else None
+    )
@@ -1,70 +1,336 @@
-from collections import defaultdict
-from datetime import datetime, timedelta
-from typing import Dict
+"""
+Sliding-window-counter rate limiter.
+
+Each key keeps only (window index, count in the current window, count in
+the previous window). The request rate is estimated as
+
+    previous * (1 - elapsed fraction of current window) + current
+
+which smooths the burst at window edges of a fixed window while using
+constant memory per key. A background sweeper drops idle keys.
+
+Configuration (environment):
+    RATE_LIMITS                JSON {route: {tier: [max_requests, window_seconds]}};
+                               merged over DEFAULT_LIMITS
+    RATE_LIMIT_CUSTOMER_TIERS  "customer_id:tier,..." tier overrides
+    RATE_LIMIT_BACKEND         memory | sqlite (shared between workers)
+    RATE_LIMIT_DB_PATH         SQLite file for the shared store (rate_limits.db)
+    RATE_LIMIT_SWEEP_SECONDS   sweeper period (60)
+"""
+import asyncio
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
 from app.utils.logger import logger
 
-# Rate limiting configuration
-RATE_LIMIT_WINDOW = timedelta(minutes=1)  # 1 minute window
+# Rate limiting configuration: route -> tier -> (max requests, window seconds)
 MAX_REQUESTS_PER_WINDOW = 30  # Max 30 requests per minute per customer
+DEFAULT_LIMITS: Dict[str, Dict[str, Tuple[int, float]]] = {
+    "chat": {"default": (MAX_REQUESTS_PER_WINDOW, 60), "premium": (120, 60)},
+    "verify": {"default": (10, 60)},
+}
+DEFAULT_TIER = "default"
+
+
+def _load_limits() -> Dict[str, Dict[str, Tuple[int, float]]]:
+    limits = {route: dict(tiers) for route, tiers in DEFAULT_LIMITS.items()}
+    raw = os.getenv("RATE_LIMITS")
+    if raw:
+        try:
+            for route, tiers in json.loads(raw).items():
+                for tier, (max_requests, window) in tiers.items():
+                    limits.setdefault(route, {})[tier] = (int(max_requests), float(window))
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.error(f"Invalid RATE_LIMITS, using defaults: {e}")
+    # get_limit falls back to the default tier: every route needs one
+    for route, tiers in limits.items():
+        if DEFAULT_TIER not in tiers:
+            fallback = DEFAULT_LIMITS.get(route, DEFAULT_LIMITS["chat"])[DEFAULT_TIER]
+            logger.error(f"RATE_LIMITS route {route!r} has no {DEFAULT_TIER!r} tier, using {fallback}")
+            tiers[DEFAULT_TIER] = fallback
+    return limits
+
+
+def _load_customer_tiers() -> Dict[str, str]:
+    tiers = {}
+    for item in os.getenv("RATE_LIMIT_CUSTOMER_TIERS", "").split(","):
+        customer_id, _, tier = item.strip().partition(":")
+        if customer_id and tier:
+            tiers[customer_id] = tier
+    return tiers
+
+
+RATE_LIMITS = _load_limits()
+CUSTOMER_TIERS = _load_customer_tiers()
+
+
+def get_limit(route: str, tier: str = DEFAULT_TIER) -> Tuple[int, float]:
+    """(max requests, window seconds) for a route and tier, falling back to the default tier"""
+    tiers = RATE_LIMITS.get(route) or RATE_LIMITS["chat"]
+    return tiers.get(tier) or tiers[DEFAULT_TIER]
+
+
+def _roll(entry, index: int):
+    """Advance (window index, current, previous) to the given window"""
+    window_index, current, previous = entry
+    if window_index == index:
+        return entry
+    if window_index == index - 1:
+        return index, 0, current
+    return index, 0, 0
+
+
+def _estimate(current: int, previous: int, elapsed_fraction: float) -> float:
+    return previous * (1 - elapsed_fraction) + current
 
-# Track requests: customer_id -> list of request timestamps
-REQUEST_TRACKER: Dict[str, list] = defaultdict(list)
 
+class MemoryRateLimitStore:
+    """Per-process counters: key -> (window index, current count, previous count)"""
 
-def check_rate_limit(customer_id: str) -> tuple[bool, str]:
+    name = "memory"
+    blocking = False
+
+    def __init__(self):
+        self.counters: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, max_requests: int, window: float, now: float) -> Tuple[bool, float]:
+        """Count a request if under the limit. Returns (allowed, estimated count including it)"""
+        index, elapsed = divmod(now / window, 1)
+        index = int(index)
+        with self._lock:
+            window_index, current, previous = _roll(self.counters.get(key, (index, 0, 0)), index)
+            estimated = _estimate(current, previous, elapsed)
+            allowed = estimated < max_requests
+            if allowed:
+                current += 1
+                estimated += 1
+            self.counters[key] = (window_index, current, previous)
+        return allowed, estimated
+
+    def peek(self, key: str, window: float, now: float) -> float:
+        index, elapsed = divmod(now / window, 1)
+        entry = self.counters.get(key)
+        if entry is None:
+            return 0.0
+        _, current, previous = _roll(entry, int(index))
+        return _estimate(current, previous, elapsed)
+
+    def sweep(self, now: float) -> int:
+        """Drop keys idle for two full windows (their estimate is 0)"""
+        removed = 0
+        with self._lock:
+            for key, (window_index, _, _) in list(self.counters.items()):
+                window = get_limit(*_split_key(key))[1]
+                if window_index < int(now // window) - 1:
+                    del self.counters[key]
+                    removed += 1
+        return removed
+
+    def __len__(self) -> int:
+        return len(self.counters)
+
+
+class SQLiteRateLimitStore:
+    """
+    Counters in a SQLite WAL database shared by every worker process on the
+    host; read-modify-write runs in one IMMEDIATE transaction.
     """
-    Check if customer has exceeded rate limit.
+
+    name = "sqlite"
+    # busy_timeout waits up to 5 s for another worker's write; async callers use a thread
+    blocking = True
+
+    def __init__(self, path: str = "rate_limits.db"):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            " key TEXT PRIMARY KEY,"
+            " window_index INTEGER NOT NULL,"
+            " current INTEGER NOT NULL,"
+            " previous INTEGER NOT NULL,"
+            " window REAL NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def hit(self, key: str, max_requests: int, window: float, now: float) -> Tuple[bool, float]:
+        index, elapsed = divmod(now / window, 1)
+        index = int(index)
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT window_index, current, previous FROM rate_limits WHERE key = ?", (key,)
+            ).fetchone()
+            window_index, current, previous = _roll(row or (index, 0, 0), index)
+            estimated = _estimate(current, previous, elapsed)
+            allowed = estimated < max_requests
+            if allowed:
+                current += 1
+                estimated += 1
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limits (key, window_index, current, previous, window) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, window_index, current, previous, window)
+            )
+        return allowed, estimated
+
+    def peek(self, key: str, window: float, now: float) -> float:
+        index, elapsed = divmod(now / window, 1)
+        row = self._conn().execute(
+            "SELECT window_index, current, previous FROM rate_limits WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return 0.0
+        _, current, previous = _roll(row, int(index))
+        return _estimate(current, previous, elapsed)
+
+    def sweep(self, now: float) -> int:
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            return conn.execute(
+                "DELETE FROM rate_limits WHERE window_index < CAST(? / window AS INTEGER) - 1", (now,)
+            ).rowcount
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM rate_limits").fetchone()[0]
+
+
+def _create_store():
+    if os.getenv("RATE_LIMIT_BACKEND", "memory").lower() == "sqlite":
+        return SQLiteRateLimitStore(os.getenv("RATE_LIMIT_DB_PATH", "rate_limits.db"))
+    return MemoryRateLimitStore()
+
+
+RATE_LIMIT_STORE = _create_store()
+SWEEP_INTERVAL = float(os.getenv("RATE_LIMIT_SWEEP_SECONDS", "60"))
+_sweeper: Optional[threading.Thread] = None
+_sweeper_stop = threading.Event()
+
+
+def _key(customer_id: str, route: str, tier: str) -> str:
+    return f"{route}\x1f{tier}\x1f{customer_id}"
+
+
+def _split_key(key: str) -> Tuple[str, str]:
+    route, tier, _ = key.split("\x1f", 2)
+    return route, tier
+
+
+def get_customer_tier(customer_id: str) -> str:
+    return CUSTOMER_TIERS.get(customer_id, DEFAULT_TIER)
+
+
+def check_rate_limit(customer_id: str, route: str = "chat") -> tuple[bool, str]:
+    """
+    Check if customer has exceeded rate limit (and count the request if not).
     Returns (is_allowed, message)
     """
-    now = datetime.now()
-    
-    # Get customer's request history
-    requests = REQUEST_TRACKER.get(customer_id, [])
-    
-    # Remove requests outside the time window
-    cutoff_time = now - RATE_LIMIT_WINDOW
-    recent_requests = [req_time for req_time in requests if req_time > cutoff_time]
-    
-    # Update tracker
-    REQUEST_TRACKER[customer_id] = recent_requests
-    
-    # Check if limit exceeded
-    if len(recent_requests) >= MAX_REQUESTS_PER_WINDOW:
-        logger.warning(f"Rate limit exceeded for customer {customer_id}: {len(recent_requests)} requests")
-        return False, f"Rate limit exceeded. Maximum {MAX_REQUESTS_PER_WINDOW} requests per minute."
-    
-    # Record this request
-    recent_requests.append(now)
-    REQUEST_TRACKER[customer_id] = recent_requests
-    
+    tier = get_customer_tier(customer_id)
+    max_requests, window = get_limit(route, tier)
+    allowed, estimated = RATE_LIMIT_STORE.hit(_key(customer_id, route, tier), max_requests, window, time.time())
+
+    if not allowed:
+        logger.warning(f"Rate limit exceeded for customer {customer_id} on {route}: ~{estimated:.1f} requests")
+        return False, f"Rate limit exceeded. Maximum {max_requests} requests per {window:g} seconds."
     return True, ""
 
 
-def get_rate_limit_status(customer_id: str) -> dict:
+async def check_rate_limit_async(customer_id: str, route: str = "chat") -> tuple[bool, str]:
+    """Async variant of check_rate_limit (off the event loop for the shared store)"""
+    if RATE_LIMIT_STORE.blocking:
+        return await asyncio.to_thread(check_rate_limit, customer_id, route)
+    return check_rate_limit(customer_id, route)
+
+
+def get_rate_limit_status(customer_id: str, route: str = "chat") -> dict:
     """Get current rate limit status for a customer"""
-    now = datetime.now()
-    requests = REQUEST_TRACKER.get(customer_id, [])
-    cutoff_time = now - RATE_LIMIT_WINDOW
-    recent_requests = [req_time for req_time in requests if req_time > cutoff_time]
-    
+    tier = get_customer_tier(customer_id)
+    max_requests, window = get_limit(route, tier)
+    now = time.time()
+    estimated = RATE_LIMIT_STORE.peek(_key(customer_id, route, tier), window, now)
+
     return {
-        "requests_in_window": len(recent_requests),
-        "max_requests": MAX_REQUESTS_PER_WINDOW,
-        "window_minutes": RATE_LIMIT_WINDOW.total_seconds() / 60,
-        "remaining_requests": max(0, MAX_REQUESTS_PER_WINDOW - len(recent_requests))
+        "route": route,
+        "tier": tier,
+        "requests_in_window": math.ceil(estimated),
+        "max_requests": max_requests,
+        "window_minutes": window / 60,
+        "remaining_requests": max(0, math.floor(max_requests - estimated)),
+        "reset_seconds": math.ceil(window - now % window)
     }
 
 
-def cleanup_old_entries():
-    """Clean up old entries from tracker (called periodically)"""
-    now = datetime.now()
-    cutoff_time = now - RATE_LIMIT_WINDOW
-    
-    for customer_id in list(REQUEST_TRACKER.keys()):
-        requests = REQUEST_TRACKER[customer_id]
-        recent_requests = [req_time for req_time in requests if req_time > cutoff_time]
-        
-        if recent_requests:
-            REQUEST_TRACKER[customer_id] = recent_requests
-        else:
-            del REQUEST_TRACKER[customer_id]
+def rate_limit_headers(customer_id: str, route: str = "chat") -> Dict[str, str]:
+    """get_rate_limit_status as X-RateLimit-* response headers"""
+    status = get_rate_limit_status(customer_id, route)
+    headers = {
+        "X-RateLimit-Limit": str(status["max_requests"]),
+        "X-RateLimit-Remaining": str(status["remaining_requests"]),
+        "X-RateLimit-Reset": str(status["reset_seconds"]),
+    }
+    if status["remaining_requests"] == 0:
+        headers["Retry-After"] = str(status["reset_seconds"])
+    return headers
+
+
+async def rate_limit_headers_async(customer_id: str, route: str = "chat") -> Dict[str, str]:
+    """Async variant of rate_limit_headers"""
+    if RATE_LIMIT_STORE.blocking:
+        return await asyncio.to_thread(rate_limit_headers, customer_id, route)
+    return rate_limit_headers(customer_id, route)
+
+
+def cleanup_old_entries() -> int:
+    """Drop counters that no longer affect any limit (called by the sweeper)"""
+    removed = RATE_LIMIT_STORE.sweep(time.time())
+    if removed:
+        logger.debug(f"Rate limiter swept {removed} idle keys")
+    return removed
+
+
+def _sweep_loop():
+    while not _sweeper_stop.wait(SWEEP_INTERVAL):
+        try:
+            cleanup_old_entries()
+        except Exception as e:
+            logger.error(f"Rate limiter sweep failed: {e}")
+
+
+def start_rate_limit_sweeper():
+    """Start the background sweeper thread (idempotent)"""
+    global _sweeper
+    if _sweeper and _sweeper.is_alive():
+        return
+    _sweeper_stop.clear()
+    _sweeper = threading.Thread(target=_sweep_loop, name="rate-limit-sweeper", daemon=True)
+    _sweeper.start()
+
+
+def stop_rate_limit_sweeper():
+    _sweeper_stop.set()
+
+
+def get_rate_limiter_stats() -> dict:
+    return {
+        "backend": RATE_LIMIT_STORE.name,
+        "tracked_keys": len(RATE_LIMIT_STORE),
+        "limits": {route: {tier: list(limit) for tier, limit in tiers.items()} for route, tiers in RATE_LIMITS.items()},
+        "sweep_interval_seconds": SWEEP_INTERVAL
+    }
@@ -0,0 +1,32 @@
+"""
+Per-process spool directories for the write-behind queues.
+
+A spool that one process numbers, appends to and deletes cannot be
+shared with other workers. `base` holds `slots` directories, worker-0
+... worker-<n-1>; a process takes the first one it can lock with an
+exclusive flock and keeps the lock until it exits. Slots are fixed
+rather than per pid, so a restarted worker picks up the spool a dead
+one left behind.
+"""
+import fcntl
+import os
+from typing import Optional, Tuple
+
+
+def claim_spool_slot(base: str, slots: int) -> Optional[Tuple[int, str, object]]:
+    """
+    (slot, directory, lock file) of the first slot this process can lock,
+    or None if all are taken. The lock is held while the file stays open.
+    """
+    os.makedirs(base, exist_ok=True)
+    for slot in range(slots):
+        directory = os.path.join(base, f"worker-{slot}")
+        os.makedirs(directory, exist_ok=True)
+        lock_file = open(os.path.join(directory, ".lock"), "a")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            continue
+        return slot, directory, lock_file
+    return None
@@ -0,0 +1,149 @@
+"""
+Async PostgREST data access for the Supabase tables.
+
+One pooled httpx.AsyncClient per event loop talks to SUPABASE_URL/rest/v1
+over HTTP/2 with keep-alive, so concurrent lookups from the same request
+share (and multiplex over) warm connections instead of each paying a
+blocking round trip on the sync supabase client.
+
+Configuration (environment):
+    SUPABASE_HTTP2                    1 | 0 (1)
+    SUPABASE_POOL_SIZE                max connections (20)
+    SUPABASE_KEEPALIVE                idle keep-alive connections (10)
+    SUPABASE_KEEPALIVE_EXPIRY_SECONDS idle connection lifetime (30)
+    SUPABASE_TIMEOUT_SECONDS          default per-call timeout (5)
+    SUPABASE_CONNECT_TIMEOUT_SECONDS  connect timeout (2)
+"""
+import asyncio
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.utils.supabase_client import SUPABASE_URL, SUPABASE_KEY
+from app.utils.logger import logger
+
+HTTP2_ENABLED = os.getenv("SUPABASE_HTTP2", "1") != "0"
+POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+KEEPALIVE = int(os.getenv("SUPABASE_KEEPALIVE", "10"))
+KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY_SECONDS", "30"))
+TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "5"))
+CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT_SECONDS", "2"))
+
+REST_URL = f"{SUPABASE_URL.rstrip('/')}/rest/v1"
+
+_clients: Dict[asyncio.AbstractEventLoop, Any] = {}
+
+
+class PostgrestError(Exception):
+    """Non-2xx PostgREST response (the sync client raises APIError in the same cases)"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"PostgREST {status_code}: {message}")
+        self.status_code = status_code
+
+
+def _client():
+    """The pooled client for the running event loop (created on first use)"""
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        # Forget clients of loops that have since closed (asyncio.run in scripts)
+        for stale in [l for l in _clients if l.is_closed()]:
+            del _clients[stale]
+        client = httpx.AsyncClient(
+            base_url=REST_URL,
+            http2=HTTP2_ENABLED,
+            headers={
+                "apikey": SUPABASE_KEY,
+                "Authorization": f"Bearer {SUPABASE_KEY}",
+                "Content-Type": "application/json",
+            },
+            limits=httpx.Limits(
+                max_connections=POOL_SIZE,
+                max_keepalive_connections=KEEPALIVE,
+                keepalive_expiry=KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(TIMEOUT, connect=CONNECT_TIMEOUT)
+        )
+        _clients[loop] = client
+    return client
+
+
+def eq(value: Any) -> str:
+    if isinstance(value, bool):
+        value = str(value).lower()
+    return f"eq.{value}"
+
+
+def overlaps(values: Iterable[str]) -> str:
+    """Array overlap filter; elements are quoted so phrases with spaces match"""
+    quoted = ",".join('"' + str(v).replace("\\", "\\\\").replace('"', '\\"') + '"' for v in values)
+    return f"ov.{{{quoted}}}"
+
+
+async def _request(method: str, table: str, params: Dict[str, str], json: Any = None,
+                   headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None):
+    client = _client()
+    response = await client.request(
+        method, f"/{table}", params=params, json=json, headers=headers,
+        timeout=timeout if timeout is not None else client.timeout
+    )
+    if response.status_code >= 400:
+        try:
+            message = response.json().get("message", response.text)
+        except ValueError:
+            message = response.text
+        raise PostgrestError(response.status_code, message)
+    if response.status_code == 204 or not response.content:
+        return None
+    return response.json()
+
+
+async def select(table: str, columns: str, filters: Dict[str, str] = None, order: str = None,
+                 single: bool = False, timeout: float = None):
+    """
+    SELECT columns FROM table WHERE filters. `filters` maps column -> PostgREST
+    operator string (eq(...), overlaps(...)); `order` is e.g. "created_at.desc".
+    With single=True returns one row and raises PostgrestError unless exactly one matches.
+    """
+    params = {"select": columns, **(filters or {})}
+    if order:
+        params["order"] = order
+    headers = {"Accept": "application/vnd.pgrst.object+json"} if single else None
+    return await _request("GET", table, params, headers=headers, timeout=timeout)
+
+
+async def insert(table: str, rows, timeout: float = None) -> List[dict]:
+    """Insert one row (dict) or many (list); returns the inserted rows"""
+    return await _request(
+        "POST", table, {}, json=rows,
+        headers={"Prefer": "return=representation"}, timeout=timeout
+    ) or []
+
+
+async def update(table: str, values: dict, filters: Dict[str, str], timeout: float = None) -> List[dict]:
+    """Update matching rows; returns the updated rows"""
+    return await _request(
+        "PATCH", table, dict(filters), json=values,
+        headers={"Prefer": "return=representation"}, timeout=timeout
+    ) or []
+
+
+async def close_async_supabase():
+    """Close the pooled client of the running loop (called on app shutdown)"""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+        logger.info("Closed async Supabase connection pool")
+
+
+def get_async_supabase_stats() -> dict:
+    return {
+        "http2": HTTP2_ENABLED,
+        "pool_size": POOL_SIZE,
+        "keepalive": KEEPALIVE,
+        "keepalive_expiry_seconds": KEEPALIVE_EXPIRY,
+        "timeout_seconds": TIMEOUT,
+        "open_clients": sum(1 for c in _clients.values() if not c.is_closed)
+    }
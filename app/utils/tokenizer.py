@@ -0,0 +1,37 @@
+import re
+
+def tokenize(text: str) -> list[str]:
+    """
+    Enhanced tokenizer for keyword matching.
+    Preserves important phrases and extracts both words and phrases.
+    """
+    text = text.lower()
+    # Remove punctuation but keep spaces
+    text = re.sub(r"[^a-z0-9\s]", "", text)
+    
+    # Split into words
+    words = text.split()
+    
+    # Create tokens: individual words + important 2-word phrases
+    tokens = set(words)  # Start with individual words
+    
+    # Add 2-word phrases (bigrams) for better matching
+    # This helps match phrases like "end subscription", "change plan", etc.
+    for i in range(len(words) - 1):
+        phrase = f"{words[i]} {words[i+1]}"
+        tokens.add(phrase)
+    
+    return list(tokens)
+
+
+STOP_WORDS = frozenset("""
+a an the and or but if of to in on at by for with from as into about
+i me my we our you your it its this that these those there here
+is are was were be been am do does did have has had can could will would should may might
+what which who whom when where why how not no so than too very just please
+""".split())
+
+
+def is_content_term(term: str) -> bool:
+    """False for terms (words or bigrams) made only of stop words"""
+    return any(word not in STOP_WORDS for word in term.split())
@@ -45,7 +45,7 @@ CREATE TABLE IF NOT EXISTS billing (
 );
 
 -- ============================================
--- FAQ TABLE (No changes needed)
+-- FAQ TABLE (updated_at maintained by trigger)
 -- ============================================
 CREATE TABLE IF NOT EXISTS faqs (
     id SERIAL PRIMARY KEY,
@@ -60,8 +60,24 @@ CREATE TABLE IF NOT EXISTS faqs (
     is_active BOOLEAN DEFAULT TRUE
 );
 
+-- Every UPDATE advances updated_at, so the in-process FAQ index can refresh
+-- incrementally (app/services/faq_index.py)
+CREATE OR REPLACE FUNCTION faqs_touch_updated_at() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS faqs_touch_updated_at ON faqs;
+CREATE TRIGGER faqs_touch_updated_at
+    BEFORE UPDATE ON faqs
+    FOR EACH ROW EXECUTE FUNCTION faqs_touch_updated_at();
+
+CREATE INDEX IF NOT EXISTS idx_faq_updated_at ON faqs(updated_at);
+
 -- ============================================
--- TECHNICAL ISSUES TABLE (No changes needed)
+-- TECHNICAL ISSUES TABLE (Updated with idempotency key)
 -- ============================================
 CREATE TABLE IF NOT EXISTS technical_issues (
     id SERIAL PRIMARY KEY,
@@ -71,9 +87,14 @@ CREATE TABLE IF NOT EXISTS technical_issues (
     status VARCHAR(50) DEFAULT 'open',
     solution TEXT,
     created_at TIMESTAMP DEFAULT NOW(),
-    resolved_at TIMESTAMP
+    resolved_at TIMESTAMP,
+    idempotency_key VARCHAR(64)  -- Added: write-behind inserts are retried safely (unique index below)
 );
 
+-- Existing databases: add the idempotency key used by the issue writer
+ALTER TABLE technical_issues ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(64);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_technical_idempotency_key ON technical_issues(idempotency_key);
+
 -- ============================================
 -- INDEXES for Performance
 -- ============================================